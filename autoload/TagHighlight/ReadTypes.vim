@@ -198,6 +198,7 @@ function! s:ReadTypes(suffix)
 	let type_files = TagHighlight#ReadTypes#FindTypeFiles(a:suffix)
 	let source_dir = fnameescape(TagHighlight#Option#GetOption('SourceDir'))
 	for fname in type_files
+		let fragment_dir = fname . '.d'
 		let fname = fnameescape(fname)
 		call TagHLDebug("Loading type highlighter file " . fname, 'Information')
 		let types_path = fnamemodify(fname, ':p:h')
@@ -214,6 +215,9 @@ function! s:ReadTypes(suffix)
 		exe 'cd' old_dir
 
 		exe 'so' fname
+		if isdirectory(fragment_dir)
+			call s:ReadFileScopeFragments(fragment_dir)
+		endif
 		let b:TagHighlightLoadedLibraries +=
 					\ [{
 					\     'Name': 'Local',
@@ -287,6 +291,22 @@ function! s:ReadTypes(suffix)
 	call TagHLDebug("ReadTypes complete", "Information")
 endfunction
 
+function! s:ReadFileScopeFragments(fragment_dir)
+	" File-scoped types are in a fragment for each source file (see
+	" FileScopeFragments), so only this buffer's fragment needs loading
+	if TagHighlight#Option#GetOption('IgnoreFileScope')
+		let fragments = split(glob(a:fragment_dir . '/**/*.taghl', 1), '\n')
+	else
+		let fragments = [a:fragment_dir . '/' . b:TagHighlightPrivate['NormalisedPath'] . '.taghl']
+	endif
+	for fragment in fragments
+		if filereadable(fragment)
+			call TagHLDebug("Loading file-scope fragment " . fragment, 'Information')
+			exe 'so' fnameescape(fragment)
+		endif
+	endfor
+endfunction
+
 function! TagHighlight#ReadTypes#FindTypeFiles(suffix)
 	let results = []
 	let search_result = TagHighlight#Find#LocateFile('TYPES', a:suffix)
@@ -0,0 +1,112 @@
+#!/usr/bin/python
+from __future__ import print_function
+
+# Benchmark for debug logging (a development tool only).  Runs the whole
+# generator (with a fake ctags, as in benchmark_suite.py) over a synthetic
+# tag file with the debug level set to None and then to Information, with
+# the log written to a file both directly and by the background writer
+# thread (--debug-writer-thread).
+#
+# Some C reserved words are added to the corpus as file-scoped tags, so
+# that there are plenty of per-keyword "Skipping reserved word" messages,
+# e.g.:
+#
+#   python benchmark_debug_log.py --lines 1000000
+
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+import optparse
+
+sys.path = [os.path.abspath(os.path.dirname(__file__))] + sys.path
+
+from benchmark_suite import WriteCorpus, WriteFakeCtags
+from module.cmd import ProcessCommandLine
+from module.config import ResetOptions
+from module.worker import RunWithOptions
+
+reserved_words = ['break', 'case', 'char', 'const', 'continue', 'default',
+        'double', 'else', 'enum', 'float', 'for', 'goto', 'if', 'int', 'long',
+        'return', 'short', 'signed', 'sizeof', 'static', 'struct', 'switch',
+        'typedef', 'union', 'unsigned', 'void', 'while']
+
+modes = [
+        ('None', []),
+        ('Information (file)', ['--debug', 'Information']),
+        ('Information (writer thread)', ['--debug', 'Information', '--debug-writer-thread']),
+        ]
+
+def AddReservedWords(corpus, count, seed):
+    """Append file-scoped tags for reserved words (GenerateTags sorts them)."""
+    rand = random.Random(seed)
+    fh = open(corpus, 'ab')
+    try:
+        for i in range(count):
+            line = '{0}\tsrc/reserved/file{1}.c\t/^{0}$/;"\tv\tfile:\n'.format(
+                    rand.choice(reserved_words), rand.randint(0, count // 10))
+            fh.write(line.encode('utf8'))
+    finally:
+        fh.close()
+
+def TimeRun(work_dir, fake_ctags, extra_args, repeats):
+    types_dir = os.path.join(work_dir, 'types')
+    log_file = os.path.join(work_dir, 'debug.log')
+    args = ['-d', work_dir, '--ctags-exe-full-path', fake_ctags,
+            '--types-file-location', types_dir, '--debug-file', log_file] + extra_args
+    best = None
+    for i in range(repeats):
+        shutil.rmtree(types_dir, ignore_errors=True)
+        os.makedirs(types_dir)
+        if os.path.exists(log_file):
+            os.remove(log_file)
+        options, manually_set = ProcessCommandLine(args)
+        ResetOptions()
+        t1 = time.time()
+        RunWithOptions(options, manually_set)
+        t2 = time.time()
+        if best is None or t2 - t1 < best:
+            best = t2 - t1
+    ResetOptions()
+    if os.path.exists(log_file):
+        size = os.path.getsize(log_file)
+    else:
+        size = 0
+    return best, size
+
+def Run():
+    parser = optparse.OptionParser()
+    parser.add_option('--lines', type='int', default=1000000,
+            help='Size of the synthetic tag file')
+    parser.add_option('--reserved', type='int', default=None,
+            help='Number of reserved word tags to add (default: a tenth of --lines)')
+    parser.add_option('--repeats', type='int', default=3,
+            help='Number of runs in each mode (the best time is used)')
+    parser.add_option('--seed', type='int', default=0,
+            help='Seed for the synthetic corpus')
+    options, remainder = parser.parse_args()
+
+    if options.reserved is None:
+        options.reserved = options.lines // 10
+
+    start_directory = os.getcwd()
+    work_dir = tempfile.mkdtemp(prefix='taghl_benchmark_')
+    try:
+        corpus = os.path.join(work_dir, 'corpus')
+        WriteCorpus(corpus, options.lines, options.seed)
+        AddReservedWords(corpus, options.reserved, options.seed)
+        fake_ctags = os.path.join(work_dir, 'fakectags')
+        WriteFakeCtags(fake_ctags, corpus)
+
+        print('{0:>28} {1:>10} {2:>10}'.format('Debug level', 'Time (s)', 'Log (MB)'))
+        for name, extra_args in modes:
+            seconds, size = TimeRun(work_dir, fake_ctags, extra_args, options.repeats)
+            print('{0:>28} {1:>10.2f} {2:>10.1f}'.format(name, seconds, size / 1048576.0))
+    finally:
+        os.chdir(start_directory)
+        shutil.rmtree(work_dir)
+
+if __name__ == "__main__":
+    Run()
@@ -0,0 +1,70 @@
+#!/usr/bin/python
+from __future__ import print_function
+
+# Benchmark for ParseTags (a development tool only).  Generates synthetic
+# tag files of increasing size and parses each with an increasing number of
+# registered languages.  The time per line should stay roughly constant in
+# both directions: it should scale with the number of lines and not with
+# lines x languages.
+
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+
+sys.path = [os.path.abspath(os.path.join(os.path.dirname(__file__),'../../plugin/TagHighlight'))] + \
+        sys.path
+
+from module.config import config, SetInitialOptions, LoadLanguages
+from module.ctags_interface import ParseTags
+
+line_counts = [25000, 50000, 100000]
+extra_language_counts = [0, 14, 56]
+
+def WriteTagFile(filename, lines):
+    extensions = ['c', 'h', 'cpp', 'hpp', 'py', 'java', 'js', 'rb', 'cs', 'go', 'txt']
+    kinds = 'cdefgmpstuv'
+    random.seed(lines)
+    with open(filename, 'w') as fh:
+        for i in range(lines):
+            fh.write('keyword{0}\tdir{1}/file{2}.{3}\t/^search line {0}$/;"\t{4}\tline:{0}{5}\n'.format(
+                i, i % 50, i % 1000, random.choice(extensions), random.choice(kinds),
+                '\tfile:' if i % 7 == 0 else ''))
+
+def AddDummyLanguages(count):
+    handler = config['LanguageHandler']
+    for name in list(handler.registry.keys()):
+        if name.startswith('dummy'):
+            del handler.registry[name]
+    for i in range(count):
+        handler.registry['dummy%d' % i] = {
+                'FriendlyName': 'dummy%d' % i,
+                'PythonExtensionMatcher': '(dm%d|dn%d)' % (i, i),
+                'SkipList': [],
+                }
+
+def Run():
+    directory = tempfile.mkdtemp()
+    try:
+        SetInitialOptions({'CtagsFileLocation': directory, 'Languages': []}, [])
+        LoadLanguages()
+        base_languages = len(config['LanguageHandler'].GetAllLanguages())
+        print('{0:>10} {1:>10} {2:>12} {3:>12}'.format('Lines', 'Languages', 'Time (ms)', 'us/line'))
+        for lines in line_counts:
+            config['TagFileName'] = 'tags_%d' % lines
+            WriteTagFile(os.path.join(directory, config['TagFileName']), lines)
+            for extra in extra_language_counts:
+                AddDummyLanguages(extra)
+                t1 = time.time()
+                ParseTags(config)
+                t2 = time.time()
+                print('{0:>10} {1:>10} {2:>12.1f} {3:>12.2f}'.format(lines, base_languages + extra,
+                    (t2-t1)*1000.0, (t2-t1)*1e6/lines))
+        AddDummyLanguages(0)
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == "__main__":
+    Run()
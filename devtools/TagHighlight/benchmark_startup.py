@@ -0,0 +1,63 @@
+#!/usr/bin/python
+from __future__ import print_function
+
+# Benchmark for start-up time (a development tool only).  Times a fresh
+# python process that loads the configuration, option specification and
+# language data (which is what every run of TagHighlight does before
+# running ctags) with the data cache disabled, with an empty cache (cold)
+# and with a populated cache (warm).
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import subprocess
+
+plugin_dir = os.path.abspath(os.path.join(os.path.dirname(__file__),'../../plugin/TagHighlight'))
+
+startup_code = '''
+import sys
+sys.path.insert(0, {0!r})
+from module.config import config, SetInitialOptions, LoadLanguages
+from module.options import GetAllOptions
+GetAllOptions()
+SetInitialOptions({{'Languages': []}}, [])
+LoadLanguages()
+config['LanguageHandler'].GetKindList()
+'''.format(plugin_dir)
+
+repeats = 10
+
+def TimeStartup(cache_dir):
+    env = dict(os.environ)
+    env['TAGHIGHLIGHT_CACHE_DIR'] = cache_dir
+    t1 = time.time()
+    subprocess.check_call([sys.executable, '-c', startup_code], env=env)
+    t2 = time.time()
+    return (t2-t1)*1000.0
+
+def Median(values):
+    values = sorted(values)
+    return values[len(values)//2]
+
+def Run():
+    cache_dir = tempfile.mkdtemp()
+    try:
+        baseline = Median([TimeStartup('') for i in range(repeats)])
+        cold = []
+        for i in range(repeats):
+            shutil.rmtree(cache_dir)
+            os.mkdir(cache_dir)
+            cold.append(TimeStartup(cache_dir))
+        warm = [TimeStartup(cache_dir) for i in range(repeats)]
+    finally:
+        shutil.rmtree(cache_dir)
+
+    print('{0:>12} {1:>12}'.format('Cache', 'Time (ms)'))
+    print('{0:>12} {1:>12.1f}'.format('disabled', baseline))
+    print('{0:>12} {1:>12.1f}'.format('cold', Median(cold)))
+    print('{0:>12} {1:>12.1f}'.format('warm', Median(warm)))
+
+if __name__ == "__main__":
+    Run()
@@ -0,0 +1,409 @@
+#!/usr/bin/python
+from __future__ import print_function
+
+# Benchmark suite for the generation pipeline (a development tool only).
+#
+# Generates a synthetic ctags file for each requested scale (with a mix of
+# languages, kinds, file-scoped tags, const globals and signature fields
+# roughly like a real project's) and times each stage separately:
+#
+#   loaddata          parsing the data files (without the data cache)
+#   GenerateTags      running (a fake) ctags, then sorting and rewriting the
+#                     tag file
+#   ParseTags         reading the tag file as text
+#   ParseTags (mmap)  reading the tag file with --mmap-tag-file
+#   CreateTypesFile   writing the types files for every language
+#
+# The fake ctags executable just copies the synthetic file to wherever it
+# is asked to write, so GenerateTags measures TagHighlight's own work.  The
+# best of --repeats runs is reported along with the throughput and (with
+# python 3.4 or later) the peak memory allocated by the stage, which is
+# measured in a separate run as tracing slows everything down.
+#
+# Results are written as JSON with --output.  The corpus only depends on
+# the scale, the seed and corpus_version, so results for different commits
+# can be compared with --compare, which exits with a non-zero status if any
+# stage got slower (or used more memory) by more than --threshold percent:
+#
+#   python benchmark_suite.py --lines 10000,100000 --output before.json
+#   (change something)
+#   python benchmark_suite.py --lines 10000,100000 --compare before.json
+
+import os
+import sys
+import gc
+import glob
+import json
+import math
+import time
+import random
+import shutil
+import tempfile
+import optparse
+import subprocess
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+plugin_dir = os.path.abspath(os.path.join(os.path.dirname(__file__),'../../plugin/TagHighlight'))
+sys.path = [plugin_dir] + sys.path
+
+# Keep the user's data cache out of it (and the loaddata timings honest)
+os.environ['TAGHIGHLIGHT_CACHE_DIR'] = ''
+
+from module.config import config, SetInitialOptions, LoadLanguages
+from module import loaddata
+from module.ctags_interface import GenerateTags, ParseTags
+from module.generation import CreateTypesFile
+
+# Increment this if the synthetic corpus changes: results for different
+# corpus versions can't be compared.
+corpus_version = 1
+results_version = 1
+
+# Language mix: (weight, extensions, [(kind, weight, file-scoped fraction)])
+language_mix = [
+        (40, ['c', 'h'], [('f', 30, 0.3), ('v', 10, 0.3), ('m', 20, 0.0),
+            ('d', 15, 0.2), ('s', 5, 0.0), ('t', 5, 0.0), ('e', 5, 0.0),
+            ('l', 10, 1.0)]),
+        (25, ['cpp', 'hpp', 'cc'], [('c', 10, 0.0), ('f', 30, 0.1), ('m', 30, 0.0),
+            ('n', 3, 0.0), ('p', 12, 0.0), ('v', 5, 0.2), ('t', 5, 0.0),
+            ('l', 5, 1.0)]),
+        (15, ['py'], [('c', 15, 0.0), ('f', 40, 0.0), ('m', 35, 0.0),
+            ('v', 5, 0.0), ('i', 5, 0.0)]),
+        (8, ['java'], [('c', 15, 0.0), ('m', 50, 0.0), ('f', 25, 0.0),
+            ('i', 5, 0.0), ('l', 5, 1.0)]),
+        (4, ['js'], [('f', 40, 0.0), ('c', 10, 0.0), ('m', 30, 0.0),
+            ('v', 20, 0.0)]),
+        (2, ['go'], [('f', 50, 0.0), ('t', 20, 0.0), ('v', 20, 0.0),
+            ('c', 10, 0.0)]),
+        (2, ['rb'], [('c', 20, 0.0), ('f', 70, 0.0), ('m', 10, 0.0)]),
+        # Files that no language handles
+        (4, ['txt', 'mk', 'sh'], [('f', 50, 0.0), ('v', 50, 0.0)]),
+        ]
+
+syllables = ['ba', 'be', 'buf', 'ca', 'co', 'cur', 'da', 'de', 'dev', 'fi',
+        'fo', 'get', 'ha', 'in', 'io', 'ka', 'la', 'len', 'lo', 'ma', 'me', 'mo',
+        'na', 'no', 'pa', 'po', 'put', 're', 'ri', 'sa', 'set', 'so', 'ta', 'te',
+        'to', 'un', 'va', 'xe', 'zo']
+
+def WeightedChoice(rand, items, weights):
+    point = rand.random() * sum(weights)
+    for item, weight in zip(items, weights):
+        point -= weight
+        if point < 0:
+            return item
+    return items[-1]
+
+def MakeWords(rand, count):
+    """Distinct lower-case words, sorted."""
+    words = set()
+    while len(words) < count:
+        words.add(''.join([rand.choice(syllables) for i in range(rand.randint(1, 4))]))
+    return sorted(words)
+
+def WriteCorpus(filename, lines, seed):
+    """Write a synthetic ctags file of (about) the given number of lines.
+
+    Names are generated in sorted order (each name is two words from a
+    sorted list of lower-case words) so, as for exuberant ctags, the file
+    is sorted."""
+    rand = random.Random('{0}-{1}-{2}'.format(corpus_version, seed, lines))
+    file_count = max(1, lines // 50)
+    files = []
+    for index in range(file_count):
+        weight, extensions, kinds = WeightedChoice(rand, language_mix, [entry[0] for entry in language_mix])
+        filename_in_tags = 'src/module{0}/file{1}.{2}'.format(index % 97, index, rand.choice(extensions))
+        files.append((filename_in_tags, kinds))
+
+    # About three tags for each distinct name
+    names = max(1, lines // 3)
+    word_count = int(math.sqrt(names)) + 1
+    words = MakeWords(rand, word_count)
+
+    fh = open(filename, 'wb')
+    try:
+        fh.write(b'!_TAG_FILE_FORMAT\t2\t/extended format; --format=1 will not append ;" to lines/\n')
+        fh.write(b'!_TAG_FILE_SORTED\t1\t/0=unsorted, 1=sorted, 2=foldcase/\n')
+        fh.write(b'!_TAG_PROGRAM_NAME\tExuberant Ctags\t//\n')
+        written = 0
+        name_index = 0
+        while written < lines:
+            name = words[(name_index // word_count) % word_count] + '_' + words[name_index % word_count]
+            if name_index >= word_count * word_count:
+                name += '_{0}'.format(name_index // (word_count * word_count))
+            name_index += 1
+            entries = []
+            for i in range(rand.randint(1, 5)):
+                filename_in_tags, kinds = files[rand.randint(0, file_count - 1)]
+                kind, weight, file_scoped = WeightedChoice(rand, kinds, [entry[1] for entry in kinds])
+                line_number = rand.randint(1, 5000)
+                if kind == 'v' and rand.random() < 0.3:
+                    search = '/^static const int {0} = {1};$/'.format(name, line_number)
+                elif kind in 'fmp':
+                    search = '/^int {0}(void *context, int count)$/'.format(name)
+                else:
+                    search = '/^\t{0} = {1};$/'.format(name, line_number)
+                fields = [name, filename_in_tags, search + ';"', kind, 'line:{0}'.format(line_number)]
+                if rand.random() < file_scoped:
+                    fields.append('file:')
+                if kind in 'fmp':
+                    fields.append('signature:(' + ', '.join(['int arg{0}'.format(n)
+                        for n in range(rand.randint(0, 6))]) + ')')
+                entries.append('\t'.join(fields))
+            for entry in sorted(entries):
+                fh.write((entry + '\n').encode('utf8'))
+            written += len(entries)
+    finally:
+        fh.close()
+
+fake_ctags_template = '''#!{python}
+import sys
+import shutil
+args = sys.argv[1:]
+output = '-'
+if '-f' in args:
+    output = args[args.index('-f') + 1]
+if output == '-':
+    source = open({corpus!r}, 'rb')
+    shutil.copyfileobj(source, getattr(sys.stdout, 'buffer', sys.stdout))
+    source.close()
+else:
+    shutil.copyfile({corpus!r}, output)
+'''
+
+def WriteFakeCtags(filename, corpus):
+    fh = open(filename, 'w')
+    fh.write(fake_ctags_template.format(python=sys.executable, corpus=corpus))
+    fh.close()
+    os.chmod(filename, 0o755)
+
+def PeakMemory(function):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def TimePhase(function, repeats, setup=None, measure_memory=True):
+    """Best time of several runs and the peak memory of one more."""
+    times = []
+    for i in range(repeats):
+        if setup is not None:
+            setup()
+        gc.collect()
+        t1 = time.time()
+        function()
+        t2 = time.time()
+        times.append(t2-t1)
+    peak = None
+    if measure_memory and tracemalloc is not None:
+        if setup is not None:
+            setup()
+        peak = PeakMemory(function)
+    return min(times), peak
+
+def PhaseResult(seconds, peak, work, unit):
+    return {'seconds': seconds, 'throughput': work / seconds if seconds > 0 else None,
+            'unit': unit, 'peak_memory': peak}
+
+def BenchmarkLoadData(repeats, measure_memory):
+    files = [os.path.join(config['DataDirectory'], name)
+            for name in ['options.txt', 'kinds.txt', 'language_defaults.txt']]
+    files += sorted(glob.glob(os.path.join(config['DataDirectory'], 'languages', '*.txt')))
+    rounds = 20
+    def Run():
+        for i in range(rounds):
+            for filename in files:
+                loaddata.ParseFile(filename)
+    seconds, peak = TimePhase(Run, repeats, measure_memory=measure_memory)
+    return PhaseResult(seconds, peak, rounds * len(files), 'files/s')
+
+def RemoveFiles(pattern):
+    def Remove():
+        for filename in glob.glob(pattern):
+            os.remove(filename)
+    return Remove
+
+def BenchmarkScale(work_dir, lines, seed, repeats, measure_memory):
+    scale_dir = os.path.join(work_dir, str(lines))
+    types_dir = os.path.join(scale_dir, 'types')
+    os.makedirs(types_dir)
+    corpus = os.path.join(scale_dir, 'corpus')
+    WriteCorpus(corpus, lines, seed)
+    fake_ctags = os.path.join(scale_dir, 'fakectags')
+    WriteFakeCtags(fake_ctags, corpus)
+
+    config['SourceDir'] = scale_dir
+    config['CtagsFileLocation'] = scale_dir
+    config['TypesFileLocation'] = types_dir
+    config['CtagsExeFull'] = fake_ctags
+    config['MmapTagFile'] = False
+
+    start_directory = os.getcwd()
+    results = {}
+    try:
+        tag_file = os.path.join(scale_dir, config['TagFileName'])
+        seconds, peak = TimePhase(lambda: GenerateTags(config), repeats,
+                setup=RemoveFiles(tag_file), measure_memory=measure_memory)
+        results['GenerateTags'] = PhaseResult(seconds, peak, lines, 'lines/s')
+
+        parsed = []
+        def Parse():
+            del parsed[:]
+            parsed.append(ParseTags(config))
+        seconds, peak = TimePhase(Parse, repeats, measure_memory=measure_memory)
+        results['ParseTags'] = PhaseResult(seconds, peak, lines, 'lines/s')
+
+        config['MmapTagFile'] = True
+        seconds, peak = TimePhase(Parse, repeats, measure_memory=measure_memory)
+        results['ParseTags (mmap)'] = PhaseResult(seconds, peak, lines, 'lines/s')
+        config['MmapTagFile'] = False
+
+        tag_db, file_tag_db = parsed[0]
+        languages = [language for language in config['LanguageList']
+                if language in tag_db or language in file_tag_db]
+        keywords = 0
+        for language in languages:
+            keywords += sum([len(tag_db[language][kind]) for kind in tag_db[language].keys()])
+            for filename in file_tag_db[language].keys():
+                file_tags = file_tag_db[language][filename]
+                keywords += sum([len(file_tags[kind]) for kind in file_tags.keys()])
+        def CreateAll():
+            for language in languages:
+                CreateTypesFile(config, language, tag_db[language], file_tag_db[language])
+        seconds, peak = TimePhase(CreateAll, repeats,
+                setup=RemoveFiles(os.path.join(types_dir, '*')), measure_memory=measure_memory)
+        results['CreateTypesFile'] = PhaseResult(seconds, peak, keywords, 'keywords/s')
+    finally:
+        os.chdir(start_directory)
+        shutil.rmtree(scale_dir)
+    return results
+
+def GetCommit():
+    try:
+        process = subprocess.Popen(['git', 'rev-parse', 'HEAD'], cwd=plugin_dir,
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        output = process.communicate()[0]
+    except OSError:
+        return None
+    if process.returncode != 0:
+        return None
+    return output.decode('ascii').strip()
+
+def FormatMemory(peak):
+    if peak is None:
+        return '-'
+    return '{0:.1f}'.format(peak / 1048576.0)
+
+def PrintResults(results):
+    print('{0:>10} {1:>18} {2:>10} {3:>14} {4:>12} {5:>10}'.format(
+        'Scale', 'Stage', 'Time (s)', 'Throughput', 'Unit', 'Peak (MB)'))
+    rows = [('-', 'loaddata', results['loaddata'])]
+    for scale in sorted(results['scales'].keys(), key=int):
+        for phase in sorted(results['scales'][scale].keys()):
+            rows.append((scale, phase, results['scales'][scale][phase]))
+    for scale, phase, result in rows:
+        print('{0:>10} {1:>18} {2:>10.3f} {3:>14.0f} {4:>12} {5:>10}'.format(
+            scale, phase, result['seconds'], result['throughput'] or 0, result['unit'],
+            FormatMemory(result['peak_memory'])))
+
+def Compare(baseline, results, threshold):
+    """Print the change in each stage; returns True if nothing regressed."""
+    for key in ['corpus_version', 'seed']:
+        if baseline.get(key) != results.get(key):
+            print("Cannot compare: {0} differs ({1!r} and {2!r})".format(key, baseline.get(key), results.get(key)))
+            return False
+    pairs = [('-', 'loaddata', baseline['loaddata'], results['loaddata'])]
+    for scale in sorted(results['scales'].keys(), key=int):
+        if scale not in baseline['scales']:
+            continue
+        for phase in sorted(results['scales'][scale].keys()):
+            if phase in baseline['scales'][scale]:
+                pairs.append((scale, phase, baseline['scales'][scale][phase], results['scales'][scale][phase]))
+
+    print('')
+    print('Compared with {0} ({1}):'.format(baseline.get('commit'), baseline.get('time')))
+    print('{0:>10} {1:>18} {2:>10} {3:>10} {4:>10} {5:>10}'.format(
+        'Scale', 'Stage', 'Time', 'Change', 'Memory', 'Change'))
+    passed = True
+    for scale, phase, old, new in pairs:
+        status = ''
+        time_change = 100.0 * (new['seconds'] - old['seconds']) / old['seconds']
+        if time_change > threshold:
+            status = 'SLOWER'
+        memory_change = None
+        if old['peak_memory'] and new['peak_memory'] is not None:
+            memory_change = 100.0 * (new['peak_memory'] - old['peak_memory']) / old['peak_memory']
+            if memory_change > threshold:
+                status = (status + ' MORE MEMORY').strip()
+        if status:
+            passed = False
+        print('{0:>10} {1:>18} {2:>10.3f} {3:>9.1f}% {4:>10} {5:>10} {6}'.format(
+            scale, phase, new['seconds'], time_change, FormatMemory(new['peak_memory']),
+            '-' if memory_change is None else '{0:.1f}%'.format(memory_change), status))
+    return passed
+
+def Run():
+    parser = optparse.OptionParser()
+    parser.add_option('--lines', default='10000,100000,1000000',
+            help='Comma-separated sizes of the synthetic tag files (e.g. 10000 to 10000000)')
+    parser.add_option('--repeats', type='int', default=3,
+            help='Number of times to run each stage (the best time is used)')
+    parser.add_option('--seed', type='int', default=0,
+            help='Seed for the synthetic corpus')
+    parser.add_option('--no-memory', action='store_true', default=False,
+            help='Do not measure peak memory (saves a traced run of each stage)')
+    parser.add_option('--output', default=None,
+            help='Write the results to this JSON file')
+    parser.add_option('--compare', default=None,
+            help='Compare the results with this JSON file')
+    parser.add_option('--threshold', type='float', default=10.0,
+            help='Percentage change counted as a regression when comparing')
+    options, remainder = parser.parse_args()
+
+    SetInitialOptions({'Languages': [], 'DebugLevel': 'None'}, ['DebugLevel'])
+    LoadLanguages()
+    measure_memory = not options.no_memory
+
+    results = {
+            'results_version': results_version,
+            'corpus_version': corpus_version,
+            'seed': options.seed,
+            'repeats': options.repeats,
+            'python': sys.version.split()[0],
+            'platform': sys.platform,
+            'commit': GetCommit(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'loaddata': BenchmarkLoadData(options.repeats, measure_memory),
+            'scales': {},
+            }
+
+    work_dir = tempfile.mkdtemp(prefix='taghl_benchmark_')
+    try:
+        for lines in [int(i) for i in options.lines.split(',')]:
+            results['scales'][str(lines)] = BenchmarkScale(work_dir, lines,
+                    options.seed, options.repeats, measure_memory)
+    finally:
+        shutil.rmtree(work_dir)
+
+    PrintResults(results)
+
+    if options.output is not None:
+        fh = open(options.output, 'w')
+        json.dump(results, fh, indent=4, sort_keys=True)
+        fh.close()
+
+    if options.compare is not None:
+        fh = open(options.compare, 'r')
+        baseline = json.load(fh)
+        fh.close()
+        if not Compare(baseline, results, options.threshold):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    Run()
@@ -0,0 +1,185 @@
+#!/usr/bin/python
+from __future__ import print_function
+
+# Benchmark for the syn command emission (a development tool only).
+#
+# Generates synthetic fixture projects (tag sets with ordinary keywords,
+# keywords that aren't valid Vim keywords, keywords that clash with syn
+# keyword arguments, over-long keywords and some file-scoped tags) and
+# writes the types file for each with and without OptimiseSynCommands
+# (with IncludeSynMatches set, so that the matches are included).  For
+# each, the number of syn commands, the size of the file and the cost
+# estimated by SynCommandCost are reported.
+#
+# If Vim is available (or given with --vim), the time Vim takes to source
+# each types file and then to highlight a buffer of text using the
+# fixture's keywords is measured as well (best of --repeats runs).
+
+import os
+import sys
+import random
+import shutil
+import tempfile
+import optparse
+import subprocess
+
+sys.path = [os.path.abspath(os.path.join(os.path.dirname(__file__),'../../plugin/TagHighlight'))] + \
+        sys.path
+
+from module.config import config, SetInitialOptions, LoadLanguages
+from module.utilities import SetDict
+from module.generation import CreateTypesFile, SynCommandCost, vim_synkeyword_arguments
+
+# Name, number of keywords and the fraction of them that must be matched
+fixtures = [
+        ('small', 2000, 0.05),
+        ('medium', 20000, 0.02),
+        ('large', 200000, 0.01),
+        ('match-heavy', 20000, 0.2),
+        ]
+kinds = ['CTagsClass', 'CTagsDefinedName', 'CTagsEnumerationValue',
+        'CTagsFunction', 'CTagsGlobalVariable', 'CTagsMember', 'CTagsType']
+invalid_formats = ['{0}.field{1}', 'operator{1}+', '~{0}{1}', '{0}${1}', '{0}::{1}']
+
+def GenerateFixture(name, count, match_fraction):
+    """Return the unscoped and file-scoped tags for a fixture."""
+    rand = random.Random(name)
+    unscoped = SetDict()
+    file_scoped = {}
+    for i in range(count):
+        base = 'name{0}'.format(rand.randint(0, count))
+        point = rand.random()
+        if point < match_fraction * 0.8:
+            keyword = rand.choice(invalid_formats).format(base, i % 50)
+        elif point < match_fraction * 0.9:
+            keyword = rand.choice(vim_synkeyword_arguments)
+        elif point < match_fraction:
+            keyword = base + '_' * 80
+        else:
+            keyword = base
+        if rand.random() < 0.1:
+            source_file = 'src/file{0}.c'.format(rand.randint(0, 20))
+            tags = file_scoped.setdefault(source_file, SetDict())
+        else:
+            tags = unscoped
+        tags[rand.choice(kinds)].add(keyword)
+    return unscoped, file_scoped
+
+def WriteBuffer(filename, unscoped, lines):
+    """Some text using the fixture's keywords (and others) for Vim to
+    highlight."""
+    rand = random.Random(filename)
+    keywords = sorted(set(keyword for kind in unscoped.keys() for keyword in unscoped[kind]))
+    fh = open(filename, 'w')
+    try:
+        for i in range(lines):
+            words = [rand.choice(keywords) for j in range(6)] + ['other{0}'.format(i), 'x.y']
+            rand.shuffle(words)
+            fh.write('\t' + ' '.join(words) + ';\n')
+    finally:
+        fh.close()
+
+vim_script = r'''
+let s:t = reltime()
+exe 'so' fnameescape(g:types_file)
+let s:load = reltimestr(reltime(s:t))
+let s:t = reltime()
+for s:l in range(1, line('$'))
+	call synID(s:l, col([s:l, '$']) - 1, 1)
+endfor
+call writefile([s:load, reltimestr(reltime(s:t))], g:result_file)
+qa!
+'''
+
+def TimeVim(vim, directory, types_file, buffer_file, repeats):
+    """Best times (in seconds) for Vim to source the types file and to
+    highlight the buffer."""
+    script = os.path.join(directory, 'time.vim')
+    result_file = os.path.join(directory, 'time.out')
+    fh = open(script, 'w')
+    fh.write(vim_script)
+    fh.close()
+    load_times = []
+    scan_times = []
+    for i in range(repeats):
+        devnull = open(os.devnull, 'r+')
+        try:
+            subprocess.call([vim, '-N', '-u', 'NONE', '-i', 'NONE', '-es',
+                '--cmd', 'let g:types_file = {0!r}'.format(types_file),
+                '--cmd', 'let g:result_file = {0!r}'.format(result_file),
+                '--cmd', 'let b:TagHighlightPrivate = {}',
+                '-c', 'syntax on', '-c', 'so ' + script, buffer_file],
+                stdin=devnull, stdout=devnull, stderr=devnull)
+        finally:
+            devnull.close()
+        fh = open(result_file, 'r')
+        load, scan = [float(value) for value in fh.read().split()]
+        fh.close()
+        load_times.append(load)
+        scan_times.append(scan)
+    return min(load_times), min(scan_times)
+
+def FindVim():
+    for directory in os.environ.get('PATH', '').split(os.pathsep):
+        candidate = os.path.join(directory, 'vim')
+        if os.path.isfile(candidate) and os.access(candidate, os.X_OK):
+            return candidate
+    return None
+
+def Run():
+    parser = optparse.OptionParser()
+    parser.add_option('--vim', default=None,
+            help='Vim executable used to time loading and highlighting (default: vim in the path)')
+    parser.add_option('--no-vim', action='store_true', default=False,
+            help='Only report the counts and the estimated cost')
+    parser.add_option('--repeats', type='int', default=3,
+            help='Number of Vim runs (the best is reported)')
+    parser.add_option('--buffer-lines', type='int', default=2000,
+            help='Number of lines in the buffer that Vim highlights')
+    options, remainder = parser.parse_args()
+
+    vim = None
+    if not options.no_vim:
+        vim = options.vim or FindVim()
+        if vim is None:
+            print('Vim not found: only reporting counts and estimated cost')
+
+    directory = tempfile.mkdtemp()
+    try:
+        SetInitialOptions({'Languages': [], 'TypesFileLocation': directory,
+            'IncludeSynMatches': True, 'IgnoreFileScope': True}, [])
+        LoadLanguages()
+        header = '{0:<12} {1:<9} {2:>8} {3:>8} {4:>8} {5:>10} {6:>12}'.format(
+                'Fixture', 'Mode', 'Commands', 'Keyword', 'Match', 'Bytes', 'Est. cost')
+        if vim is not None:
+            header += ' {0:>9} {1:>9}'.format('Load (ms)', 'Scan (ms)')
+        print(header)
+        for name, count, match_fraction in fixtures:
+            unscoped, file_scoped = GenerateFixture(name, count, match_fraction)
+            buffer_file = os.path.join(directory, name + '.txt')
+            WriteBuffer(buffer_file, unscoped, options.buffer_lines)
+            costs = {}
+            for mode, optimise in [('before', False), ('after', True)]:
+                config['OptimiseSynCommands'] = optimise
+                config['TypesFileNameForce'] = '{0}_{1}.taghl'.format(name, mode)
+                types_file = os.path.join(directory, config['TypesFileNameForce'])
+                CreateTypesFile(config, 'c', unscoped, file_scoped)
+                fh = open(types_file, 'r')
+                cost = SynCommandCost(fh.read().splitlines())
+                fh.close()
+                costs[mode] = cost
+                line = '{0:<12} {1:<9} {2:>8} {3:>8} {4:>8} {5:>10} {6:>12.0f}'.format(
+                        name, mode, cost['commands'], cost['syn_keyword_commands'],
+                        cost['syn_match_commands'], cost['bytes'], cost['cost'])
+                if vim is not None:
+                    load, scan = TimeVim(vim, directory, types_file, buffer_file, options.repeats)
+                    line += ' {0:>9.1f} {1:>9.1f}'.format(load * 1000.0, scan * 1000.0)
+                print(line)
+            print('{0:<12} {1:<9} {2:>7.2f}x {3:>8} {4:>8} {5:>10} {6:>11.2f}x'.format(name, 'ratio',
+                float(costs['before']['commands']) / costs['after']['commands'], '', '', '',
+                costs['before']['cost'] / costs['after']['cost']))
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == "__main__":
+    Run()
@@ -0,0 +1,127 @@
+#!/usr/bin/python
+from __future__ import print_function
+
+# Benchmark for parsing the tag file (a development tool only).  Writes a
+# synthetic tag file of the requested size (or uses an existing one) and
+# parses it with both the text parser and the memory-mapped bytes parser
+# (--mmap-tag-file), checking that the results are identical.
+#
+# The synthetic file has tags for several languages (and for files that no
+# language handles), file-scoped tags, long signature fields, constants,
+# invalid UTF-8, stray carriage returns and malformed lines, e.g.:
+#
+#   python benchmark_tag_parser.py --size 1024
+
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+import optparse
+
+sys.path = [os.path.abspath(os.path.join(os.path.dirname(__file__),'../../plugin/TagHighlight'))] + \
+        sys.path
+
+from module.config import config, SetInitialOptions, LoadLanguages
+from module.ctags_interface import ParseTags
+
+extensions = ['c', 'h', 'cpp', 'py', 'java', 'rb', 'txt', 'mk']
+kinds = 'cdefgmpstuv'
+
+def GenerateLine(rand, i):
+    keyword = u'name_{0}'.format(rand.randint(0, 200000))
+    filename = 'src/dir{0}/file{1}.{2}'.format(i % 50, rand.randint(0, 5000), rand.choice(extensions))
+    choice = rand.random()
+    if choice < 0.0005:
+        return b'malformed line without enough fields\n'
+    if choice < 0.001:
+        keyword += u'\xe9t\xe9'
+    if choice < 0.002:
+        kind = rand.choice(['kind:x', 'kind:' + rand.choice(kinds)])
+    else:
+        kind = rand.choice(kinds)
+    fields = [keyword, filename, u'/^const int {0} = 1;$/;"'.format(keyword), kind]
+    if rand.random() < 0.3:
+        fields.append('file:')
+    if rand.random() < 0.3:
+        fields.append('signature:(' + ', '.join(['int arg{0}'.format(n) for n in range(rand.randint(0, 20))]) + ')')
+    line = u'\t'.join(fields).encode('utf8')
+    if choice < 0.0015:
+        line = line.replace(b'name_', b'name\xff_')
+    if choice < 0.0001:
+        line += b'\r'
+    return line + b'\n'
+
+def WriteTagFile(filename, size):
+    rand = random.Random(size)
+    fh = open(filename, 'wb')
+    try:
+        fh.write(b'!_TAG_FILE_SORTED\t1\t/0=unsorted, 1=sorted, 2=foldcase/\n')
+        written = 0
+        i = 0
+        while written < size:
+            line = GenerateLine(rand, i)
+            fh.write(line)
+            written += len(line)
+            i += 1
+    finally:
+        fh.close()
+
+def Snapshot(result):
+    tag_db, file_tag_db = result
+    tags = dict((language, dict((kind, tag_db[language][kind]) for kind in tag_db[language].keys()))
+            for language in tag_db.keys())
+    file_tags = {}
+    for language in file_tag_db.keys():
+        files = file_tag_db[language]
+        file_tags[language] = dict((filename, dict((kind, files[filename][kind]) for kind in files[filename].keys()))
+                for filename in files.keys())
+    return tags, file_tags
+
+def TimeParse(tag_file, use_mmap):
+    config['CtagsFileLocation'] = os.path.dirname(tag_file)
+    config['TagFileName'] = os.path.basename(tag_file)
+    config['MmapTagFile'] = use_mmap
+    t1 = time.time()
+    result = ParseTags(config)
+    t2 = time.time()
+    return Snapshot(result), t2-t1
+
+def Run():
+    parser = optparse.OptionParser()
+    parser.add_option('--size', type='int', default=1024,
+            help='Size of the synthetic tag file in megabytes')
+    parser.add_option('--tag-file', default=None,
+            help='Use an existing tag file instead of generating one')
+    options, remainder = parser.parse_args()
+
+    SetInitialOptions({'Languages': [], 'DebugLevel': 'None'}, ['DebugLevel'])
+    LoadLanguages()
+
+    work_dir = None
+    try:
+        if options.tag_file is None:
+            work_dir = tempfile.mkdtemp()
+            tag_file = os.path.join(work_dir, 'tags')
+            WriteTagFile(tag_file, options.size * 1024 * 1024)
+        else:
+            tag_file = os.path.abspath(options.tag_file)
+        size = os.path.getsize(tag_file) / 1048576.0
+
+        text_result, text_time = TimeParse(tag_file, False)
+        mmap_result, mmap_time = TimeParse(tag_file, True)
+    finally:
+        if work_dir is not None:
+            shutil.rmtree(work_dir)
+
+    print('{0:>10} {1:>10} {2:>10}'.format('Parser', 'Time (s)', 'MB/s'))
+    print('{0:>10} {1:>10.2f} {2:>10.1f}'.format('text', text_time, size / text_time))
+    print('{0:>10} {1:>10.2f} {2:>10.1f}'.format('mmap', mmap_time, size / mmap_time))
+    if text_result != mmap_result:
+        print("Results differ")
+        sys.exit(1)
+    print("Results identical")
+
+if __name__ == "__main__":
+    Run()
@@ -0,0 +1,114 @@
+#!/usr/bin/python
+from __future__ import print_function
+
+# Memory benchmark for the tag store (a development tool only).  Fills the
+# old nested TagDB/FileTagDB classes and the compact TagStore with the same
+# synthetic tags and reports the memory held by each (measured with
+# tracemalloc, so python 3.4 or later is needed) and the time taken.
+#
+# As in ParseTagLines, every keyword and file name is a new string (it is
+# sliced out of a tag line), roughly a third of the tags are file-scoped
+# and most keywords appear more than once (overloads, declarations and
+# definitions and so on): there are four tags for each distinct keyword
+# and forty tags in each file.
+
+import os
+import sys
+import gc
+import time
+import random
+import optparse
+import tracemalloc
+
+sys.path = [os.path.abspath(os.path.join(os.path.dirname(__file__),'../../plugin/TagHighlight'))] + \
+        sys.path
+
+from module.utilities import TagDB, FileTagDB
+from module.tagstore import TagStore
+
+languages = ['c', 'cpp', 'python']
+kinds = ['CTagsClass', 'CTagsDefinedName', 'CTagsEnumerationValue',
+        'CTagsFunction', 'CTagsGlobalVariable', 'CTagsMember', 'CTagsType']
+
+def GenerateTags(count):
+    random.seed(count)
+    file_count = max(1, count // 40)
+    for i in range(count):
+        keyword = 'keyword_{0}'.format(random.randint(0, count // 4))
+        file_index = random.randint(0, file_count)
+        language = languages[file_index % len(languages)]
+        filename = 'src/dir{0}/file{1}.{2}'.format(file_index % 20, file_index, language)
+        kind = kinds[random.randint(0, len(kinds)-1)]
+        yield language, kind, keyword, filename, (i % 3 == 0)
+
+def FillOld(count):
+    ctags_entries = TagDB()
+    file_entries = FileTagDB()
+    for language, kind, keyword, filename, scoped in GenerateTags(count):
+        if scoped:
+            file_entries[language][filename][kind].add(keyword)
+        else:
+            ctags_entries[language][kind].add(keyword)
+    return ctags_entries, file_entries
+
+def FillNew(count):
+    tag_store = TagStore()
+    for language, kind, keyword, filename, scoped in GenerateTags(count):
+        if scoped:
+            tag_store.Add(language, kind, keyword, filename)
+        else:
+            tag_store.Add(language, kind, keyword)
+    tag_store.Compact()
+    return tag_store.UnscopedTags(), tag_store.FileScopedTags()
+
+def Measure(Fill, count):
+    gc.collect()
+    tracemalloc.start()
+    t1 = time.time()
+    result = Fill(count)
+    t2 = time.time()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size, t2-t1
+
+def CheckSame(old, new):
+    for old_db, new_db in zip(old, new):
+        if sorted(old_db.keys()) != sorted(new_db.keys()):
+            return False
+    old_tags, old_files = old
+    new_tags, new_files = new
+    for language in old_tags.keys():
+        for kind in old_tags[language].keys():
+            if old_tags[language][kind] != new_tags[language][kind]:
+                return False
+    for language in old_files.keys():
+        if sorted(old_files[language].keys()) != sorted(new_files[language].keys()):
+            return False
+        for filename in old_files[language].keys():
+            for kind in old_files[language][filename].keys():
+                if old_files[language][filename][kind] != new_files[language][filename][kind]:
+                    return False
+    return True
+
+def Run():
+    parser = optparse.OptionParser()
+    parser.add_option('--counts', default='100000,500000,2000000',
+            help='Comma-separated numbers of tags to store')
+    options, remainder = parser.parse_args()
+
+    print('{0:>10} {1:>12} {2:>12} {3:>8} {4:>10} {5:>10}'.format(
+        'Tags', 'Old (MB)', 'New (MB)', 'Ratio', 'Old (s)', 'New (s)'))
+    for count in [int(i) for i in options.counts.split(',')]:
+        old, old_size, old_time = Measure(FillOld, count)
+        new, new_size, new_time = Measure(FillNew, count)
+        if not CheckSame(old, new):
+            print("Stores differ for {0} tags".format(count))
+            sys.exit(1)
+        del old, new
+        print('{0:>10} {1:>12.1f} {2:>12.1f} {3:>8.1f} {4:>10.2f} {5:>10.2f}'.format(
+            count, old_size/1048576.0, new_size/1048576.0, float(old_size)/new_size,
+            old_time, new_time))
+
+if __name__ == "__main__":
+    Run()
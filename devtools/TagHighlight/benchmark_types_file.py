@@ -0,0 +1,59 @@
+#!/usr/bin/python
+from __future__ import print_function
+
+# Benchmark for CreateTypesFile (a development tool only).  Generates
+# synthetic tag databases of increasing size (with some keywords appearing
+# under several kinds, some reserved words and some invalid keywords) and
+# times writing the types file.  The time per keyword should stay roughly
+# constant: the filters must scale linearly with the number of keywords.
+
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+
+sys.path = [os.path.abspath(os.path.join(os.path.dirname(__file__),'../../plugin/TagHighlight'))] + \
+        sys.path
+
+from module.config import config, SetInitialOptions, LoadLanguages
+from module.utilities import SetDict
+from module.generation import CreateTypesFile
+
+keyword_counts = [10000, 100000, 1000000]
+kinds = ['CTagsClass', 'CTagsDefinedName', 'CTagsEnumerationValue',
+        'CTagsFunction', 'CTagsGlobalVariable', 'CTagsMember', 'CTagsType']
+
+def GenerateTags(count):
+    random.seed(count)
+    tags = SetDict()
+    for i in range(count):
+        if i % 100 == 0:
+            keyword = 'while'
+        elif i % 101 == 0:
+            keyword = 'bad.keyword{0}'.format(i)
+        else:
+            # Roughly one in ten keywords is a duplicate
+            keyword = 'keyword{0}'.format(random.randint(0, count - count // 10))
+        tags[random.choice(kinds)].add(keyword)
+    return tags
+
+def Run():
+    directory = tempfile.mkdtemp()
+    try:
+        SetInitialOptions({'Languages': [], 'TypesFileLocation': directory,
+            'SkipPatterns': ['^tmp_', '_unused$']}, [])
+        LoadLanguages()
+        print('{0:>10} {1:>12} {2:>12}'.format('Keywords', 'Time (ms)', 'us/keyword'))
+        for count in keyword_counts:
+            tags = GenerateTags(count)
+            t1 = time.time()
+            CreateTypesFile(config, 'c', tags, {})
+            t2 = time.time()
+            print('{0:>10} {1:>12.1f} {2:>12.2f}'.format(count, (t2-t1)*1000.0, (t2-t1)*1e6/count))
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == "__main__":
+    Run()
@@ -0,0 +1,103 @@
+#!/usr/bin/python
+from __future__ import print_function
+
+# Differential check and benchmark for the tag field parser (a development
+# tool only).  Generates a large random corpus of tag lines, many of them
+# malformed or deliberately awkward (tabs in the search pattern, several ;"
+# markers, kind: prefixes, stray file: fields, empty fields, non-ASCII
+# characters and so on), and checks that ParseFields and ParseFieldsBytes
+# give the same result as the field_processor regular expression for every
+# line.  Then times both on ordinary lines and on lines with long signature
+# fields.  Exits with a non-zero status if any line differs.
+
+import os
+import sys
+import random
+import timeit
+import optparse
+
+sys.path = [os.path.abspath(os.path.join(os.path.dirname(__file__),'../../plugin/TagHighlight'))] + \
+        sys.path
+
+from module.ctags_interface import field_processor, field_processor_bytes, \
+        ParseFields, ParseFieldsBytes
+
+pieces = ['\t', '\t', '\t', ';"', ';"\t', 'kind:', 'file:', 'f', 'x', '_', '-',
+        ' ', 'name', '/^int main(void)$/', 'line:12', 'signature:(int a, char b)',
+        'class:Foo', '\u00e9', '\u00e9t\u00e9', 'kind:f', 'kind:\u00e9', '1', ';', '"',
+        'file:x', 'typeref:struct:s']
+if sys.hexversion < 0x03000000:
+    pieces = [piece.decode('unicode_escape').encode('utf8') for piece in pieces]
+
+def RandomLine(rand):
+    if rand.random() < 0.5:
+        # Something close to a real tag line
+        fields = ['kw{0}'.format(rand.randint(0, 100)), 'dir/file.c',
+                rand.choice(['/^x$/;"', '/^\tx;"\ty$/;"', '42;"', '/^a;"b$/;"'])]
+        fields += [rand.choice(['f', 'kind:v', 'file:', '', 'line:3', 'file:',
+            'signature:(a)', 'x', 'class:C']) for i in range(rand.randint(0, 6))]
+        return '\t'.join(fields)
+    return ''.join([rand.choice(pieces) for i in range(rand.randint(0, 30))])
+
+def FromMatch(m):
+    if m is None:
+        return None
+    return m.group('keyword'), m.group('filename'), m.group('search'), \
+            m.group('kind'), m.group('scope') is not None
+
+def Check(count, seed):
+    rand = random.Random(seed)
+    failures = 0
+    matched = 0
+    for i in range(count):
+        line = RandomLine(rand).strip()
+        expected = FromMatch(field_processor.match(line))
+        if expected is not None:
+            matched += 1
+        result = ParseFields(line)
+        if sys.hexversion > 0x03000000:
+            line_bytes = line.encode('utf8')
+            expected_bytes = FromMatch(field_processor_bytes.match(line_bytes))
+            result_bytes = ParseFieldsBytes(line_bytes)
+        else:
+            expected_bytes = result_bytes = None
+        if result != expected or result_bytes != expected_bytes:
+            failures += 1
+            if failures <= 10:
+                print("Mismatch for {0!r}:\n    regex: {1!r}\n    split: {2!r}".format(line, expected, result))
+    print("Checked {0} lines ({1} tags): {2} mismatches".format(count, matched, failures))
+    return failures == 0
+
+ordinary = 'main\tsrc/main.c\t/^int main(int argc, char *argv[])$/;"\tf\tline:10\tsignature:(int argc, char *argv[])'
+long_signature = 'Method\tsrc/big.cpp\t/^Result Class::Method($/;"\tf\tline:100\tclass:Class\tfile:\tsignature:(' + \
+        ', '.join(['const std::vector<int> &argument{0}'.format(i) for i in range(50)]) + ')'
+
+def _field_parser_test():
+    print("Timing regex (ordinary line):")
+    print(timeit.timeit("field_processor.match(ordinary)", number=100000,
+        setup="from __main__ import field_processor, ordinary"))
+    print("Timing split parser (ordinary line):")
+    print(timeit.timeit("ParseFields(ordinary)", number=100000,
+        setup="from __main__ import ParseFields, ordinary"))
+    print("Timing regex (long signature):")
+    print(timeit.timeit("field_processor.match(long_signature)", number=100000,
+        setup="from __main__ import field_processor, long_signature"))
+    print("Timing split parser (long signature):")
+    print(timeit.timeit("ParseFields(long_signature)", number=100000,
+        setup="from __main__ import ParseFields, long_signature"))
+
+def Run():
+    parser = optparse.OptionParser()
+    parser.add_option('--count', type='int', default=1000000,
+            help='Number of random lines to check')
+    parser.add_option('--seed', type='int', default=0,
+            help='Seed for the random corpus')
+    options, remainder = parser.parse_args()
+
+    passed = Check(options.count, options.seed)
+    _field_parser_test()
+    if not passed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    Run()
@@ -0,0 +1,94 @@
+#!/usr/bin/python
+from __future__ import print_function
+
+# Start-up budget check (a development tool only).  Runs the start-up paths
+# of TagHighlight in fresh python processes and exits with a non-zero status
+# if any of them takes longer than its budget.  Budgets are in milliseconds
+# on top of the time taken to start the python interpreter itself.
+#
+# It also checks that importing the modules does no file access: all of the
+# data should be loaded on first use.
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import optparse
+import subprocess
+
+plugin_dir = os.path.abspath(os.path.join(os.path.dirname(__file__),'../../plugin/TagHighlight'))
+script = os.path.join(plugin_dir, 'TagHighlight.py')
+
+import_code = '''
+import sys
+sys.path.insert(0, {0!r})
+import module.config, module.options, module.loaddata, module.cmd, module.worker
+if len(module.config.config) != 0 or len(module.options.AllOptions) != 0 \\
+        or module.loaddata.data_cache is not None:
+    sys.exit("Importing the modules loaded data")
+'''.format(plugin_dir)
+
+checks = [
+        # Name, command, budget
+        ('import', [sys.executable, '-c', import_code], 50),
+        ('--help', [sys.executable, script, '--help'], 150),
+        ('--print-config', [sys.executable, script, '--print-config'], 250),
+        ]
+
+def TimeCommand(command, cwd, env):
+    devnull = open(os.devnull, 'w')
+    try:
+        t1 = time.time()
+        status = subprocess.call(command, cwd=cwd, env=env, stdout=devnull)
+        t2 = time.time()
+    finally:
+        devnull.close()
+    if status != 0:
+        raise Exception("exit status {0}".format(status))
+    return (t2-t1)*1000.0
+
+def Median(values):
+    values = sorted(values)
+    return values[len(values)//2]
+
+def Run():
+    parser = optparse.OptionParser()
+    parser.add_option('--repeats', type='int', default=7,
+            help='Number of times to run each command (the median is used)')
+    parser.add_option('--scale', type='float', default=1.0,
+            help='Multiply all budgets by this factor (for slow machines)')
+    options, remainder = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp()
+    env = dict(os.environ)
+    # Include the cost of filling the data cache in the first run only
+    env['TAGHIGHLIGHT_CACHE_DIR'] = os.path.join(work_dir, 'cache')
+    failed = False
+    try:
+        interpreter = Median([TimeCommand([sys.executable, '-c', 'pass'], work_dir, env)
+            for i in range(options.repeats)])
+        print('{0:>16} {1:>10} {2:>10} {3:>10}'.format('Check', 'First', 'Median', 'Budget'))
+        print('{0:>16} {1:>10.1f} {2:>10.1f} {3:>10}'.format('interpreter', interpreter, interpreter, '-'))
+        for name, command, budget in checks:
+            try:
+                times = [TimeCommand(command, work_dir, env) - interpreter for i in range(options.repeats)]
+            except Exception as e:
+                print('{0:>16} FAILED: {1}'.format(name, e))
+                failed = True
+                continue
+            budget = budget * options.scale
+            result = Median(times)
+            status = ''
+            if result > budget:
+                status = 'OVER BUDGET'
+                failed = True
+            print('{0:>16} {1:>10.1f} {2:>10.1f} {3:>10.1f} {4}'.format(name, times[0], result, budget, status))
+    finally:
+        shutil.rmtree(work_dir)
+
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    Run()
@@ -0,0 +1,77 @@
+#!/usr/bin/python
+from __future__ import print_function
+
+# Check of the sort used when streaming ctags output (a development tool
+# only).  Generates random sets of tag lines with many tags that are
+# prefixes of other tags (the awkward case for sorting as the lines are
+# read), sorts each the way ctags does (by line), splits it into shards as
+# CtagsJobs does and checks that merging the shards and passing them
+# through GroupSortTagLines gives exactly the order that sorting the lines
+# with ctags_key gives, as used when the tag file is written without
+# StreamTags.  Exits with a non-zero status if any set differs.
+
+import os
+import sys
+import heapq
+import random
+import optparse
+
+sys.path = [os.path.abspath(os.path.join(os.path.dirname(__file__),'../../plugin/TagHighlight'))] + \
+        sys.path
+
+from module.ctags_interface import GroupSortTagLines, DropDuplicateHeaders, ctags_key
+
+headers = [
+        '!_TAG_FILE_FORMAT\t2\t/extended format; --format=1 will not append ;" to lines/',
+        '!_TAG_FILE_SORTED\t1\t/0=unsorted, 1=sorted, 2=foldcase/',
+        '!_TAG_PROGRAM_NAME\tExuberant Ctags\t//',
+        ]
+
+def RandomLines(rand, count):
+    lines = set()
+    for i in range(count):
+        keyword = ''.join(rand.choice('ab_B') for j in range(rand.randint(1, 5)))
+        fields = [keyword, 'dir{0}/file.c'.format(rand.randint(0, 3)),
+                '/^{0}$/;"'.format(keyword), rand.choice('cdfmstv')]
+        if rand.random() < 0.3:
+            fields.append('file:')
+        lines.add('\t'.join(fields))
+    return list(lines)
+
+def Check(sets, count, seed):
+    rand = random.Random(seed)
+    failures = 0
+    for i in range(sets):
+        lines = RandomLines(rand, count)
+        expected = sorted(headers + lines, key=ctags_key)
+        shards = [[] for j in range(rand.randint(1, 4))]
+        for line in lines:
+            rand.choice(shards).append(line)
+        streams = [sorted(headers + shard) for shard in shards]
+        result = list(GroupSortTagLines(DropDuplicateHeaders(heapq.merge(*streams))))
+        if result != expected:
+            failures += 1
+            if failures <= 5:
+                for index, (got, wanted) in enumerate(zip(result, expected)):
+                    if got != wanted:
+                        print("Mismatch at line {0} of set {1}:\n    streamed: {2!r}\n    sorted:   {3!r}".format(
+                            index, i, got, wanted))
+                        break
+    print("Checked {0} sets of {1} lines: {2} mismatches".format(sets, count, failures))
+    return failures == 0
+
+def Run():
+    parser = optparse.OptionParser()
+    parser.add_option('--sets', type='int', default=1000,
+            help='Number of random sets of tag lines to check')
+    parser.add_option('--count', type='int', default=200,
+            help='Number of tag lines in each set')
+    parser.add_option('--seed', type='int', default=0,
+            help='Seed for the random tag lines')
+    options, remainder = parser.parse_args()
+
+    if not Check(options.sets, options.count, options.seed):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    Run()
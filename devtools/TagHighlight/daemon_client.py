@@ -0,0 +1,63 @@
+#!/usr/bin/python
+from __future__ import print_function
+
+# Send requests to a TagHighlight daemon (a development tool only), e.g.:
+#
+#   python TagHighlight.py --daemon --daemon-socket /tmp/taghl.sock &
+#   python daemon_client.py /tmp/taghl.sock ping
+#   python daemon_client.py /tmp/taghl.sock generate -d /path/to/source
+#   cd /path/to/source && python daemon_client.py /tmp/taghl.sock generate
+#   python daemon_client.py /tmp/taghl.sock test /path/to/source
+#   python daemon_client.py /tmp/taghl.sock shutdown
+#
+# The test command sends a ping and then generate requests for the source
+# directory both with -d and (from that directory) without it, printing
+# each response; it fails if any of them does.
+
+import os
+import sys
+import json
+
+sys.path = [os.path.abspath(os.path.join(os.path.dirname(__file__),'../../plugin/TagHighlight'))] + \
+        sys.path
+
+from module.daemon import DaemonClient
+
+def Test(client, args):
+    if len(args) < 1:
+        print("The test command needs a source directory")
+        sys.exit(2)
+    source_dir = os.path.abspath(args[0])
+    responses = [
+            client.Ping(),
+            client.Generate(['-d', source_dir] + args[1:]),
+            client.Generate(args[1:], cwd=source_dir),
+            ]
+    for response in responses:
+        print(json.dumps(response, sort_keys=True))
+    if all(response.get('status') == 'ok' for response in responses):
+        return {'status': 'ok'}
+    return {'status': 'error'}
+
+def Run():
+    if len(sys.argv) < 3 or sys.argv[2] not in ['ping', 'generate', 'test', 'shutdown']:
+        print("Usage: {0} SOCKET ping|shutdown|generate|test [SOURCE] [TagHighlight arguments]".format(sys.argv[0]))
+        sys.exit(2)
+    client = DaemonClient(sys.argv[1])
+    try:
+        if sys.argv[2] == 'test':
+            response = Test(client, sys.argv[3:])
+        elif sys.argv[2] == 'ping':
+            response = client.Ping()
+        elif sys.argv[2] == 'shutdown':
+            response = client.Shutdown()
+        else:
+            response = client.Generate(sys.argv[3:])
+    finally:
+        client.Close()
+    print(json.dumps(response, indent=4, sort_keys=True))
+    if response.get('status') != 'ok':
+        sys.exit(1)
+
+if __name__ == "__main__":
+    Run()
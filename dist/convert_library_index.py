@@ -0,0 +1,116 @@
+#!/usr/bin/python
+
+from __future__ import print_function
+import os
+import sys
+import optparse
+
+# This file is in the dist directory, need to add ../plugin/TagHighlight to
+# module search path
+sys.path = [os.path.abspath(os.path.join(os.path.dirname(__file__),'../plugin/TagHighlight'))] + \
+        sys.path
+
+# Convert standard library types files (.taghl) to an indexed library
+# (.taghlidx) or back again.  If the input is an indexed library, the
+# --language, --kind and --referenced-in options select which part of it
+# is written to the types file.  With --list, the keywords are printed as
+# sorted language:scope:kind:keyword lines instead (for comparing
+# libraries, whichever format they are in).
+
+def LibraryLanguage(types_file):
+    """The first of the TypesSuffixes in the library_types.txt file next to
+    a types file (or None if there isn't one)."""
+    from module.loaddata import ParseFile
+    config = os.path.join(os.path.dirname(os.path.abspath(types_file)), 'library_types.txt')
+    if not os.path.exists(config):
+        return None
+    details = ParseFile(config)[0]
+    suffixes = details.get('TypesSuffixes')
+    if isinstance(suffixes, list):
+        return suffixes[0]
+    return suffixes
+
+def IsLibraryIndex(filename):
+    from module.libraryindex import index_magic
+    fh = open(filename, 'rb')
+    try:
+        return fh.read(len(index_magic)) == index_magic
+    finally:
+        fh.close()
+
+def ListShards(shards):
+    lines = []
+    for shard in shards:
+        prefix = u'{0}:{1}:{2}:'.format(shard['Language'], shard['Scope'] or '', shard['Kind'])
+        lines += [prefix + keyword for keyword in shard['Keywords']]
+        lines += [prefix + u'match ' + pattern for pattern in shard['Matches']]
+    for line in sorted(lines):
+        print(line)
+
+def Run():
+    parser = optparse.OptionParser(usage='%prog [options] input [input ...]')
+    parser.add_option('-o', '--output', default=None,
+            help='File to write (an indexed library if the inputs are types files, otherwise a types file)')
+    parser.add_option('-l', '--language', action='append', default=None,
+            help='Language of the types files (default: from library_types.txt) or languages to select from an indexed library')
+    parser.add_option('-k', '--kind', action='append', default=None,
+            help='Kind (highlight group) to select from an indexed library')
+    parser.add_option('-r', '--referenced-in', action='append', default=None,
+            help='Only select keywords that appear in these source files or directories')
+    parser.add_option('--list', action='store_true', default=False,
+            help='List the keywords instead of writing an output file')
+    options, inputs = parser.parse_args()
+
+    if len(inputs) == 0:
+        parser.error('No input files given')
+    if options.output is None and not options.list:
+        parser.error('No output file given')
+
+    from module.libraryindex import LibraryIndex, ReadTypesFile, \
+            WriteLibraryIndex, WriteTypesFile, ReferencedKeywords
+
+    if IsLibraryIndex(inputs[0]):
+        if len(inputs) > 1:
+            parser.error('Only one indexed library can be converted at a time')
+        keywords = None
+        if options.referenced_in is not None:
+            keywords = ReferencedKeywords(options.referenced_in)
+        index = LibraryIndex(inputs[0])
+        try:
+            shards = index.Select(options.language, options.kind, keywords)
+            commands = index.Commands(options.language)
+        finally:
+            index.close()
+        if options.list:
+            ListShards(shards)
+        else:
+            WriteTypesFile(options.output, shards, commands)
+            print('Wrote {0} keywords in {1} shards to {2}'.format(
+                sum(len(i['Keywords']) for i in shards), len(shards), options.output))
+        return
+
+    if options.kind is not None or options.referenced_in is not None:
+        parser.error('--kind and --referenced-in only apply to indexed libraries')
+    if options.language is not None and len(options.language) > 1:
+        parser.error('Only one language can be given for types files')
+    shards = []
+    commands = {}
+    for types_file in inputs:
+        if options.language is not None:
+            language = options.language[0]
+        else:
+            language = LibraryLanguage(types_file)
+            if language is None:
+                parser.error('No library_types.txt for {0}: the language must be given'.format(types_file))
+        file_shards, file_commands = ReadTypesFile(types_file, language)
+        shards += file_shards
+        commands.setdefault(language, []).extend(file_commands)
+    if options.list:
+        ListShards(shards)
+    else:
+        WriteLibraryIndex(options.output, shards, commands)
+        print('Wrote {0} keywords in {1} shards to {2}'.format(
+            sum(len(i['Keywords']) for i in shards), len(shards), options.output))
+
+if __name__ == "__main__":
+    Run()
@@ -3,8 +3,14 @@
 from __future__ import print_function
 import os
 import sys
-import subprocess
+import json
 import time
+import shutil
+import hashlib
+import optparse
+import tempfile
+import traceback
+import subprocess
 
 # This file is in the dist directory, need to add ../plugin/TagHighlight to
 # module search path
@@ -14,17 +20,21 @@ sys.path = [os.path.abspath(os.path.join(os.path.dirname(__file__),'../plugin/Ta
 library_types_root = os.path.abspath(os.path.join(os.path.dirname(__file__),
     '../plugin/TagHighlight/standard_libraries'))
 
-from module.worker import RunWithOptions
-from module.utilities import TagHighlightOptionDict
-
-library_root = os.path.join(os.environ['HOME'], 'development','libraries')
-tools_dir = os.path.join(library_root, 'tools')
-if not os.path.exists(tools_dir):
-    os.makedirs(tools_dir)
-
-fLog = open(os.path.join(library_root, 'log_%s.txt' % time.strftime('%Y%m%d_%H%M%S')), 'w')
+default_library_root = os.path.join(os.path.expanduser('~'), 'development','libraries')
 
-repo_location = os.path.join(tools_dir, 'repo')
+# Each library is fetched (or updated) and its types file generated in a
+# worker process of its own, so that libraries are built concurrently and
+# each one starts with a clean configuration.  Everything that a library's
+# commands and the generator print goes to a log file for that library.
+#
+# A stamp recording the source tree (the name, size and modification time
+# of every file) and the generator arguments is kept for each library; if
+# neither has changed since the types file was last generated, the library
+# is skipped.
+#
+# With --test, small fixture trees are written in a temporary directory in
+# place of the real libraries (nothing is fetched) and the types files are
+# written there rather than to the standard_libraries directory.
 
 libraries = [
         {
@@ -32,13 +42,13 @@ libraries = [
             'Directory': 'android',
             'Output': 'android_sdk.taghl',
             'Language': 'java',
-            'ToolFetchCommands': [['wget', '-O', repo_location, '--no-check-certificate', 'https://android.git.kernel.org/repo'],
-                ['chmod','a+x',repo_location]],
+            'ToolFetchCommands': [['wget', '-O', '{repo}', '--no-check-certificate', 'https://android.git.kernel.org/repo'],
+                ['chmod','a+x','{repo}']],
             'CanUpdate': True,
-            'UpdateCommands': [[repo_location, 'sync']],
+            'UpdateCommands': [['{repo}', 'sync']],
             'GetStart': 'InDirectory',
-            'GetCommands': [[repo_location,'init','-u','git://android.git.kernel.org/platform/manifest.git'],
-                [repo_location, 'sync']],
+            'GetCommands': [['{repo}','init','-u','git://android.git.kernel.org/platform/manifest.git'],
+                ['{repo}', 'sync']],
             'SkipPatterns': [],
         },
         {
@@ -103,62 +113,268 @@ libraries = [
         },
         ]
 
-if len(sys.argv) > 1:
-    library_list = [i.lower() for i in sys.argv[1:]]
-else:
-    library_list = [i['Name'].lower() for i in libraries]
+# Source files for the --test fixture trees, by language ({name} is
+# replaced by the library's directory name)
+fixture_sources = {
+        'java': [
+            ('src/org/{name}/Widget.java',
+                'package org.{name};\n\n'
+                'public class Widget implements Drawable {{\n'
+                '    public static final int DEFAULT_SIZE = 10;\n'
+                '    private int size;\n'
+                '    public void draw() {{}}\n'
+                '}}\n'),
+            ('src/org/{name}/Drawable.java',
+                'package org.{name};\n\n'
+                'public interface Drawable {{\n'
+                '    void draw();\n'
+                '}}\n'),
+            ],
+        'c': [
+            ('include/{name}_widget.h',
+                '#define {name}_MAX_WIDGETS 16\n'
+                'typedef struct {name}_widget {{ int size; }} {name}_widget_t;\n'
+                'enum {name}_colour {{ {name}_RED, {name}_GREEN }};\n'
+                'int {name}_widget_draw({name}_widget_t *widget);\n'),
+            ('src/{name}_widget.c',
+                '#include "{name}_widget.h"\n'
+                'int {name}_widget_draw({name}_widget_t *widget) {{ return widget->size; }}\n'),
+            ],
+        'python': [
+            ('{name}/widget.py',
+                'DEFAULT_SIZE = 10\n\n'
+                'class Widget(object):\n'
+                '    def draw(self):\n'
+                '        pass\n\n'
+                'def create_widget():\n'
+                '    return Widget()\n'),
+            ],
+        }
 
-def Run():
-    for library in libraries:
-        if library['Name'].lower() in library_list:
-            CreateLibraryTypes(library)
+def WriteFixture(library, source_dir):
+    """Write a small source tree standing in for the library."""
+    for filename, contents in fixture_sources[library['Language']]:
+        path = os.path.join(source_dir, filename.format(name=library['Directory']))
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        fh = open(path, 'w')
+        fh.write(contents.format(name=library['Directory']))
+        fh.close()
+
+def WriteLog(log_file, text):
+    fh = open(log_file, 'a')
+    try:
+        fh.write(text)
+    finally:
+        fh.close()
+
+def RunCommands(commands, cwd, log_file, settings):
+    for command in commands:
+        command = [part.format(**settings) for part in command]
+        WriteLog(log_file, 'Running {0!r} in {1}\n'.format(command, cwd))
+        log = open(log_file, 'a')
+        try:
+            p = subprocess.Popen(command, cwd=cwd, stdout=log, stderr=log)
+            p.communicate()
+        finally:
+            log.close()
+        if p.returncode != 0:
+            raise Exception('{0!r} exited with status {1}'.format(command, p.returncode))
 
-def CreateLibraryTypes(library):
-    os.chdir(library_root)
+def FetchLibrary(library, library_root, log_file):
+    """Get the library's source (or update it if it has been got before)."""
     library_source_dir = os.path.join(library_root, library['Directory'])
-    done = False
+    settings = {'repo': os.path.join(library_root, 'tools', 'repo')}
     if os.path.exists(library_source_dir):
         if library['CanUpdate']:
             # We've downloaded this before, just run the update commands
-            os.chdir(library_source_dir)
-            for command in library['UpdateCommands']:
-                p = subprocess.Popen(command, stdout=fLog, stderr=fLog)
-                p.communicate()
-            done = True
-        else:
-            import shutil
-            shutil.rmtree(library_source_dir)
-    if not done:
-        # New project, we need to get any required tools and then download
-        # the source from scratch
-        for command in library['ToolFetchCommands']:
-            p = subprocess.Popen(command, stdout=fLog, stderr=fLog)
-            p.communicate()
-        if library['GetStart'] == 'InDirectory':
-            os.mkdir(library_source_dir)
-            os.chdir(library_source_dir)
+            RunCommands(library['UpdateCommands'], library_source_dir, log_file, settings)
+            return
+        shutil.rmtree(library_source_dir)
+    # New project, we need to get any required tools and then download
+    # the source from scratch
+    RunCommands(library['ToolFetchCommands'], library_root, log_file, settings)
+    if library['GetStart'] == 'InDirectory':
+        os.mkdir(library_source_dir)
+        RunCommands(library['GetCommands'], library_source_dir, log_file, settings)
+    else:
+        RunCommands(library['GetCommands'], library_root, log_file, settings)
+
+def SourceFingerprint(source_dir):
+    """Hash the name, size and modification time of every source file."""
+    from module.sourcefiles import version_control_directories
+    sha = hashlib.sha1()
+    for root, dirnames, filenames in os.walk(source_dir):
+        dirnames[:] = sorted(i for i in dirnames if i not in version_control_directories)
+        for filename in sorted(filenames):
+            path = os.path.join(root, filename)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            sha.update('{0}\0{1}\0{2!r}\n'.format(os.path.relpath(path, source_dir),
+                stat.st_size, stat.st_mtime).encode('utf8'))
+    return sha.hexdigest()
+
+def GeneratorArguments(library, source_dir, output_dir, tags_dir, ctags):
+    """The TagHighlight.py arguments used to generate the library's types."""
+    args = ['-d', source_dir,
+            '--ctags-file-dir', tags_dir,
+            '--types-file-location', output_dir,
+            '--types-file-name-override', library['Output'],
+            '--include-language', library['Language']]
+    for pattern in library['SkipPatterns']:
+        args += ['--add-skip-pattern', pattern]
+    if ctags is not None:
+        args += ['--ctags-exe-full-path', ctags]
+    return args
+
+def LoadStamp(stamp_file):
+    if not os.path.exists(stamp_file):
+        return None
+    try:
+        fh = open(stamp_file, 'r')
+        try:
+            return json.load(fh)
+        finally:
+            fh.close()
+    except (IOError, ValueError):
+        return None
+
+def SaveStamp(stamp_file, stamp):
+    fh = open(stamp_file, 'w')
+    try:
+        json.dump(stamp, fh, sort_keys=True)
+    finally:
+        fh.close()
+
+def CreateLibraryTypes(job):
+    """Fetch and build one library (run in a worker process of its own).
+
+    Returns the library name, 'built', 'skipped' or 'failed', the time taken
+    and the log file name."""
+    library, settings = job
+    start = time.time()
+    library_root = settings['library_root']
+    log_file = os.path.join(settings['log_dir'], library['Directory'] + '.log')
+    try:
+        source_dir = os.path.join(library_root, library['Directory'])
+        if settings['test']:
+            if not os.path.exists(source_dir):
+                WriteFixture(library, source_dir)
         else:
-            os.chdir(library_root)
-        for command in library['GetCommands']:
-            p = subprocess.Popen(command, stdout=fLog, stderr=fLog)
-            p.communicate()
+            FetchLibrary(library, library_root, log_file)
+
+        output_dir = os.path.join(settings['output_root'], library['Directory'])
+        tags_dir = os.path.join(library_root, 'tags', library['Directory'])
+        for directory in [output_dir, tags_dir]:
+            if not os.path.exists(directory):
+                os.makedirs(directory)
+
+        args = GeneratorArguments(library, source_dir, output_dir, tags_dir, settings['ctags'])
+        stamp = {'Source': SourceFingerprint(source_dir), 'Arguments': args}
+        stamp_file = os.path.join(library_root, 'stamps', library['Directory'] + '.json')
+        output_file = os.path.join(output_dir, library['Output'])
+        if not settings['force'] and os.path.exists(output_file) and LoadStamp(stamp_file) == stamp:
+            WriteLog(log_file, 'Source and arguments unchanged since {0} was generated\n'.format(output_file))
+            return library['Name'], 'skipped', time.time() - start, log_file
+
+        WriteLog(log_file, 'Running TagHighlight.py {0}\n'.format(' '.join(args)))
+        from module.cmd import ProcessCommandLine
+        from module.worker import RunWithOptions
+        options, manually_set = ProcessCommandLine(args + ['--debug', 'Status', '--debug-file', log_file])
+        try:
+            RunWithOptions(options, manually_set)
+        except SystemExit as e:
+            if e.code:
+                raise Exception('TagHighlight exited with status ' + repr(e.code))
+        if not os.path.exists(output_file):
+            raise Exception('No types file generated')
+        SaveStamp(stamp_file, stamp)
+        return library['Name'], 'built', time.time() - start, log_file
+    except Exception:
+        WriteLog(log_file, traceback.format_exc())
+        return library['Name'], 'failed', time.time() - start, log_file
+
+def Run():
+    parser = optparse.OptionParser(usage='%prog [options] [library ...]')
+    parser.add_option('-j', '--jobs', type='int', default=None,
+            help='Number of libraries to build at once (default: number of processors)')
+    parser.add_option('--library-root', default=None,
+            help='Where the library sources are kept (default: ~/development/libraries)')
+    parser.add_option('--output-root', default=None,
+            help='Where to write the types files (default: the standard_libraries directory)')
+    parser.add_option('--ctags', default=None,
+            help='Full path of the ctags executable')
+    parser.add_option('--force', action='store_true', default=False,
+            help='Rebuild libraries even if they have not changed')
+    parser.add_option('--test', action='store_true', default=False,
+            help='Build small fixture trees in a temporary directory instead of the real libraries')
+    options, remainder = parser.parse_args()
+
+    if len(remainder) > 0:
+        library_list = [i.lower() for i in remainder]
+    else:
+        library_list = [i['Name'].lower() for i in libraries]
+    selected = [i for i in libraries if i['Name'].lower() in library_list]
+
+    temporary_root = None
+    library_root = options.library_root
+    output_root = options.output_root
+    if options.test:
+        if library_root is None:
+            temporary_root = tempfile.mkdtemp(prefix='taghl_libraries_')
+            library_root = temporary_root
+        if output_root is None:
+            output_root = os.path.join(library_root, 'output')
+    if library_root is None:
+        library_root = default_library_root
+    if output_root is None:
+        output_root = library_types_root
+    library_root = os.path.abspath(library_root)
+
+    log_dir = os.path.join(library_root, 'logs', time.strftime('%Y%m%d_%H%M%S'))
+    for directory in [os.path.join(library_root, 'tools'), os.path.join(library_root, 'stamps'), log_dir]:
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+    settings = {
+            'library_root': library_root,
+            'output_root': os.path.abspath(output_root),
+            'log_dir': log_dir,
+            'ctags': options.ctags,
+            'force': options.force,
+            'test': options.test,
+            }
+
+    from module.utilities import GetProcessContext
+    import multiprocessing
+    jobs = options.jobs or multiprocessing.cpu_count()
+    jobs = max(1, min(jobs, len(selected)))
+
+    failed = 0
+    start = time.time()
+    # Each library gets a fresh worker process
+    pool = GetProcessContext().Pool(jobs, maxtasksperchild=1)
+    try:
+        for name, status, seconds, log_file in pool.imap_unordered(CreateLibraryTypes,
+                [(library, settings) for library in selected]):
+            print('{0:<12} {1:<8} {2:8.1f}s  {3}'.format(name, status, seconds, log_file))
+            sys.stdout.flush()
+            if status == 'failed':
+                failed += 1
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    print('{0} libraries in {1:.1f}s with {2} jobs, {3} failed'.format(
+        len(selected), time.time() - start, jobs, failed))
+    if temporary_root is not None:
+        print('Test output is in ' + temporary_root)
+    if failed:
+        sys.exit(1)
 
-    output_dir = os.path.join(library_types_root, library['Directory'])
-    if not os.path.exists(output_dir):
-        os.mkdir(output_dir)
-
-    os.chdir(library_root)
-    # Should now have the library; start making the options
-    options = TagHighlightOptionDict()
-    options['recurse'] = True
-    options['types_file_name_override'] = library['Output']
-    options['skip_patterns'] = library['SkipPatterns']
-    options['languages'] = [library['Language']]
-    options['types_file_location'] = output_dir
-    options['source_root'] = library_source_dir
-    options['check_keywords'] = True
-    RunWithOptions(options)
-
-Run()
-
-fLog.close()
+if __name__ == "__main__":
+    Run()
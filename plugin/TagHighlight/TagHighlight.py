@@ -20,7 +20,17 @@ def main():
     from module.cmd import ProcessCommandLine
     from module.worker import RunWithOptions
     options, manually_set = ProcessCommandLine()
-    RunWithOptions(options, manually_set)
+    if options['Daemon']:
+        from module.daemon import RunDaemon
+        RunDaemon(options, manually_set)
+    elif options['Watch']:
+        from module.watch import RunWatch
+        RunWatch(options, manually_set)
+    elif options['Batch'] is not None:
+        from module.batch import RunBatch
+        RunBatch(options, manually_set)
+    else:
+        RunWithOptions(options, manually_set)
 
 if __name__ == "__main__":
     main()
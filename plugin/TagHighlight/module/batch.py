@@ -0,0 +1,352 @@
+#!/usr/bin/env python
+# Tag Highlighter:
+#   Author:  A. S. Budden <abudden _at_ gmail _dot_ com>
+# Copyright: Copyright (C) 2009-2013 A. S. Budden
+#            Permission is hereby granted to use and distribute this code,
+#            with or without modifications, provided that this copyright
+#            notice is copied with it. Like anything else that's free,
+#            the TagHighlight plugin is provided *as is* and comes with no
+#            warranty of any kind, either expressed or implied. By using
+#            this plugin, you agree that in no event will the copyright
+#            holder be liable for any damages resulting from the use
+#            of this software.
+
+# ---------------------------------------------------------------------
+from __future__ import print_function
+import os
+import sys
+import copy
+import json
+import time
+import traceback
+
+if sys.hexversion > 0x03000000:
+    import queue
+else:
+    import Queue as queue
+
+from .config import config, SetInitialOptions, LoadLanguages, ResetOptions
+from .utilities import GetProcessContext
+from .debug import Debug, FlushDebugLog
+
+# In batch mode, the tag and types files are generated for each of the
+# projects listed in a JSON manifest, such as:
+#
+#   {
+#       "args": ["--ctags-exe-full", "/usr/bin/ctags"],
+#       "projects": [
+#           "libfoo",
+#           {"root": "/src/bar", "name": "bar", "args": ["--languages", "c"],
+#               "options": {"IncludeSynMatches": true}}
+#       ]
+#   }
+#
+# (or just the list of projects).  Relative roots are relative to the
+# directory containing the manifest.  Each project starts with the options
+# given on the command line, then the "args" for all projects, then its own
+# "args" (parsed as if they had been given on the command line) and finally
+# its own "options" (a dictionary as passed to RunWithOptions by Vim).  The
+# generator is run from the project's root, so any relative paths in the
+# options are relative to that and the source directory is the root unless
+# it is set for the project.
+#
+# The option specification and the language data are loaded once, before
+# BatchJobs worker processes are forked, and each project is run with its
+# own copy of the options (as with the daemon's workers).  Once all of the
+# projects have been run, a summary of the time taken by each and of any
+# failures is printed (and saved to BatchSummaryFile if it is set) and the
+# instrumentation from all of the projects is combined and saved to
+# InstrumentationFile if that is set.
+
+# Increment this if the format of the summary changes
+summary_version = 1
+
+# Options that apply to the batch rather than to each project
+batch_only_options = ['Batch', 'BatchJobs', 'BatchSummaryFile', 'InstrumentationFile', 'SourceDir']
+
+def LoadManifest(filename):
+    """Get the shared arguments and the list of projects from a manifest."""
+    fh = open(filename, 'r')
+    try:
+        manifest = json.load(fh)
+    finally:
+        fh.close()
+    if isinstance(manifest, list):
+        manifest = {'projects': manifest}
+    if not isinstance(manifest, dict) or not isinstance(manifest.get('projects'), list):
+        raise ValueError("Manifest must be a list of projects or an object with a list of projects")
+    shared_args = manifest.get('args', [])
+    if not isinstance(shared_args, list):
+        raise ValueError("Manifest args must be a list")
+
+    manifest_directory = os.path.dirname(os.path.abspath(filename))
+    projects = []
+    for entry in manifest['projects']:
+        if not isinstance(entry, dict):
+            entry = {'root': entry}
+        if 'root' not in entry:
+            raise ValueError("Project without a root in manifest: " + repr(entry))
+        root = os.path.normpath(os.path.join(manifest_directory, entry['root']))
+        projects.append({
+            'name': entry.get('name', entry['root']),
+            'root': root,
+            'args': list(entry.get('args', [])),
+            'options': dict(entry.get('options', {})),
+            })
+    return shared_args, projects
+
+def ProjectOptions(base_options, base_manually_set, project):
+    """Options for one project: a copy of the base options with the
+    project's arguments and options applied."""
+    from .cmd import ProcessCommandLine
+    from .options import GetAllOptions
+    options = copy.deepcopy(base_options)
+    manually_set = list(base_manually_set)
+    project_set = []
+    if len(project['args']) > 0:
+        parsed, parsed_manually_set = ProcessCommandLine(project['args'])
+        for key in parsed_manually_set:
+            options[key] = parsed[key]
+            project_set.append(key)
+    if not os.path.isdir(project['root']):
+        raise ValueError("Project root is not a directory: " + project['root'])
+    AllOptions = GetAllOptions()
+    for key, value in project['options'].items():
+        if key not in AllOptions:
+            raise ValueError("Unrecognised option: " + key)
+        options[key] = value
+        project_set.append(key)
+    if 'SourceDir' not in project_set:
+        options['SourceDir'] = project['root']
+    for key in project_set + ['SourceDir']:
+        if key not in manually_set:
+            manually_set.append(key)
+    return options, manually_set
+
+def RunProject(project):
+    """Run the generator for a project and report how it went."""
+    from .worker import RunWithOptions
+    from .instrumentation import ResetInstrumentation, GetInstrumentationReport
+    result = {
+            'name': project['name'],
+            'root': project['root'],
+            'status': 'ok',
+            'message': None,
+            }
+    start_directory = os.getcwd()
+    start = time.time()
+    ResetInstrumentation()
+    try:
+        ResetOptions()
+        os.chdir(project['root'])
+        RunWithOptions(project['options'], project['manually_set'])
+    except SystemExit as e:
+        if e.code:
+            result['status'] = 'error'
+            result['message'] = 'Exited with status ' + repr(e.code)
+    except Exception:
+        result['status'] = 'error'
+        result['message'] = traceback.format_exc()
+    finally:
+        os.chdir(start_directory)
+    result['time'] = time.time() - start
+    result['instrumentation'] = GetInstrumentationReport()
+    return result
+
+def BatchWorkerMain(tasks, results):
+    # Only the progress and the summary go to stdout
+    sys.stdout = sys.stderr
+    while 1:
+        project = tasks.get()
+        if project is None:
+            break
+        results.put(RunProject(project))
+
+def RunProjects(projects, jobs, Finished):
+    """Run each project (in worker processes if jobs is more than one),
+    calling Finished with the result of each as it completes."""
+    if jobs <= 1:
+        stdout = sys.stdout
+        sys.stdout = sys.stderr
+        try:
+            for project in projects:
+                Finished(RunProject(project))
+        finally:
+            sys.stdout = stdout
+        return
+
+    # Plain processes rather than a Pool, as the workers of a Pool can't
+    # start the pools used for CtagsJobs and TypesJobs.
+    process_context = GetProcessContext()
+    tasks = process_context.Queue()
+    results = process_context.Queue()
+    workers = []
+    for i in range(jobs):
+        process = process_context.Process(target=BatchWorkerMain, args=(tasks, results))
+        process.start()
+        workers.append(process)
+    for project in projects:
+        tasks.put(project)
+    for process in workers:
+        tasks.put(None)
+
+    remaining = dict((project['root'], project) for project in projects)
+    try:
+        while len(remaining) > 0:
+            try:
+                result = results.get(True, 1.0)
+            except queue.Empty:
+                if any(process.is_alive() for process in workers):
+                    continue
+                # Anything still not reported was lost with a worker
+                break
+            del remaining[result['root']]
+            Finished(result)
+    finally:
+        for process in workers:
+            process.join(5)
+            if process.is_alive():
+                process.terminate()
+
+    for project in projects:
+        if project['root'] in remaining:
+            Finished({
+                'name': project['name'],
+                'root': project['root'],
+                'status': 'error',
+                'message': 'Worker exited unexpectedly',
+                'time': 0.0,
+                'instrumentation': None,
+                })
+
+def PrintSummary(summary, fh):
+    name_width = max([len('Project')] + [len(result['name']) for result in summary['projects']])
+    print('{0:<{width}} {1:<6} {2:>9}'.format('Project', 'Status', 'Time (s)', width=name_width), file=fh)
+    for result in summary['projects']:
+        print('{0:<{width}} {1:<6} {2:>9.3f}'.format(result['name'], result['status'],
+            result['time'], width=name_width), file=fh)
+    print('', file=fh)
+    phases = summary['instrumentation']['phases']
+    for name in sorted(phases.keys()):
+        print('{0:<24} {1:>9.3f}s wall {2:>9.3f}s cpu'.format(name,
+            phases[name]['wall'], phases[name]['cpu']), file=fh)
+    print('{0} projects: {1} succeeded, {2} failed in {3:.3f}s ({4:.3f}s in total)'.format(
+        len(summary['projects']), summary['succeeded'], summary['failed'],
+        summary['time'], sum(result['time'] for result in summary['projects'])), file=fh)
+    for result in summary['projects']:
+        if result['status'] != 'ok':
+            print('', file=fh)
+            print('{0} ({1}) failed:'.format(result['name'], result['root']), file=fh)
+            print(result['message'].rstrip(), file=fh)
+
+def RunBatch(options, manually_set=[]):
+    """Generate the tag and types files for each project in a manifest."""
+    from .options import GetOptionDefaults
+    from .instrumentation import ResetInstrumentation, GetInstrumentationReport, \
+            MergeInstrumentationReport, WriteInstrumentationReport
+
+    try:
+        shared_args, manifest_projects = LoadManifest(options['Batch'])
+    except (IOError, ValueError) as e:
+        Debug("Cannot read batch manifest " + options['Batch'] + ": " + str(e), "Error")
+        FlushDebugLog()
+        sys.exit(1)
+
+    SetInitialOptions(options, manually_set)
+    # Load everything that doesn't depend on the project now so that the
+    # workers don't have to.
+    LoadLanguages()
+    config['LanguageHandler'].GetKindList()
+    from . import worker, ctags_interface, generation
+
+    defaults = GetOptionDefaults()
+    base_options = dict(options)
+    for key in batch_only_options:
+        base_options[key] = defaults[key]
+    base_manually_set = [key for key in manually_set if key not in batch_only_options]
+
+    start = time.time()
+    unique_projects = []
+    for project in manifest_projects:
+        if project['root'] in [i['root'] for i in unique_projects]:
+            Debug("Project " + project['root'] + " is listed more than once: ignoring the repeats", "Warning")
+        else:
+            unique_projects.append(project)
+
+    summary_to_stdout = options['BatchSummaryFile'] == '-'
+    if summary_to_stdout:
+        output = sys.stderr
+    else:
+        output = sys.stdout
+
+    results = {}
+    reports = []
+    def Finished(result):
+        report = result.pop('instrumentation')
+        if report is not None:
+            reports.append(report)
+        results[result['root']] = result
+        print('[{0}/{1}] {2}: {3} ({4:.3f}s)'.format(len(results), len(unique_projects),
+            result['name'], result['status'], result['time']), file=output)
+        output.flush()
+
+    projects = []
+    for project in unique_projects:
+        try:
+            project['options'], project['manually_set'] = ProjectOptions(base_options,
+                    base_manually_set, dict(project, args=shared_args + project['args']))
+        except SystemExit:
+            message = 'Invalid arguments: ' + ' '.join(shared_args + project['args'])
+        except ValueError as e:
+            message = str(e)
+        else:
+            projects.append(project)
+            continue
+        Finished({'name': project['name'], 'root': project['root'], 'status': 'error',
+            'message': message, 'time': 0.0, 'instrumentation': None})
+
+    jobs = int(options['BatchJobs'])
+    if jobs <= 0:
+        import multiprocessing
+        jobs = multiprocessing.cpu_count()
+    jobs = max(1, min(jobs, len(projects)))
+    Debug("Running {0} projects with {1} processes", "Information", len(projects), jobs)
+    FlushDebugLog()
+
+    RunProjects(projects, jobs, Finished)
+
+    # Projects run in this process reset the instrumentation, so it is only
+    # combined once they have all finished.
+    ResetInstrumentation()
+    for report in reports:
+        MergeInstrumentationReport(report)
+    summary_results = [results[project['root']] for project in unique_projects]
+    failed = len([result for result in summary_results if result['status'] != 'ok'])
+    summary = {
+            'version': summary_version,
+            'time': time.time() - start,
+            'jobs': jobs,
+            'succeeded': len(summary_results) - failed,
+            'failed': failed,
+            'projects': summary_results,
+            'instrumentation': GetInstrumentationReport(),
+            }
+
+    print('', file=output)
+    PrintSummary(summary, output)
+    if options['BatchSummaryFile'] is not None:
+        text = json.dumps(summary, indent=2, sort_keys=True)
+        if summary_to_stdout:
+            print(text)
+        else:
+            fh = open(options['BatchSummaryFile'], 'w')
+            try:
+                fh.write(text + '\n')
+            finally:
+                fh.close()
+    if options['InstrumentationFile'] is not None:
+        WriteInstrumentationReport(options['InstrumentationFile'])
+    FlushDebugLog()
+
+    if failed > 0:
+        sys.exit(1)
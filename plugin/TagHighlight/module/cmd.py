@@ -18,13 +18,14 @@ import os
 import optparse
 
 from .config import SetInitialOptions, LoadLanguages
-from .options import AllOptions
+from .options import GetAllOptions
 import ast
 
 def DictHandler(option, opt_str, value, parser):
     setattr(parser.values, option.dest, ast.literal_eval(value))
 
-def ProcessCommandLine():
+def ProcessCommandLine(args=None):
+    AllOptions = GetAllOptions()
     parser = optparse.OptionParser()
     pyoptions = []
 
@@ -63,10 +64,13 @@ def ProcessCommandLine():
                     help=AllOptions[dest]['Help'])
         else:
             optparse_type='string'
+            default='DEFAULT_OPTION_USED'
             if AllOptions[dest]['Type'] in ['string', 'int']:
                 action='store'
             elif AllOptions[dest]['Type'] == 'list':
                 action='append'
+                # optparse appends to the default, so it can't be a string
+                default=None
             else:
                 # TODO: This needs handling somehow
                 pyoptions.remove(dest)
@@ -74,17 +78,17 @@ def ProcessCommandLine():
                 raise Exception('Unrecognised option type: ' + AllOptions[dest]['Type'])
             parser.add_option(*AllOptions[dest]['CommandLineSwitches'],
                     action=action,
-                    default='DEFAULT_OPTION_USED',
+                    default=default,
                     type=optparse_type,
                     dest=dest,
                     help=AllOptions[dest]['Help'])
 
-    options, remainder = parser.parse_args()
+    options, remainder = parser.parse_args(args)
     manually_set = []
     optdict = vars(options)
 
     for dest in pyoptions:
-        if optdict[dest] == 'DEFAULT_OPTION_USED':
+        if optdict[dest] == 'DEFAULT_OPTION_USED' or optdict[dest] is None:
             optdict[dest] = AllOptions[dest]['Default']
         else:
             manually_set.append(dest)
@@ -15,12 +15,12 @@
 import sys
 import os
 
-from optparse import Values
 from .utilities import TagHighlightOptionDict
-from .loaddata import LoadFile, LoadDataFile, SetLoadDataDirectory
-from .debug import SetDebugLogFile, SetDebugLogLevel, Debug
+from .loaddata import LoadFile, LoadDataFile, SetLoadDataDirectory, SaveDataCache
+from .debug import SetDebugLogFile, SetDebugLogLevel, SetDebugWriterThread, Debug
 
 config = TagHighlightOptionDict()
+initialised = False
 
 def SetDataDirectories():
     global config
@@ -60,22 +60,47 @@ def LoadVersionInfo():
                 'revision_id': 'Unreleased',
                 }
 
+def Initialise():
+    """Find the data and load the version information.
+
+    This is done on first use rather than when the module is imported, so
+    that importing it does no file access."""
+    global initialised
+    if initialised:
+        return
+    SetDataDirectories()
+    LoadVersionInfo()
+    initialised = True
+
 def SetInitialOptions(new_options, manual_options):
     global config
+    Initialise()
     for key in new_options:
         config[key] = new_options[key]
     if 'DebugLevel' in config:
         SetDebugLogLevel(config['DebugLevel'])
     if 'DebugFile' in config:
         SetDebugLogFile(config['DebugFile'])
+    if 'DebugWriterThread' in config:
+        SetDebugWriterThread(config['DebugWriterThread'])
     config['ManuallySetOptions'] = manual_options
 
+def ResetOptions():
+    """Forget the options set for a previous run, keeping the loaded data."""
+    global config
+    preserved = ['DataDirectory', 'VersionInfoDir', 'Release', 'Version', 'LanguageHandler']
+    for key in list(config.keys()):
+        if key not in preserved:
+            del config[key]
+    SetDebugLogLevel('None')
+    SetDebugLogFile(None)
+    SetDebugWriterThread(False)
+
 def LoadLanguages():
     global config
-    if 'LanguageHandler' in config:
-        return
-    from .languages import Languages
-    config['LanguageHandler'] = Languages(config)
+    if 'LanguageHandler' not in config:
+        from .languages import Languages
+        config['LanguageHandler'] = Languages(config)
 
     full_language_list = config['LanguageHandler'].GetAllLanguages()
     if len(config['Languages']) == 0:
@@ -83,7 +108,5 @@ def LoadLanguages():
         config['LanguageList'] = full_language_list
     else:
         config['LanguageList'] = [i for i in full_language_list if i in config['Languages']]
-    Debug("Languages:\n\t{0!r}\n\t{1!r}".format(full_language_list, config['LanguageList']), "Information")
-
-SetDataDirectories()
-LoadVersionInfo()
+    Debug("Languages:\n\t{0!r}\n\t{1!r}", "Information", full_language_list, config['LanguageList'])
+    SaveDataCache()
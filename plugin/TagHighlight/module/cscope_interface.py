@@ -15,47 +15,124 @@
 from __future__ import print_function
 import subprocess
 import os
+import sys
+import tempfile
 import threading
+import collections
 
-from .debug import Debug
+from .debug import Debug, DebugEnabled
+from .instrumentation import Phase
+
+# The suffixes of the files that cscope scans when it searches the
+# directory tree itself (from issrcfile in cscope's dir.c)
+cscope_suffixes = set(['c', 'h', 'l', 'y', 'C', 'G', 'H', 'L',
+    'bp', 'qc', 'qh', 'sd', 'cc', 'hh',
+    'tcc', 'cpp', 'cxx', 'hpp', 'hxx'])
+
+# Number of lines of cscope output to report if it fails
+cscope_error_lines = 20
 
 class CscopeThread(threading.Thread):
-    def __init__(self, root, command):
-        self.root = root
-        self.command = command
+    """Wait for cscope, passing its output on to the debug log."""
+    def __init__(self, process, file_list):
+        self.process = process
+        self.file_list = file_list
         super(CscopeThread, self).__init__()
 
     def run(self):
-        os.chdir(self.root)
-
-        #subprocess.call(" ".join(cscope_cmd), shell = (os.name != 'nt'))
-        # shell=True stops the command window popping up
-        # We don't use stdin, but have to define it in order
-        # to get round python bug 3905
-        # http://bugs.python.org/issue3905
-        process = subprocess.Popen(self.command,
-                stdin=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                stdout=subprocess.PIPE
-                )#, shell=True)
-        (sout, serr) = process.communicate()
+        with Phase('Cscope'):
+            last_lines = collections.deque(maxlen=cscope_error_lines)
+            try:
+                for line in iter(self.process.stdout.readline, b''):
+                    if sys.hexversion > 0x03000000:
+                        line = line.decode('utf8', 'replace')
+                    line = line.rstrip()
+                    last_lines.append(line)
+                    Debug("cscope: {0}", "Information", line)
+            finally:
+                self.process.stdout.close()
+                exit_code = self.process.wait()
+                os.remove(self.file_list)
+        if exit_code != 0:
+            Debug("cscope exited with status {0}:\n{1}", "Error", exit_code, '\n'.join(last_lines))
 
 cscopeThread = None
 
+def IsCscopeSourceFile(filename):
+    base, dot, suffix = os.path.basename(filename).rpartition('.')
+    return dot != '' and suffix in cscope_suffixes
+
+def QuoteCscopeFileName(filename):
+    # cscope splits the lines of the -i file on white space unless the name
+    # is quoted
+    if ' ' in filename or '\t' in filename or '"' in filename:
+        return '"' + filename.replace('\\', '\\\\').replace('"', '\\"') + '"'
+    return filename
+
+def WriteCscopeFileList(options):
+    """Write the cscope -i file list and return its (absolute) name.
+
+    cscope is given the same files as ctags (those that cscope would have
+    scanned itself with -R), so the tree is only walked once."""
+    from .sourcefiles import GetSourceFiles
+    fd, file_list = tempfile.mkstemp(prefix=options['CscopeFileName'] + '.',
+            suffix='.files', dir=options['CscopeFileLocation'])
+    fh = os.fdopen(fd, 'w')
+    try:
+        for filename in GetSourceFiles(options):
+            if IsCscopeSourceFile(filename):
+                fh.write(QuoteCscopeFileName(filename) + '\n')
+    finally:
+        fh.close()
+    return os.path.abspath(file_list)
+
 def StartCscopeDBGeneration(options):
     global cscopeThread
-    root = options['SourceDir']
+    root = os.path.abspath(options['SourceDir'])
+
+    # The file list is made in the source directory (as in GenerateTags),
+    # so that it matches the one given to ctags.  cscope is run there too,
+    # without changing the working directory of this process.
+    start_directory = os.getcwd()
+    os.chdir(root)
+    try:
+        file_list = WriteCscopeFileList(options)
+    finally:
+        os.chdir(start_directory)
 
-    args = ['-b', '-f', options['CscopeFileFull']]
+    # cscope only rescans the files that have changed since the database
+    # was last built (as -u is never given).
+    args = ['-b', '-f', options['CscopeFileFull'], '-i', file_list]
 
-    if options['Recurse']:
-        args.append('-R')
+    if options['CscopeInvertedIndex']:
+        args.append('-q')
+    if options['CscopeKernelMode']:
+        args.append('-k')
+    if DebugEnabled('Information'):
+        # Report progress
+        args.append('-v')
 
     cscope_cmd = [options['CscopeExeFull']] + args
 
-    Debug("cscope command is " + repr(cscope_cmd), "Information")
+    Debug("cscope command is {0!r}", "Information", cscope_cmd)
+
+    # We don't use stdin, but have to define it in order
+    # to get round python bug 3905
+    # http://bugs.python.org/issue3905
+    try:
+        process = subprocess.Popen(cscope_cmd,
+                cwd=root,
+                stdin=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                stdout=subprocess.PIPE
+                )
+    except OSError as e:
+        os.remove(file_list)
+        Debug("Could not run cscope: {0}", "Error", e)
+        return
+    process.stdin.close()
 
-    cscopeThread = CscopeThread(root, cscope_cmd)
+    cscopeThread = CscopeThread(process, file_list)
     cscopeThread.start()
 
 def CompleteCscopeDBGeneration():
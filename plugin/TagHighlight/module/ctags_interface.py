@@ -16,16 +16,19 @@ from __future__ import print_function
 import subprocess
 import os
 import re
-import glob
 import sys
-from .utilities import TagDB, FileTagDB, rglob
+import threading
+import tempfile
+import itertools
+import shutil
+import heapq
+from .utilities import openutf8, AtomicFile
+from .sourcefiles import GetSourceFiles, GetSourceFileListFile
+from .tagstore import TagStore
+from .external_sort import ExternalSort
 from .languages import Languages
 from .debug import Debug
-
-if sys.hexversion > 0x03000000:
-    openutf8 = lambda f, mode: open(f, mode, encoding="utf8", errors="ignore")
-else:
-    openutf8 = lambda f, mode: open(f, mode)
+from .instrumentation import Phase, Count
 
 field_processor = re.compile(
 r'''
@@ -57,117 +60,656 @@ r'''
 
 field_const = re.compile(r'\bconst\b')
 
+# Versions of the above for parsing the tag file as bytes
+field_processor_bytes = re.compile(field_processor.pattern.encode('ascii'), re.VERBOSE)
+
+if sys.hexversion > 0x03000000:
+    decodeutf8 = lambda b: b.decode('utf8', 'ignore')
+else:
+    decodeutf8 = lambda b: b
+
+def FieldParser(tab, search_end, kind_prefix, file_scope, underscore, fallback):
+    """Make a function that splits a (stripped) tag line into its keyword,
+    file name, search pattern, kind and whether it is file-scoped.
+
+    The result is the same as matching field_processor, but the line is
+    split on tabs rather than matched with a backtracking regular
+    expression.  The constants are either all strings or all bytes; fallback
+    is the matching version of field_processor, which is only used for
+    malformed lines (without a search pattern or kind).  Returns None if
+    the line isn't a tag."""
+    search_end_length = len(search_end)
+    kind_field_length = len(kind_prefix) + 1
+    def ParseFields(line):
+        fields = line.split(tab, 2)
+        if len(fields) == 3:
+            # The search pattern may contain tabs, so the extension fields
+            # start after the first ;" that is followed by a tab.
+            end = fields[2].find(search_end)
+            if end != -1:
+                extension_fields = fields[2][end+search_end_length:].split(tab)
+                # The kind is the last field that is a single word character,
+                # with or without "kind:" in front of it.
+                for index in range(len(extension_fields)-1, -1, -1):
+                    field = extension_fields[index]
+                    length = len(field)
+                    if length == 1:
+                        kind = field
+                    elif length == kind_field_length and field.startswith(kind_prefix):
+                        kind = field[-1:]
+                    else:
+                        continue
+                    if not (kind.isalnum() or kind == underscore):
+                        continue
+                    # The file-scope indicator can follow the kind, with
+                    # anything except empty fields or other "file:" fields in
+                    # between.
+                    scoped = False
+                    for field in extension_fields[index+1:]:
+                        if field == file_scope:
+                            scoped = True
+                            break
+                        if not field or field.startswith(file_scope):
+                            break
+                    return fields[0], fields[1], fields[2][:end], kind, scoped
+
+        m = fallback.match(line)
+        if m is None:
+            return None
+        return m.group('keyword'), m.group('filename'), m.group('search'), \
+                m.group('kind'), m.group('scope') is not None
+    return ParseFields
+
+ParseFields = FieldParser('\t', ';"\t', 'kind:', 'file:', '_', field_processor)
+ParseFieldsBytes = FieldParser(b'\t', b';"\t', b'kind:', b'file:', b'_', field_processor_bytes)
+
+def GetCtagsVariant(options):
+    if 'CtagsVariant' in options['ManuallySetOptions']:
+        return options['CtagsVariant']
+    return 'exuberant'
+
+def GetCtagsCommand(options):
+    if 'CtagsArguments' in options['ManuallySetOptions']:
+        args = options['CtagsArguments']
+    else:
+        args = ctags_variant_args[GetCtagsVariant(options)](options)
+
+    ctags_cmd = [options['CtagsExeFull']] + args
+
+    Debug("ctags command is {0!r}", "Information", ctags_cmd)
+
+    return ctags_cmd
+
+def UsingGeneratedExuberantArgs(options):
+    """Check whether TagHighlight is generating the arguments for exuberant ctags."""
+    if not options['TagFileName']:
+        return False
+    if 'CtagsArguments' in options['ManuallySetOptions']:
+        return False
+    if GetCtagsVariant(options) != 'exuberant':
+        return False
+    return True
+
+def GetCtagsJobs(options):
+    """Number of ctags processes to run (sharding needs exuberant ctags)."""
+    jobs = int(options['CtagsJobs'])
+    if jobs > 1 and UsingGeneratedExuberantArgs(options):
+        return jobs
+    return 1
+
+def CanStreamTags(options):
+    """Check whether the ctags output can be parsed as it is generated.
+
+    This relies on ctags writing sorted tags to stdout, so it is only
+    supported for exuberant ctags with arguments generated by TagHighlight.
+    Must be called from the source directory."""
+    if not UsingGeneratedExuberantArgs(options):
+        return False
+    if options['TagRelative'] and \
+            os.path.abspath(options['CtagsFileLocation']) != os.path.abspath('.'):
+        # ctags writes paths relative to the current directory when writing
+        # to stdout, which won't match the tag file location.
+        return False
+    return True
+
+def UsingIncrementalTags(options):
+    return options['IncrementalTags'] and UsingGeneratedExuberantArgs(options)
+
+def TagFileOutput(options):
+    """Where ctags should write its output."""
+    if options['StreamTags'] and CanStreamTags(options):
+        return '-'
+    return os.path.join(options['CtagsFileLocation'], options['TagFileName'])
+
 def GenerateTags(options):
     Debug("Generating Tags", "Information")
 
     # Change the working directory to the source root
-    # now so that argument globs work correctly.
+    # now so that the source file list is relative to it.
     os.chdir(options['SourceDir'])
 
-    if 'CtagsArguments' in options['ManuallySetOptions']:
-        args = options['CtagsArguments']
-    else:
-        if 'CtagsVariant' in options['ManuallySetOptions']:
-            variant = options['CtagsVariant']
-        else:
-            variant = 'exuberant'
-        args = ctags_variant_args[variant](options)
+    tag_file = os.path.join(options['CtagsFileLocation'], options['TagFileName'])
 
-    ctags_cmd = [options['CtagsExeFull']] + args
+    manifest_files = None
+    if UsingIncrementalTags(options):
+        from .incremental import UpdateTags, SnapshotSourceFiles
+        if UpdateTags(options):
+            return
+        manifest_files = SnapshotSourceFiles(options)
 
-    Debug("ctags command is " + repr(ctags_cmd), "Information")
+    jobs = GetCtagsJobs(options)
+    ctags_output = tag_file
+    if jobs > 1:
+        tagLines = GenerateShardedTags(options, jobs)
+    else:
+        if UsingGeneratedExuberantArgs(options):
+            # Have ctags write next to the tag file so that the tag file
+            # itself is only replaced if the sorted tags have changed.
+            fd, ctags_output = tempfile.mkstemp(prefix=options['TagFileName'] + '.',
+                    suffix='.ctags', dir=options['CtagsFileLocation'])
+            os.close(fd)
+            ctags_cmd = [options['CtagsExeFull']] + \
+                    ExuberantGetCommandArgs(options, tag_file=ctags_output)
+            Debug("ctags command is {0!r}", "Information", ctags_cmd)
+        else:
+            ctags_cmd = GetCtagsCommand(options)
+
+        #subprocess.call(" ".join(ctags_cmd), shell = (os.name != 'nt'))
+        # shell=True stops the command window popping up
+        # We don't use stdin, but have to define it in order
+        # to get round python bug 3905
+        # http://bugs.python.org/issue3905
+        with Phase('RunCtags'):
+            process = subprocess.Popen(ctags_cmd,
+                    stdin=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    stdout=subprocess.PIPE
+                    )#, shell=True)
+            (sout, serr) = process.communicate()
+
+        tagLines = ReadStrippedLines(ctags_output)
+
+    try:
+        # With more than one job, this includes running ctags as the
+        # shards' output is read as it is merged.
+        with Phase('SortTags'):
+            memory_limit = int(options['TagSortMemoryLimit'])
+            if memory_limit > 0:
+                # Also sort the file a bit better (tag, then kind, then filename),
+                # spilling to temporary files to stay within the memory limit.
+                # The input is consumed before ExternalSort returns.
+                tagLines = ExternalSort(tagLines, ctags_key, memory_limit * 1024 * 1024)
+            else:
+                tagLines = list(tagLines)
 
-    #subprocess.call(" ".join(ctags_cmd), shell = (os.name != 'nt'))
-    # shell=True stops the command window popping up
-    # We don't use stdin, but have to define it in order
-    # to get round python bug 3905
-    # http://bugs.python.org/issue3905
-    process = subprocess.Popen(ctags_cmd,
-            stdin=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            stdout=subprocess.PIPE
-            )#, shell=True)
-    (sout, serr) = process.communicate()
+                # Also sort the file a bit better (tag, then kind, then filename)
+                tagLines.sort(key=ctags_key)
+    finally:
+        if ctags_output != tag_file and os.path.exists(ctags_output):
+            os.remove(ctags_output)
 
-    tagFile = openutf8(os.path.join(options['CtagsFileLocation'], options['TagFileName']), 'r')
-    tagLines = [line.strip() for line in tagFile]
-    tagFile.close()
+    with Phase('WriteTagFile'):
+        tagFile = AtomicFile(tag_file, lambda name: openutf8(name, 'w'))
+        try:
+            for line in tagLines:
+                tagFile.write(line + "\n")
+        except:
+            tagFile.discard()
+            raise
+        ReportTagFileWrite(tag_file, tagFile.close())
+
+    if manifest_files is not None:
+        from .incremental import SaveManifest
+        SaveManifest(options, manifest_files)
+
+def ReportTagFileWrite(tag_file, changed):
+    if changed:
+        Debug("Rewrote " + tag_file, "Status")
+    else:
+        Debug(tag_file + " unchanged, not rewritten", "Status")
+
+def ReadStrippedLines(filename):
+    tagFile = openutf8(filename, 'r')
+    try:
+        for line in tagFile:
+            yield line.strip()
+    finally:
+        tagFile.close()
+
+def ShardSourceFiles(files, jobs):
+    """Split the files into (up to) jobs lists of roughly equal total size.
+
+    Largest files are allocated first, each to the currently smallest
+    shard."""
+    sized_files = []
+    for filename in files:
+        try:
+            size = os.path.getsize(filename)
+        except OSError:
+            size = 0
+        sized_files.append((-size, filename))
+    sized_files.sort()
+
+    shards = [(0, index, []) for index in range(min(jobs, len(files)))]
+    for negative_size, filename in sized_files:
+        total, index, shard_files = heapq.heappop(shards)
+        shard_files.append(filename)
+        heapq.heappush(shards, (total - negative_size, index, shard_files))
+    return [shard_files for total, index, shard_files in sorted(shards, key=lambda x: x[1])]
+
+def WriteShardLists(options, jobs, list_dir):
+    """Write the -L file lists for each shard and return their names."""
+    shards = ShardSourceFiles(GetSourceFiles(options), jobs)
+    Debug("Running ctags in {0} shards of {1} files".format(len(shards),
+        repr([len(i) for i in shards])), "Information")
+    list_files = []
+    for index, shard_files in enumerate(shards):
+        list_file = os.path.join(list_dir, 'shard_{0}.txt'.format(index))
+        fh = openutf8(list_file, 'w')
+        for filename in shard_files:
+            fh.write(filename + '\n')
+        fh.close()
+        list_files.append(list_file)
+    return list_files
+
+def GenerateShardedTags(options, jobs):
+    """Run several ctags processes concurrently, each over a share of the
+    source files, and return an iterator over the combined tag lines.
+
+    The shard outputs are written next to the tag file so that relative
+    paths are the same as they would be for a single ctags run."""
+    list_dir = tempfile.mkdtemp(prefix='taghl_ctags_')
+    outputs = []
+    try:
+        processes = []
+        for list_file in WriteShardLists(options, jobs, list_dir):
+            fd, output = tempfile.mkstemp(prefix=options['TagFileName'] + '.',
+                    suffix='.shard', dir=options['CtagsFileLocation'])
+            os.close(fd)
+            outputs.append(output)
+            ctags_cmd = [options['CtagsExeFull']] + \
+                    ExuberantGetCommandArgs(options, tag_file=output, file_list=list_file)
+            Debug("ctags command is {0!r}", "Information", ctags_cmd)
+            log = tempfile.TemporaryFile(dir=list_dir)
+            processes.append((subprocess.Popen(ctags_cmd,
+                stdin=subprocess.PIPE,
+                stderr=log,
+                stdout=log), log))
+        for process, log in processes:
+            process.stdin.close()
+            process.wait()
+            log.close()
+    except:
+        for output in outputs:
+            os.remove(output)
+        raise
+    finally:
+        shutil.rmtree(list_dir, ignore_errors=True)
+
+    return MergeShardOutputs(outputs)
+
+def MergeShardOutputs(outputs):
+    try:
+        lines = itertools.chain(*[ReadStrippedLines(output) for output in outputs])
+        for line in DropDuplicateHeaders(lines):
+            yield line
+    finally:
+        for output in outputs:
+            os.remove(output)
+
+def DropDuplicateHeaders(lines):
+    """Every ctags run writes the pseudo-tag header: only keep one copy."""
+    headers = set()
+    for line in lines:
+        if line.startswith('!_TAG_'):
+            if line in headers:
+                continue
+            headers.add(line)
+        yield line
+
+def GenerateAndParseTags(options):
+    """Run ctags and parse its output as it is generated.
+
+    ctags writes to stdout and each line is passed through the sort, written
+    to the tag file and parsed in a single pass, so the tag file is only
+    written once and never read back.
+    """
+    Debug("Generating and parsing tags", "Information")
 
-    # Also sort the file a bit better (tag, then kind, then filename)
-    tagLines.sort(key=ctags_key)
+    os.chdir(options['SourceDir'])
 
-    tagFile = openutf8(os.path.join(options['CtagsFileLocation'],options['TagFileName']), 'w')
-    for line in tagLines:
-        tagFile.write(line + "\n")
-    tagFile.close()
+    if not CanStreamTags(options):
+        Debug("Cannot stream tags with these options, generating tag file first", "Information")
+        GenerateTags(options)
+        return ParseTags(options)
+
+    manifest_files = None
+    if UsingIncrementalTags(options):
+        from .incremental import UpdateTags, SnapshotSourceFiles
+        if UpdateTags(options):
+            return ParseTags(options)
+        manifest_files = SnapshotSourceFiles(options)
+
+    list_dir = None
+    jobs = GetCtagsJobs(options)
+    if jobs > 1:
+        # Each shard's output is sorted, so merging them keeps the stream
+        # sorted by tag.
+        list_dir = tempfile.mkdtemp(prefix='taghl_ctags_')
+        ctags_cmds = [[options['CtagsExeFull']] +
+                ExuberantGetCommandArgs(options, file_list=list_file)
+                for list_file in WriteShardLists(options, jobs, list_dir)]
+        for ctags_cmd in ctags_cmds:
+            Debug("ctags command is {0!r}", "Information", ctags_cmd)
+    else:
+        ctags_cmds = [GetCtagsCommand(options)]
+
+    processes = []
+    error_threads = []
+    tagFile = None
+    try:
+        for ctags_cmd in ctags_cmds:
+            # We don't use stdin, but have to define it in order
+            # to get round python bug 3905
+            # http://bugs.python.org/issue3905
+            process = subprocess.Popen(ctags_cmd,
+                    stdin=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    stdout=subprocess.PIPE
+                    )
+            process.stdin.close()
+            processes.append(process)
+
+            # Drain stderr in the background so that ctags can't block on it
+            error_thread = threading.Thread(target=process.stderr.read)
+            error_thread.start()
+            error_threads.append(error_thread)
+
+        tag_file = os.path.join(options['CtagsFileLocation'],options['TagFileName'])
+        tagFile = AtomicFile(tag_file, lambda name: openutf8(name, 'w'))
+        if len(processes) == 1:
+            lines = ReadProcessLines(processes[0].stdout)
+        else:
+            lines = DropDuplicateHeaders(heapq.merge(
+                *[ReadProcessLines(process.stdout) for process in processes]))
+        lines = GroupSortTagLines(lines)
+        lines = WriteTagLines(tagFile, lines)
+        result = ParseTagLines(options, lines)
+        ReportTagFileWrite(tag_file, tagFile.close())
+        tagFile = None
+    finally:
+        if tagFile is not None:
+            tagFile.discard()
+        for process in processes:
+            process.stdout.close()
+            process.wait()
+        for error_thread in error_threads:
+            error_thread.join()
+        for process in processes:
+            process.stderr.close()
+        if list_dir is not None:
+            shutil.rmtree(list_dir, ignore_errors=True)
+
+    if manifest_files is not None:
+        from .incremental import SaveManifest
+        SaveManifest(options, manifest_files)
+
+    return result
+
+def ReadProcessLines(stream):
+    for line in iter(stream.readline, b''):
+        if sys.hexversion > 0x03000000:
+            line = line.decode('utf8', 'ignore')
+        yield line.strip()
+
+def GroupSortTagLines(lines):
+    """Sort the tags (into ctags_key order) as they are read.
+
+    ctags output is already sorted by tag.  ctags_key puts the kind straight
+    after the tag, so the lines for a tag can only be out of order with the
+    lines for longer tags that start with it (e.g. ab with kind f sorts after
+    abc with kind d).  The lines are therefore held until a tag that doesn't
+    start with the first held tag is read, as none of the later lines can
+    sort before any of the held ones."""
+    group = []
+    group_keyword = None
+    for line in lines:
+        keyword = line.split('\t', 1)[0]
+        if group_keyword is None or not keyword.startswith(group_keyword):
+            group.sort(key=ctags_key)
+            for entry in group:
+                yield entry
+            group = []
+            group_keyword = keyword
+        group.append(line)
+    group.sort(key=ctags_key)
+    for entry in group:
+        yield entry
+
+def WriteTagLines(fh, lines):
+    for line in lines:
+        fh.write(line + "\n")
+        yield line
+
+def ReadTagFileLines(fh):
+    while 1:
+        try:
+            line = fh.readline()
+        except UnicodeDecodeError:
+            continue
+        if not line:
+            break
+        yield line
 
 def ParseTags(options):
     """Function to parse the tags file and generate a dictionary containing language keys.
 
     Each entry is a list of tags with all the required details.
     """
+    tag_file = os.path.join(options['CtagsFileLocation'],options['TagFileName'])
+    if options['MmapTagFile']:
+        return ParseMappedTagFile(options, tag_file)
+    p = openutf8(tag_file, 'r')
+    try:
+        return ParseTagLines(options, ReadTagFileLines(p))
+    finally:
+        p.close()
+
+def ParseMappedTagFile(options, tag_file):
+    """Parse the tag file by memory-mapping it and working on bytes."""
+    import mmap
+    p = open(tag_file, 'rb')
+    try:
+        if os.fstat(p.fileno()).st_size == 0:
+            # Empty files can't be mapped
+            return ParseTagBytes(options, [])
+        mapped = mmap.mmap(p.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            lines = iter(mapped.readline, b'')
+            if sys.hexversion > 0x03000000 and mapped.find(b'\r') != -1:
+                # Text mode would have treated carriage returns as line endings
+                lines = SplitCarriageReturns(lines)
+            return ParseTagBytes(options, lines)
+        finally:
+            mapped.close()
+    finally:
+        p.close()
+
+def SplitCarriageReturns(lines):
+    """Split lines in the same way as reading the file in text mode."""
+    for line in lines:
+        if b'\r' in line:
+            for part in line.replace(b'\r\n', b'\n').replace(b'\r', b'\n').split(b'\n'):
+                yield part
+        else:
+            yield line
+
+def TagCollector(options, decode=None):
+    """Make the functions that filter parsed tags and store them, shared by
+    ParseTagLines and ParseTagBytes.
+
+    Returns a function that adds a tag, given the languages that it matched
+    and its fields (as returned by ParseFields), for each language unless
+    the language's tag types or skip list exclude its kind, and a function
+    that records the counters and returns the unscoped and file-scoped tags,
+    given the number of lines read.  The fields are strings or, if decode is
+    given, bytes that it turns into strings: only those that are needed are
+    decoded."""
     languages = options['LanguageHandler']
     kind_list = languages.GetKindList()
 
-    # Language: {Type: set([keyword, keyword, keyword])}
-    ctags_entries = TagDB()
+    # Language: {Type: set([keyword, keyword, keyword])} and
     # Language: {File: {Type: set([keyword, keyword, keyword])}}
-    file_entries = FileTagDB()
+    tag_store = TagStore()
+
+    # Look the options up once rather than for every tag
+    parse_constants = options['ParseConstants']
+    ignore_file_scope = options['IgnoreFileScope']
+    language_tag_types = options['LanguageTagTypes']
+    skip_lists = {}
+    decoded_kinds = {}
+    skipped = {}
+    # A list so that AddTag can update it
+    lines_matched = [0]
+
+    def AddTag(matched_languages, tag_fields):
+        keyword, filename, search, short_kind, scoped = tag_fields
+        lines_matched[0] += 1
+        if decode is not None:
+            if short_kind not in decoded_kinds:
+                decoded_kinds[short_kind] = decode(short_kind)
+            short_kind = decoded_kinds[short_kind]
+        decoded_keyword = None
+        for key in matched_languages:
+            try:
+                kind = kind_list[key]['ctags_' + short_kind]
+                if parse_constants and \
+                        (key == 'c') and \
+                        (kind == 'CTagsGlobalVariable'):
+                    if decode is not None:
+                        search = decode(search)
+                    if field_const.search(search) is not None:
+                        kind = 'CTagsConstant'
+                if key in language_tag_types:
+                    if short_kind not in language_tag_types[key]:
+                        skipped[key, 'language_tag_types'] = skipped.get((key, 'language_tag_types'), 0) + 1
+                        continue
+                else:
+                    if key not in skip_lists:
+                        skip_lists[key] = languages.GetLanguageHandler(key)['SkipList']
+                    if short_kind in skip_lists[key]:
+                        skipped[key, 'skip_list'] = skipped.get((key, 'skip_list'), 0) + 1
+                        continue
+
+                if decoded_keyword is None:
+                    if decode is None:
+                        decoded_keyword = keyword
+                    else:
+                        decoded_keyword = decode(keyword)
+                        if scoped and not ignore_file_scope:
+                            filename = decode(filename)
+
+                if ignore_file_scope or not scoped:
+                    tag_store.Add(key, kind, decoded_keyword)
+                else:
+                    tag_store.Add(key, kind, decoded_keyword, filename)
+
+            except KeyError:
+                Debug("Unrecognised kind '{kind}' for language {language}".format(kind=short_kind, language=key), "Error")
+                skipped[key, 'unrecognised_kind'] = skipped.get((key, 'unrecognised_kind'), 0) + 1
+
+    def Finish(lines_read):
+        # Lines are matched if they are for a known language and can be
+        # parsed; the tags are then skipped (for each language) by reason.
+        Count('tag_lines_read', lines_read)
+        Count('tag_lines_matched', lines_matched[0])
+        for (language, reason), amount in skipped.items():
+            Count('skipped_' + reason, amount, language)
+        tag_store.Compact()
+        return tag_store.UnscopedTags(), tag_store.FileScopedTags()
+
+    return AddTag, Finish
+
+def ParseTagLines(options, lines):
+    """Parse an iterable of lines from a tag file."""
+    AddTag, Finish = TagCollector(options)
+
+    # Split the filename on its extension once per line and look the
+    # language(s) up directly rather than trying every language's regular
+    # expression in turn.  Only languages whose extension matcher is too
+    # complicated to expand need the regular expression.
+    extension_table, fallback_matchers = options['LanguageHandler'].GetExtensionDispatch()
+
+    lines_read = 0
+    for line in lines:
+        lines_read += 1
+        fields = line.split('\t', 2)
+        if len(fields) < 3:
+            continue
+        extension = fields[1].rpartition('.')
+        if extension[1]:
+            matched_languages = extension_table.get(extension[2], [])
+        else:
+            matched_languages = []
+        if fallback_matchers:
+            matched_languages = matched_languages + \
+                    [key for key, lineMatcher in fallback_matchers.items() if lineMatcher.match(line)]
 
-    lineMatchers = {}
-    for key in languages.GetAllLanguages():
-        lineMatchers[key] = re.compile(
-                r'^.*?\t[^\t]*\.(?P<extension>' +
-                languages.GetLanguageHandler(key)['PythonExtensionMatcher'] +
-                ')\t')
+        if not matched_languages:
+            continue
 
-    p = openutf8(os.path.join(options['CtagsFileLocation'],options['TagFileName']), 'r')
-    while 1:
-        try:
-            line = p.readline()
-        except UnicodeDecodeError:
+        # We have a match
+        tag_fields = ParseFields(line.strip())
+        if tag_fields is None:
             continue
-        if not line:
-            break
+        AddTag(matched_languages, tag_fields)
+
+    return Finish(lines_read)
 
-        for key, lineMatcher in list(lineMatchers.items()):
-            if lineMatcher.match(line):
-                # We have a match
-                m = field_processor.match(line.strip())
-                if m is not None:
-                    try:
-                        new_entry = None
-                        short_kind = 'ctags_' + m.group('kind')
-                        kind = kind_list[key][short_kind]
-                        keyword = m.group('keyword')
-                        if options['ParseConstants'] and \
-                                (key == 'c') and \
-                                (kind == 'CTagsGlobalVariable'):
-                            if field_const.search(m.group('search')) is not None:
-                                kind = 'CTagsConstant'
-                        if key in options['LanguageTagTypes']:
-                            if m.group('kind') in options['LanguageTagTypes'][key]:
-                                new_entry = keyword
-                        elif m.group('kind') not in languages.GetLanguageHandler(key)['SkipList']:
-                            new_entry = keyword
-
-                        if new_entry is None:
-                            continue
-
-                        if m.group('scope') is None or options['IgnoreFileScope']:
-                            ctags_entries[key][kind].add(new_entry)
-                        else:
-                            if m.group('filename') not in file_entries:
-                                file_entries[m.group('filename')] = TagDB()
-                            file_entries[key][m.group('filename')][kind].add(new_entry)
-
-                    except KeyError:
-                        Debug("Unrecognised kind '{kind}' for language {language}".format(kind=m.group('kind'), language=key), "Error")
-    p.close()
-
-    return ctags_entries, file_entries
-
-def ExuberantGetCommandArgs(options):
+def ParseTagBytes(options, lines):
+    """Parse an iterable of lines (as bytes) from a tag file.
+
+    The result is the same as decoding the lines and passing them to
+    ParseTagLines (once any carriage returns have been dealt with by
+    SplitCarriageReturns), but only the parts of the tags that are kept are
+    decoded."""
+    AddTag, Finish = TagCollector(options, decodeutf8)
+
+    extension_table, fallback_matchers = options['LanguageHandler'].GetExtensionDispatch()
+    extension_table = dict((extension.encode('utf8'), matched_languages)
+            for extension, matched_languages in extension_table.items())
+
+    lines_read = 0
+    for line in lines:
+        lines_read += 1
+        fields = line.split(b'\t', 2)
+        if len(fields) < 3:
+            continue
+        extension = fields[1].rpartition(b'.')
+        if extension[1]:
+            matched_languages = extension_table.get(extension[2], [])
+        else:
+            matched_languages = []
+        if fallback_matchers:
+            text_line = decodeutf8(line)
+            matched_languages = matched_languages + \
+                    [key for key, lineMatcher in fallback_matchers.items() if lineMatcher.match(text_line)]
+
+        if not matched_languages:
+            continue
+
+        tag_fields = ParseFieldsBytes(line.strip())
+        if tag_fields is None:
+            continue
+        AddTag(matched_languages, tag_fields)
+
+    return Finish(lines_read)
+
+def ExuberantGetCommandArgs(options, tag_file=None, file_list=None):
+    """Generate the arguments for exuberant ctags.
+
+    If file_list is given, the files listed in it are scanned (with -L)
+    instead of the source directory; tag_file overrides the output file."""
     args = []
 
     ctags_languages = [l['CTagsName'] for l in options['LanguageHandler'].GetAllLanguageHandlers()]
@@ -183,7 +725,9 @@ def ExuberantGetCommandArgs(options):
         args += ['--tag-relative=no']
 
     if options['TagFileName']:
-        args += ['-f', os.path.join(options['CtagsFileLocation'], options['TagFileName'])]
+        if tag_file is None:
+            tag_file = TagFileOutput(options)
+        args += ['-f', tag_file]
 
     if not options['IncludeDocs']:
         args += ["--exclude=docs", "--exclude=Documentation"]
@@ -195,7 +739,7 @@ def ExuberantGetCommandArgs(options):
             """Finds the key associated with a value in a dictionary.
 
             Assumes presence has already been checked."""
-            Debug("Finding local variable types from " + repr(language_kinds), "Information")
+            Debug("Finding local variable types from {0!r}", "Information", language_kinds)
             return "".join(key[-1] for key,val in language_kinds.items() if val == 'CTagsLocalVariable')
 
         for language in ctags_languages:
@@ -206,9 +750,6 @@ def ExuberantGetCommandArgs(options):
             else:
                 Debug("Skipping language: " + language, "Information")
 
-    if options['Recurse']:
-        args += ['--recurse']
-
     args += ['--fields=+iaSszt']
     args += ['--c-kinds=+p', '--c++-kinds=+p']
     args += ['--extra=+q']
@@ -218,20 +759,22 @@ def ExuberantGetCommandArgs(options):
     if 'CtagsExtraArguments' in options:
         args += options['CtagsExtraArguments']
 
-    # Must be last as it includes the file list:
-    if options['Recurse']:
-        args += ['.']
-    else:
-        args += glob.glob(os.path.join(options['SourceDir'],'*'))
+    # Must be last as it includes the file list.  Unless another list is
+    # given, ctags scans the source files listed by GetSourceFiles (with
+    # the ignore rules applied), which avoids any limit on the length of
+    # the command line.
+    if file_list is None:
+        file_list = GetSourceFileListFile(options)
+    args += ['-L', file_list]
 
-    Debug("Command arguments: " + repr(args), "Information")
+    Debug("Command arguments: {0!r}", "Information", args)
 
     return args
 
 def JSCtagsGetCommandArgs(options):
     args = []
     if options['TagFileName']:
-        args += ['-f', os.path.join(options['CtagsFileLocation'], options['TagFileName'])]
+        args += ['-f', TagFileOutput(options)]
 
     # If user specified extra arguments are required, add them
     # immediately before the file list
@@ -240,14 +783,11 @@ def JSCtagsGetCommandArgs(options):
 
     # jsctags isn't very ctags-compatible: if you give it a directory
     # and expect it to recurse, it fails on the first non-javascript
-    # file.  Therefore, we have to assume all javascript files have .js
-    # extensions and we have to find them ourselves.  This may well fail
-    # on Windows if there are a lot of them due to the limited command
-    # length on Windows.
-    if options['Recurse']:
-        args += rglob('.', '*.js')
-    else:
-        args += glob.glob('*.js')
+    # file and it can't read a list of files.  Therefore, we have to
+    # assume all javascript files have .js extensions and give it those
+    # from the source file list.  This may well fail on Windows if there
+    # are a lot of them due to the limited command length on Windows.
+    args += [i for i in GetSourceFiles(options) if i.endswith('.js')]
     return args
 
 ctags_variant_args = {
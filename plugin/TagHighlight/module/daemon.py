@@ -0,0 +1,355 @@
+#!/usr/bin/env python
+# Tag Highlighter:
+#   Author:  A. S. Budden <abudden _at_ gmail _dot_ com>
+# Copyright: Copyright (C) 2009-2013 A. S. Budden
+#            Permission is hereby granted to use and distribute this code,
+#            with or without modifications, provided that this copyright
+#            notice is copied with it. Like anything else that's free,
+#            the TagHighlight plugin is provided *as is* and comes with no
+#            warranty of any kind, either expressed or implied. By using
+#            this plugin, you agree that in no event will the copyright
+#            holder be liable for any damages resulting from the use
+#            of this software.
+
+# ---------------------------------------------------------------------
+from __future__ import print_function
+import os
+import sys
+import json
+import time
+import socket
+import threading
+import traceback
+
+from .config import config, LoadLanguages, ResetOptions
+from .utilities import GetProcessContext
+from .debug import Debug
+
+# The daemon reads JSON requests, one per line, and writes one JSON response
+# line for each.  Requests look like:
+#
+#   {"id": 1, "command": "generate", "args": ["-d", "/path/to/source"]}
+#   {"id": 2, "command": "generate", "options": {...}, "manually_set": [...]}
+#   {"id": 3, "command": "ping"}
+#   {"id": 4, "command": "shutdown"}
+#
+# "args" are parsed as if they had been given on the command line; "options"
+# is a dictionary of options as passed to RunWithOptions by Vim.  The request
+# is run from the directory "cwd" (if given).  Responses are of the form:
+#
+#   {"id": 1, "status": "ok", "time": 0.25}
+#   {"id": 1, "status": "error", "message": "..."}
+#
+# Each project (source directory) is handled by its own worker process,
+# forked from the daemon once the configuration and language data have been
+# loaded.  Requests for the same project are handled in turn; requests for
+# different projects run concurrently.
+
+def ProjectWorkerMain(connection):
+    # Anything printed by the generator must not end up in the responses
+    sys.stdout = sys.stderr
+    while 1:
+        try:
+            request = connection.recv()
+        except EOFError:
+            break
+        if request is None:
+            break
+        cwd, options, manually_set = request
+        start = time.time()
+        try:
+            from .worker import RunWithOptions
+            ResetOptions()
+            os.chdir(cwd)
+            RunWithOptions(options, manually_set)
+            response = {'status': 'ok', 'time': time.time() - start}
+        except SystemExit as e:
+            if e.code:
+                response = {'status': 'error', 'message': 'Exited with status ' + repr(e.code)}
+            else:
+                response = {'status': 'ok', 'time': time.time() - start}
+        except Exception:
+            response = {'status': 'error', 'message': traceback.format_exc()}
+        connection.send(response)
+    connection.close()
+
+class ProjectWorker(object):
+    """A worker process that handles requests for one project in turn."""
+    def __init__(self, project):
+        self.project = project
+        self.lock = threading.Lock()
+        process_context = GetProcessContext()
+        self.connection, child_connection = process_context.Pipe()
+        self.process = process_context.Process(target=ProjectWorkerMain,
+                args=(child_connection,))
+        self.process.daemon = True
+        self.process.start()
+        child_connection.close()
+
+    def Generate(self, cwd, options, manually_set):
+        self.lock.acquire()
+        try:
+            if not self.process.is_alive():
+                return {'status': 'error', 'message': 'Worker for ' + self.project + ' has exited'}
+            self.connection.send((cwd, options, manually_set))
+            try:
+                return self.connection.recv()
+            except EOFError:
+                return {'status': 'error', 'message': 'Worker for ' + self.project + ' exited unexpectedly'}
+        finally:
+            self.lock.release()
+
+    def Stop(self):
+        self.lock.acquire()
+        try:
+            if self.process.is_alive():
+                try:
+                    self.connection.send(None)
+                except (IOError, OSError):
+                    pass
+            self.process.join(5)
+            if self.process.is_alive():
+                self.process.terminate()
+            self.connection.close()
+        finally:
+            self.lock.release()
+
+class TagHighlightDaemon(object):
+    def __init__(self, idle_timeout):
+        self.idle_timeout = idle_timeout
+        self.workers = {}
+        self.workers_lock = threading.Lock()
+        self.last_activity = time.time()
+        self.active_requests = 0
+        self.activity_lock = threading.Lock()
+        self.stopping = threading.Event()
+
+    def GetWorker(self, project):
+        self.workers_lock.acquire()
+        try:
+            if project not in self.workers or not self.workers[project].process.is_alive():
+                Debug("Starting worker for " + project, "Information")
+                self.workers[project] = ProjectWorker(project)
+            return self.workers[project]
+        finally:
+            self.workers_lock.release()
+
+    def ParseRequestOptions(self, request):
+        if 'args' in request:
+            from .cmd import ProcessCommandLine
+            options, manually_set = ProcessCommandLine(request['args'])
+        else:
+            options = dict(request.get('options', {}))
+            manually_set = list(request.get('manually_set', options.keys()))
+        return options, manually_set
+
+    def HandleRequest(self, request):
+        response = {}
+        if isinstance(request, dict) and 'id' in request:
+            response['id'] = request['id']
+        self.activity_lock.acquire()
+        self.active_requests += 1
+        self.last_activity = time.time()
+        self.activity_lock.release()
+        try:
+            if not isinstance(request, dict):
+                response.update({'status': 'error', 'message': 'Request must be a JSON object'})
+            elif request.get('command') == 'ping':
+                response.update({'status': 'ok', 'pid': os.getpid(),
+                    'projects': sorted(self.workers.keys())})
+            elif request.get('command') == 'shutdown':
+                response.update({'status': 'ok'})
+                self.stopping.set()
+            elif request.get('command') == 'generate':
+                try:
+                    options, manually_set = self.ParseRequestOptions(request)
+                except SystemExit:
+                    response.update({'status': 'error', 'message': 'Invalid arguments'})
+                else:
+                    cwd = request.get('cwd', os.getcwd())
+                    if not options.get('SourceDir'):
+                        # SourceDir defaults to None: use the request's
+                        # directory, as the generator needs one
+                        options['SourceDir'] = '.'
+                    project = os.path.abspath(os.path.join(cwd, options['SourceDir']))
+                    response.update(self.GetWorker(project).Generate(cwd, options, manually_set))
+            else:
+                response.update({'status': 'error',
+                    'message': 'Unrecognised command: ' + repr(request.get('command'))})
+        except Exception:
+            response.update({'status': 'error', 'message': traceback.format_exc()})
+        finally:
+            self.activity_lock.acquire()
+            self.active_requests -= 1
+            self.last_activity = time.time()
+            self.activity_lock.release()
+        return response
+
+    def HandleLine(self, line, Respond):
+        try:
+            request = json.loads(line)
+        except ValueError:
+            Respond({'status': 'error', 'message': 'Invalid JSON'})
+            return
+        Respond(self.HandleRequest(request))
+
+    def IsIdle(self):
+        if self.idle_timeout <= 0:
+            return False
+        self.activity_lock.acquire()
+        try:
+            return self.active_requests == 0 and \
+                    (time.time() - self.last_activity) > self.idle_timeout
+        finally:
+            self.activity_lock.release()
+
+    def WatchIdle(self):
+        while not self.stopping.is_set():
+            if self.IsIdle():
+                Debug("Daemon idle, exiting", "Information")
+                self.stopping.set()
+            self.stopping.wait(1.0)
+
+    def StopWorkers(self):
+        self.workers_lock.acquire()
+        try:
+            for worker in self.workers.values():
+                worker.Stop()
+            self.workers = {}
+        finally:
+            self.workers_lock.release()
+
+    def ServeStdin(self):
+        output_lock = threading.Lock()
+        stdout = sys.stdout
+        # Debug output must not be mixed in with the responses
+        sys.stdout = sys.stderr
+        def Respond(response):
+            output_lock.acquire()
+            try:
+                stdout.write(json.dumps(response) + '\n')
+                stdout.flush()
+            finally:
+                output_lock.release()
+
+        def ReadRequests():
+            threads = []
+            for line in iter(sys.stdin.readline, ''):
+                if self.stopping.is_set():
+                    break
+                if not line.strip():
+                    continue
+                thread = threading.Thread(target=self.HandleLine, args=(line, Respond))
+                thread.start()
+                threads.append(thread)
+            for thread in threads:
+                thread.join()
+            self.stopping.set()
+
+        reader = threading.Thread(target=ReadRequests)
+        reader.daemon = True
+        reader.start()
+        self.WatchIdle()
+
+    def ServeSocket(self, socket_path):
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(socket_path)
+        server.listen(5)
+        server.settimeout(1.0)
+        idle_thread = threading.Thread(target=self.WatchIdle)
+        idle_thread.start()
+        try:
+            while not self.stopping.is_set():
+                try:
+                    connection, address = server.accept()
+                except socket.timeout:
+                    continue
+                connection.settimeout(None)
+                thread = threading.Thread(target=self.ServeConnection, args=(connection,))
+                thread.daemon = True
+                thread.start()
+        finally:
+            self.stopping.set()
+            idle_thread.join()
+            server.close()
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+
+    def ServeConnection(self, connection):
+        fh = connection.makefile('rb')
+        write_lock = threading.Lock()
+        def Respond(response):
+            write_lock.acquire()
+            try:
+                connection.sendall((json.dumps(response) + '\n').encode('utf8'))
+            finally:
+                write_lock.release()
+        try:
+            for line in iter(fh.readline, b''):
+                if not line.strip():
+                    continue
+                self.HandleLine(line.decode('utf8'), Respond)
+                if self.stopping.is_set():
+                    break
+        except (IOError, OSError):
+            pass
+        finally:
+            fh.close()
+            connection.close()
+
+def RunDaemon(options, manually_set=[]):
+    """Handle generate requests until told to shut down or idle for too long."""
+    from .config import SetInitialOptions
+    SetInitialOptions(options, manually_set)
+    # Load everything that doesn't depend on the project now so that the
+    # workers don't have to.
+    LoadLanguages()
+    config['LanguageHandler'].GetKindList()
+    from . import worker, ctags_interface, generation
+
+    daemon = TagHighlightDaemon(int(options['DaemonIdleTimeout']))
+    socket_path = options['DaemonSocket']
+    try:
+        if socket_path in [None, 'None']:
+            daemon.ServeStdin()
+        else:
+            daemon.ServeSocket(socket_path)
+    finally:
+        daemon.StopWorkers()
+
+class DaemonClient(object):
+    """Minimal client for a daemon listening on a Unix domain socket."""
+    def __init__(self, socket_path, timeout=None):
+        self.connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.connection.settimeout(timeout)
+        self.connection.connect(socket_path)
+        self.fh = self.connection.makefile('rb')
+        self.next_id = 1
+
+    def Request(self, request):
+        request = dict(request)
+        if 'id' not in request:
+            request['id'] = self.next_id
+            self.next_id += 1
+        self.connection.sendall((json.dumps(request) + '\n').encode('utf8'))
+        line = self.fh.readline()
+        if not line:
+            raise IOError("Connection closed by daemon")
+        return json.loads(line.decode('utf8'))
+
+    def Generate(self, args, cwd=None):
+        if cwd is None:
+            cwd = os.getcwd()
+        return self.Request({'command': 'generate', 'args': args, 'cwd': cwd})
+
+    def Ping(self):
+        return self.Request({'command': 'ping'})
+
+    def Shutdown(self):
+        return self.Request({'command': 'shutdown'})
+
+    def Close(self):
+        self.fh.close()
+        self.connection.close()
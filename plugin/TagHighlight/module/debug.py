@@ -15,32 +15,163 @@
 from __future__ import print_function
 
 import os
+import sys
+import atexit
+import threading
+
+if sys.hexversion > 0x03000000:
+    import queue
+else:
+    import Queue as queue
 
 debug_log_levels = ('None', 'Critical', 'Error', 'Warning', 'Status', 'Information')
+debug_log_indices = dict((level, index) for index, level in enumerate(debug_log_levels))
 debug_log_file = None
 debug_log_level = 'None'
+debug_log_index = 0
+
+# The log file is opened once and kept open (and buffered) until the log
+# file changes, FlushDebugLog is called (at the end of each run, before
+# forking and at exit) or the process exits.
+debug_log_handle = None
+debug_log_lock = threading.Lock()
+
+# If enabled, messages are written to the log file by a background thread
+debug_writer_enabled = False
+debug_writer = None
 
 def SetDebugLogFile(filename):
     global debug_log_file
+    if filename != debug_log_file:
+        CloseDebugLog()
     debug_log_file = filename
 
 def SetDebugLogLevel(level):
-    global debug_log_level
+    global debug_log_level, debug_log_index
+    if level not in debug_log_indices:
+        raise Exception("Invalid log level: " + level)
     debug_log_level = level
+    debug_log_index = debug_log_indices[level]
+
+def SetDebugWriterThread(enabled):
+    global debug_writer_enabled
+    if not enabled:
+        StopDebugWriter()
+    debug_writer_enabled = enabled
 
-def Debug(msg, level):
-    if level not in debug_log_levels:
+def DebugEnabled(level):
+    """Check whether messages at this level would be logged.
+
+    Used to avoid building messages (or doing anything else just for the
+    log) in loops when they would be thrown away."""
+    return debug_log_indices[level] <= debug_log_index
+
+def Debug(msg, level, *args):
+    """Log a message at the specified level.
+
+    If args are given, the message is formatted with them (using
+    str.format) only if the level is enabled, so expensive arguments (such
+    as the repr of a large dictionary) should be passed this way."""
+    try:
+        this_index = debug_log_indices[level]
+    except KeyError:
         raise Exception("Invalid log level: " + level)
-    this_index = debug_log_levels.index(level)
-    current_index = debug_log_levels.index(debug_log_level)
 
-    if this_index > current_index:
+    if this_index > debug_log_index:
         return
 
+    if args:
+        msg = msg.format(*args)
+
     if debug_log_file is None:
         print(msg)
+    elif debug_writer_enabled:
+        GetDebugWriter().queue.put(msg)
     else:
-        fh = open(debug_log_file, 'a')
-        fh.write(msg)
-        fh.write("\n")
-        fh.close()
+        WriteDebugMessage(msg)
+
+def WriteDebugMessage(msg):
+    global debug_log_handle
+    debug_log_lock.acquire()
+    try:
+        if debug_log_handle is None:
+            debug_log_handle = open(debug_log_file, 'a')
+        debug_log_handle.write(msg)
+        debug_log_handle.write("\n")
+    finally:
+        debug_log_lock.release()
+
+class DebugWriter(threading.Thread):
+    """Thread that writes queued messages to the log file."""
+    def __init__(self):
+        super(DebugWriter, self).__init__()
+        self.daemon = True
+        self.queue = queue.Queue()
+        self.pid = os.getpid()
+
+    def run(self):
+        while 1:
+            msg = self.queue.get()
+            try:
+                if msg is None:
+                    break
+                WriteDebugMessage(msg)
+                if self.queue.empty():
+                    FlushDebugHandle()
+            except (IOError, OSError):
+                # There's nowhere to report this, but the thread must keep
+                # going so that FlushDebugLog doesn't wait forever.
+                pass
+            finally:
+                self.queue.task_done()
+
+def GetDebugWriter():
+    global debug_writer
+    if debug_writer is None or debug_writer.pid != os.getpid():
+        # A forked process doesn't get the parent's thread, so it needs
+        # its own.
+        debug_writer = DebugWriter()
+        debug_writer.start()
+    return debug_writer
+
+def StopDebugWriter():
+    global debug_writer
+    if debug_writer is not None and debug_writer.pid == os.getpid():
+        debug_writer.queue.put(None)
+        debug_writer.join()
+    debug_writer = None
+
+def FlushDebugHandle():
+    debug_log_lock.acquire()
+    try:
+        if debug_log_handle is not None:
+            debug_log_handle.flush()
+    finally:
+        debug_log_lock.release()
+
+def FlushDebugLog():
+    """Write out any buffered (or queued) messages."""
+    if debug_writer is not None and debug_writer.pid == os.getpid():
+        debug_writer.queue.join()
+    FlushDebugHandle()
+
+def CloseDebugLog():
+    global debug_log_handle
+    StopDebugWriter()
+    debug_log_lock.acquire()
+    try:
+        if debug_log_handle is not None:
+            debug_log_handle.close()
+            debug_log_handle = None
+    finally:
+        debug_log_lock.release()
+
+def ResetDebugLock():
+    global debug_log_lock
+    debug_log_lock = threading.Lock()
+
+atexit.register(CloseDebugLog)
+if hasattr(os, 'register_at_fork'):
+    # Otherwise a forked process would write the buffered messages again
+    # (or find the lock held by a thread that it doesn't have)
+    os.register_at_fork(before=FlushDebugLog, after_in_child=ResetDebugLock)
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# Tag Highlighter:
+#   Author:  A. S. Budden <abudden _at_ gmail _dot_ com>
+# Copyright: Copyright (C) 2009-2013 A. S. Budden
+#            Permission is hereby granted to use and distribute this code,
+#            with or without modifications, provided that this copyright
+#            notice is copied with it. Like anything else that's free,
+#            the TagHighlight plugin is provided *as is* and comes with no
+#            warranty of any kind, either expressed or implied. By using
+#            this plugin, you agree that in no event will the copyright
+#            holder be liable for any damages resulting from the use
+#            of this software.
+
+# ---------------------------------------------------------------------
+from __future__ import print_function
+import os
+import sys
+import heapq
+import shutil
+import tempfile
+from operator import itemgetter
+
+from .debug import Debug
+
+# Chunk files must not have their line endings translated: a stray carriage
+# return in a tag line would otherwise split the record.
+if sys.hexversion > 0x03000000:
+    openchunk = lambda f, mode: open(f, mode, encoding="utf8", errors="ignore", newline="\n")
+else:
+    openchunk = lambda f, mode: open(f, mode + 'b')
+
+# Approximate cost of the list entry and tuple holding each record, on top
+# of the strings themselves.
+record_overhead = 120
+
+# Maximum number of chunk files to merge at once
+max_merge_width = 64
+
+def ExternalSort(lines, key, memory_limit, temp_dir=None):
+    """Sort an iterable of strings (which must not contain newlines).
+
+    Records are gathered into chunks of (roughly) no more than memory_limit
+    bytes, each of which is sorted and written to a temporary file along
+    with its precomputed sort key.  The chunks are then merged.  The result
+    is identical to sorted(lines, key=key).
+
+    All of the input is consumed before this function returns; the return
+    value is an iterator over the sorted lines.
+    """
+    chunk_dir = None
+    chunk_files = []
+    chunk = []
+    chunk_size = 0
+    try:
+        for line in lines:
+            record_key = key(line)
+            chunk.append((record_key, line))
+            chunk_size += sys.getsizeof(line) + sys.getsizeof(record_key) + record_overhead
+            if chunk_size >= memory_limit:
+                if chunk_dir is None:
+                    chunk_dir = tempfile.mkdtemp(prefix='taghl_sort_', dir=temp_dir)
+                chunk_files.append(WriteChunk(chunk_dir, len(chunk_files), chunk))
+                chunk = []
+                chunk_size = 0
+    except:
+        if chunk_dir is not None:
+            shutil.rmtree(chunk_dir, ignore_errors=True)
+        raise
+
+    chunk.sort(key=itemgetter(0))
+    if chunk_dir is None:
+        # Everything fitted in memory
+        return (line for record_key, line in chunk)
+
+    # Keep the number of files open at once (and their buffers) bounded by
+    # merging groups of chunks into larger chunks first if necessary.
+    while len(chunk_files) >= max_merge_width:
+        merged_files = []
+        for start in range(0, len(chunk_files), max_merge_width):
+            group = chunk_files[start:start+max_merge_width]
+            filename = os.path.join(chunk_dir, 'merged_{0}_{1}'.format(len(chunk_files), start))
+            fh = openchunk(filename, 'w')
+            try:
+                for record_key, index, sequence, line in MergeSources(group, []):
+                    fh.write(record_key + '\n' + line + '\n')
+            finally:
+                fh.close()
+            for old_file in group:
+                os.remove(old_file)
+            merged_files.append(filename)
+        chunk_files = merged_files
+
+    Debug("Merging {0} sorted chunks".format(len(chunk_files) + 1), "Information")
+    return MergeChunks(chunk_dir, chunk_files, chunk)
+
+def WriteChunk(chunk_dir, index, chunk):
+    chunk.sort(key=itemgetter(0))
+    filename = os.path.join(chunk_dir, 'chunk_{0}'.format(index))
+    fh = openchunk(filename, 'w')
+    try:
+        for record_key, line in chunk:
+            fh.write(record_key + '\n' + line + '\n')
+    finally:
+        fh.close()
+    return filename
+
+def ReadChunk(filename, index):
+    fh = openchunk(filename, 'r')
+    try:
+        sequence = 0
+        while 1:
+            record_key = fh.readline()
+            if not record_key:
+                break
+            line = fh.readline()
+            # Include the chunk index and sequence number so that the merge
+            # keeps records with equal keys in their original order and
+            # never has to compare the lines themselves.
+            yield (record_key[:-1], index, sequence, line[:-1])
+            sequence += 1
+    finally:
+        fh.close()
+
+def MergeSources(chunk_files, last_chunk):
+    sources = [ReadChunk(filename, index) for index, filename in enumerate(chunk_files)]
+    last_index = len(chunk_files)
+    sources.append((record_key, last_index, sequence, line)
+            for sequence, (record_key, line) in enumerate(last_chunk))
+    return heapq.merge(*sources)
+
+def MergeChunks(chunk_dir, chunk_files, last_chunk):
+    try:
+        for record_key, index, sequence, line in MergeSources(chunk_files, last_chunk):
+            yield line
+    finally:
+        shutil.rmtree(chunk_dir, ignore_errors=True)
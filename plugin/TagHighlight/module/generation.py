@@ -16,8 +16,9 @@ from __future__ import print_function
 import os
 import sys
 import re
-from .utilities import GenerateValidKeywordRange, IsValidKeyword
-from .debug import Debug
+from .utilities import GenerateValidKeywordRange, GetProcessContext, AtomicFile
+from .debug import Debug, DebugEnabled, FlushDebugLog
+from .instrumentation import Phase, Count
 
 vim_synkeyword_arguments = [
         'contains',
@@ -37,7 +38,244 @@ vim_synkeyword_arguments = [
 def write(fh, value):
     fh.write(value.encode('ascii'))
 
+def CompileSkipPatterns(patterns):
+    """Compile the skip patterns into a list of regular expressions.
+
+    Where possible, they are combined into a single alternation so that each
+    keyword only needs one search.  Patterns with groups (which might be
+    referred to by number) or inline flags (which would apply to the whole
+    alternation) are kept separate."""
+    combinable = []
+    separate = []
+    for pattern in patterns:
+        if re.compile(pattern).groups == 0 and inline_flag_re.search(pattern) is None:
+            combinable.append(pattern)
+        else:
+            separate.append(re.compile(pattern))
+    if len(combinable) == 0:
+        return separate
+    return [re.compile('|'.join('(?:' + pattern + ')' for pattern in combinable))] + separate
+
+inline_flag_re = re.compile(r'\(\?[aiLmsux]')
+
+# The counters recorded by CreateTypesFile for each language
+types_counters = ('keywords', 'skipped_duplicate', 'skipped_reserved',
+        'skipped_skip_patterns', 'skipped_iskeyword', 'skipped_vim_keyword',
+        'syn_keyword_lines', 'syn_match_lines', 'skipped_too_long')
+
+# File-scoped entries can be written to a fragment for each source file in
+# a directory next to the types file (<types file>.d/<normalised path>.taghl)
+# instead of as a block in the types file, so that a buffer only has to
+# source its own fragment rather than test its path against every block.
+fragment_directory_suffix = '.d'
+fragment_extension = '.taghl'
+
+# With OptimiseSynCommands, the syn commands are written so that Vim loads
+# and (more importantly) highlights with them as quickly as possible:
+#
+# * Vim has no limit on the length of a syn keyword command, so keywords
+#   are packed into much longer commands (there is little to gain from
+#   going beyond this length).
+# * Vim never matches a keyword that is longer than 80 bytes, so those are
+#   written as syn matches (or skipped).
+# * Each syn match item is tried at every position Vim highlights, so all
+#   the matches for a kind are combined into one pattern (or a few, as
+#   older versions of Vim can't compile very long patterns) with the common
+#   prefixes factored out: \<a\%(b\|c\)\> rather than \<ab\> and \<ac\>.
+#   Where keywords overlap, the longest now wins.
+default_keyword_line_length = 512
+optimised_keyword_line_length = 32768
+max_vim_keyword_length = 80
+max_match_pattern_length = 4096
+match_pattern_delimiters = "/@#':"
+match_escaped_characters = '\\' + '~[]*.$^'
+
+def SynKeywordCommands(kind, keywords, line_length=default_keyword_line_length):
+    """Pack the keywords into as few syn keyword commands as possible
+    (keeping each one under line_length characters)."""
+    keystarter = 'syn keyword ' + kind
+    commands = []
+    keycommand = keystarter
+    for keyword in keywords:
+        temp = keycommand + " " + keyword
+        if len(temp) >= line_length:
+            commands.append(keycommand)
+            keycommand = keystarter
+        keycommand = keycommand + " " + keyword
+    if keycommand != keystarter:
+        commands.append(keycommand)
+    return commands
+
+def KeywordLength(keyword):
+    """The length of a keyword in bytes (as Vim sees it)."""
+    if isinstance(keyword, bytes):
+        return len(keyword)
+    return len(keyword.encode('utf8'))
+
+def EscapeMatchCharacter(ch):
+    if ch in match_escaped_characters:
+        return '\\' + ch
+    return ch
+
+def KeywordTriePattern(keywords):
+    """A Vim pattern (without delimiters) matching any of the keywords, with
+    common prefixes factored out."""
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for ch in keyword:
+            node = node.setdefault(ch, {})
+        # An empty key marks the end of a keyword
+        node[''] = {}
+
+    def Pattern(node):
+        branches = [EscapeMatchCharacter(ch) + Pattern(node[ch]) for ch in sorted(node.keys()) if ch != '']
+        if len(branches) == 0:
+            return ''
+        if '' in node:
+            # The rest is optional, but should match if it can
+            return r'\%(' + r'\|'.join(branches) + r'\)\='
+        if len(branches) == 1:
+            return branches[0]
+        return r'\%(' + r'\|'.join(branches) + r'\)'
+    return Pattern(trie)
+
+def SynMatchCommands(kind, keywords):
+    """Combine the keywords that must be matched for a kind into as few syn
+    match commands as possible.
+
+    Returns the commands and a list of the keywords that can't be matched
+    (as they contain all of the possible pattern delimiters)."""
+    by_delimiter = {}
+    unmatchable = []
+    for keyword in sorted(set(keywords)):
+        for delimiter in match_pattern_delimiters:
+            if keyword.find(delimiter) == -1:
+                by_delimiter.setdefault(delimiter, []).append(keyword)
+                break
+        else:
+            unmatchable.append(keyword)
+
+    commands = []
+    for delimiter in match_pattern_delimiters:
+        if delimiter not in by_delimiter:
+            continue
+        # Keywords are sorted, so each chunk has as much in common as
+        # possible
+        chunks = [[]]
+        length = 0
+        for keyword in by_delimiter[delimiter]:
+            escaped_length = len(keyword) + sum([1 for ch in keyword if ch in match_escaped_characters])
+            if length + escaped_length > max_match_pattern_length and len(chunks[-1]) > 0:
+                chunks.append([])
+                length = 0
+            chunks[-1].append(keyword)
+            length += escaped_length + 3
+        for chunk in chunks:
+            commands.append('syn match ' + kind + ' ' + delimiter +
+                    r'\<' + KeywordTriePattern(chunk) + r'\>' + delimiter)
+    return commands, unmatchable
+
+# Relative costs for SynCommandCost, roughly measured with Vim 9 sourcing a
+# types file and then highlighting a buffer: a syn keyword command is
+# cheap as its keywords go in a hash table, but every syn match item is
+# tried at each position that is highlighted.
+cost_per_command = 1.0
+cost_per_byte = 0.015
+cost_per_match_item = 800.0
+cost_per_match_branch = 50.0
+
+def SynCommandCost(lines):
+    """Estimate the cost to Vim of a list of types file lines.
+
+    Returns a dictionary of the counts and the estimated cost (in arbitrary
+    units: only useful for comparing different ways of writing the same
+    types)."""
+    result = {'commands': 0, 'syn_keyword_commands': 0, 'syn_match_commands': 0,
+            'match_branches': 0, 'bytes': 0}
+    for line in lines:
+        result['bytes'] += len(line) + 1
+        stripped = line.strip()
+        if stripped == '' or stripped.startswith('"'):
+            continue
+        result['commands'] += 1
+        if stripped.startswith('syn keyword '):
+            result['syn_keyword_commands'] += 1
+        elif stripped.startswith('syn match '):
+            result['syn_match_commands'] += 1
+            result['match_branches'] += stripped.count(r'\|') + 1
+    result['cost'] = result['commands'] * cost_per_command + \
+            result['bytes'] * cost_per_byte + \
+            result['syn_match_commands'] * cost_per_match_item + \
+            result['match_branches'] * cost_per_match_branch
+    return result
+
+def FileScopeHeader(source_file):
+    """The lines that start the block of commands for a file-scoped tag set
+    (ended by endif)."""
+    formatted_file = os.path.normpath(source_file).replace(os.path.sep, '/')
+    return '" Matches for file %s:\n' % source_file + \
+            'if (has_key(b:TagHighlightPrivate, "NormalisedPath") && b:TagHighlightPrivate["NormalisedPath"] == "%s") || TagHighlight#Option#GetOption("IgnoreFileScope")\n' % formatted_file
+
+def FileScopeFragmentName(source_file):
+    """The name of the fragment for a source file's file-scoped entries
+    (relative to the fragment directory), or None if the source file isn't
+    inside the source directory."""
+    if os.path.isabs(source_file) or os.path.splitdrive(source_file)[0]:
+        return None
+    parts = os.path.normpath(source_file).replace(os.path.sep, '/').split('/')
+    if '..' in parts:
+        return None
+    return os.path.join(*parts) + fragment_extension
+
+def WriteEntries(fh, vimtypes_entries, prefix=''):
+    for line in vimtypes_entries:
+        try:
+            write(fh, prefix + line)
+        except UnicodeDecodeError:
+            Debug("Error decoding line '{0!r}'".format(line), "Error")
+            write(fh, 'echoerr "Types generation error"\n')
+        write(fh, '\n')
+
+def WriteFileScopeFragments(directory, fragments):
+    """Write the file-scoped entries for each source file to a fragment of
+    its own and remove any fragments that are no longer needed.
+
+    Returns the number of fragments that were rewritten."""
+    written = set()
+    changed = 0
+    for source_file in sorted(fragments.keys()):
+        name = FileScopeFragmentName(source_file)
+        filename = os.path.join(directory, name)
+        if not os.path.isdir(os.path.dirname(filename)):
+            os.makedirs(os.path.dirname(filename))
+        fh = AtomicFile(filename, lambda name: open(name, 'wb'))
+        try:
+            WriteEntries(fh, fragments[source_file])
+        except:
+            fh.discard()
+            raise
+        if fh.close():
+            changed += 1
+        written.add(name)
+
+    if os.path.isdir(directory):
+        for root, dirnames, filenames in os.walk(directory, topdown=False):
+            for filename in filenames:
+                path = os.path.join(root, filename)
+                if filename.endswith(fragment_extension) and \
+                        os.path.relpath(path, directory) not in written:
+                    Debug("Removing file-scope fragment {0}", "Information", path)
+                    os.remove(path)
+            if len(os.listdir(root)) == 0:
+                os.rmdir(root)
+    return changed
+
 def CreateTypesFile(options, language, unscoped_tags, file_tags):
+    with Phase('CreateTypesFile', language):
+        WriteTypesFile(options, language, unscoped_tags, file_tags)
+
+def WriteTypesFile(options, language, unscoped_tags, file_tags):
     Debug("Writing types file", "Information")
 
     entry_sets = {}
@@ -46,30 +284,36 @@ def CreateTypesFile(options, language, unscoped_tags, file_tags):
     if unscoped_tags:
         tagsets.insert(0, None)
 
+    # Everything that doesn't depend on the source file is only prepared
+    # once per language.
+    language_handler = options['LanguageHandler'].GetLanguageHandler(language)
+
+    if options['CheckKeywords']:
+        iskeyword = GenerateValidKeywordRange(language_handler['IsKeyword'])
+        Debug("Is Keyword is {0!r}", "Information", iskeyword)
+
+    optimise = options['OptimiseSynCommands']
+    if optimise:
+        keyword_line_length = optimised_keyword_line_length
+    else:
+        keyword_line_length = default_keyword_line_length
+
+    reserved_keywords = set(language_handler['ReservedKeywords'])
+    patternREs = CompileSkipPatterns(options['SkipPatterns'])
+    counts = dict((name, 0) for name in types_counters)
+    # Only report skipped keywords one by one if they'll be logged
+    log_skipped = DebugEnabled('Information')
+
     for source_file in tagsets:
         if source_file is None:
             tags = unscoped_tags
         else:
             tags = file_tags[source_file]
 
-        tag_types = list(tags.keys())
-        tag_types.sort()
-
-        language_handler = options['LanguageHandler'].GetLanguageHandler(language)
-
-        if options['CheckKeywords']:
-            iskeyword = GenerateValidKeywordRange(language_handler['IsKeyword'])
-            Debug("Is Keyword is {0!r}".format(iskeyword), "Information")
-
         matchEntries = set()
         vimtypes_entries = []
-
-        typesUsedByLanguage = list(options['LanguageHandler'].GetKindList(language).values())
-        # TODO: This may be included elsewhere, but we'll leave it in for now
-        #clear_string = 'silent! syn clear ' + " ".join(typesUsedByLanguage)
-
-        vimtypes_entries = []
-        #vimtypes_entries.append(clear_string)
+        # With OptimiseSynCommands, the keywords to be matched for each kind
+        match_keywords = {}
 
         # Get the priority list from the language handler
         # Highest priority is first
@@ -85,79 +329,104 @@ def CreateTypesFile(options, language, unscoped_tags, file_tags):
         # Add the ones not specified in priority
         allTypes += fullTypeList
 
-        Debug("Type priority list: " + repr(allTypes), "Information")
-
-        patternREs = []
-        for pattern in options['SkipPatterns']:
-            patternREs.append(re.compile(pattern))
+        Debug("Type priority list: {0!r}", "Information", allTypes)
 
-        all_keywords = []
+        all_keywords = set()
         for thisType in allTypes:
-            keystarter = 'syn keyword ' + thisType
-            keycommand = keystarter
-            for keyword in tags[thisType]:
-                skip_this = False
-
-                if not options['DisableDuplicateCheck']:
-                    if keyword in all_keywords:
-                        # Duplicate: skip
-                        continue
-                    all_keywords.append(keyword)
-
-                if options['SkipReservedKeywords']:
-                    if keyword in language_handler['ReservedKeywords']:
-                        Debug('Skipping reserved word ' + keyword, 'Information')
-                        # Ignore this keyword
-                        continue
-                for pattern in patternREs:
-                    if pattern.search(keyword) != None:
-                        skip_this = True
-                        break
-                if skip_this:
-                    continue
-
-                if options['CheckKeywords']:
-                    # In here we should check that the keyword only matches
-                    # vim's \k parameter (which will be different for different
-                    # languages).  This is quite slow so is turned off by
-                    # default; however, it is useful for some things where the
-                    # default generated file contains a lot of rubbish.  It may
-                    # be worth optimising IsValidKeyword at some point.
-                    if not IsValidKeyword(keyword, iskeyword):
-                        matchDone = False
-                        if options['IncludeSynMatches']:
-
-                            patternCharacters = "/@#':"
-                            charactersToEscape = '\\' + '~[]*.$^'
-
-                            for patChar in patternCharacters:
-                                if keyword.find(patChar) == -1:
-                                    escapedKeyword = keyword
-                                    for ch in charactersToEscape:
-                                        escapedKeyword = escapedKeyword.replace(ch, '\\' + ch)
-                                    if options['IncludeSynMatches']:
-                                        matchEntries.add('syn match ' + thisType + ' ' + patChar + r'\<' + escapedKeyword + r'\>' + patChar)
-                                    matchDone = True
-                                    break
-
-                        if not matchDone:
-                            Debug("Skipping keyword '" + keyword + "'", "Information")
-
-                        continue
-
-
+            # Each stage filters the whole list of keywords for this type,
+            # keeping them in order.  They are sorted so that the same tags
+            # always give the same types file (set order varies between runs).
+            keywords = sorted(tags[thisType])
+            counts['keywords'] += len(keywords)
+
+            if not options['DisableDuplicateCheck']:
+                # A keyword belongs to the highest priority type it appears
+                # in, even if it is then skipped for some other reason.
+                kept = [keyword for keyword in keywords if keyword not in all_keywords]
+                counts['skipped_duplicate'] += len(keywords) - len(kept)
+                keywords = kept
+                all_keywords.update(keywords)
+
+            if options['SkipReservedKeywords'] and reserved_keywords:
+                kept = [keyword for keyword in keywords if keyword not in reserved_keywords]
+                if log_skipped:
+                    for keyword in keywords:
+                        if keyword in reserved_keywords:
+                            Debug('Skipping reserved word {0}', 'Information', keyword)
+                counts['skipped_reserved'] += len(keywords) - len(kept)
+                keywords = kept
+
+            for pattern in patternREs:
+                kept = [keyword for keyword in keywords if pattern.search(keyword) is None]
+                counts['skipped_skip_patterns'] += len(keywords) - len(kept)
+                keywords = kept
+
+            if options['CheckKeywords']:
+                # In here we should check that the keyword only matches
+                # vim's \k parameter (which will be different for different
+                # languages).
+                valid = []
+                invalid = []
+                for keyword in keywords:
+                    if iskeyword.match(keyword) is None:
+                        invalid.append(keyword)
+                    else:
+                        valid.append(keyword)
+                keywords = valid
+                if optimise and options['IncludeSynMatches']:
+                    match_keywords.setdefault(thisType, []).extend(invalid)
+                    invalid = []
+                for keyword in invalid:
+                    matchDone = False
+                    if options['IncludeSynMatches']:
+
+                        for patChar in match_pattern_delimiters:
+                            if keyword.find(patChar) == -1:
+                                escapedKeyword = keyword
+                                for ch in match_escaped_characters:
+                                    escapedKeyword = escapedKeyword.replace(ch, '\\' + ch)
+                                matchEntries.add('syn match ' + thisType + ' ' + patChar + r'\<' + escapedKeyword + r'\>' + patChar)
+                                matchDone = True
+                                break
+
+                    if not matchDone:
+                        if log_skipped:
+                            Debug("Skipping keyword '{0}'", "Information", keyword)
+                        counts['skipped_iskeyword'] += 1
+
+            if optimise:
+                kept = []
+                for keyword in keywords:
+                    if KeywordLength(keyword) <= max_vim_keyword_length:
+                        kept.append(keyword)
+                    elif options['IncludeSynMatches']:
+                        match_keywords.setdefault(thisType, []).append(keyword)
+                    else:
+                        if log_skipped:
+                            Debug("Skipping keyword '{0}' (too long)", "Information", keyword)
+                        counts['skipped_too_long'] += 1
+                keywords = kept
+
+            kept = []
+            for keyword in keywords:
                 if keyword.lower() in vim_synkeyword_arguments:
-                    if not options['SkipVimKeywords']:
+                    if options['SkipVimKeywords']:
+                        counts['skipped_vim_keyword'] += 1
+                    elif optimise:
+                        match_keywords.setdefault(thisType, []).append(keyword)
+                    else:
                         matchEntries.add('syn match ' + thisType + r' /\<' + keyword + r'\>/')
                     continue
+                kept.append(keyword)
+            vimtypes_entries += SynKeywordCommands(thisType, kept, keyword_line_length)
 
-                temp = keycommand + " " + keyword
-                if len(temp) >= 512:
-                    vimtypes_entries.append(keycommand)
-                    keycommand = keystarter
-                keycommand = keycommand + " " + keyword
-            if keycommand != keystarter:
-                vimtypes_entries.append(keycommand)
+        for thisType in sorted(match_keywords.keys()):
+            commands, unmatchable = SynMatchCommands(thisType, match_keywords[thisType])
+            matchEntries.update(commands)
+            for keyword in unmatchable:
+                if log_skipped:
+                    Debug("Skipping keyword '{0}'", "Information", keyword)
+                counts['skipped_iskeyword'] += 1
 
         # Sort the matches
         matchEntries = sorted(list(matchEntries))
@@ -166,15 +435,18 @@ def CreateTypesFile(options, language, unscoped_tags, file_tags):
             # All keywords have been filtered out for this file, give up
             continue
 
+        counts['syn_keyword_lines'] += len(vimtypes_entries)
+        counts['syn_match_lines'] += len(matchEntries)
+
         vimtypes_entries.reverse()
 
         vimtypes_entries.append('')
         vimtypes_entries += matchEntries
 
-        if source_file is None:
-            unscoped_entries = vimtypes_entries[:]
-        else:
-            entry_sets[source_file] = vimtypes_entries[:]
+        entry_sets[source_file] = vimtypes_entries[:]
+
+    for name in types_counters:
+        Count(name, counts[name], language)
 
     if options['IncludeLocals']:
         LocalTagType = ',CTagsLocalVariable'
@@ -186,40 +458,141 @@ def CreateTypesFile(options, language, unscoped_tags, file_tags):
     else:
         type_file_name = options['TypesFilePrefix'] + '_' + language_handler['Suffix'] + '.' + options['TypesFileExtension']
     filename = os.path.join(options['TypesFileLocation'], type_file_name)
-    Debug("Filename is {0}\n".format(filename), "Information")
+    Debug("Filename is {0}\n", "Information", filename)
 
     try:
         # Have to open in binary mode as we want to write with Unix line endings
         # The resulting file will then work with any Vim (Windows, Linux, Cygwin etc)
-        fh = open(filename, 'wb')
+        # The file is only replaced if the contents have changed
+        fh = AtomicFile(filename, lambda name: open(name, 'wb'))
     except IOError:
         Debug("ERROR: Couldn't create {file}\n".format(file=filename), "Error")
         sys.exit(1)
 
+    fragments = {}
+    if options['FileScopeFragments'] and not options['IgnoreFileScope']:
+        for source_file in tagsets:
+            if source_file in entry_sets and source_file is not None and \
+                    FileScopeFragmentName(source_file) is not None:
+                fragments[source_file] = entry_sets.pop(source_file)
+    Count('file_scope_fragments', len(fragments), language)
+
     try:
         for source_file in tagsets:
+            if source_file not in entry_sets:
+                # Everything was filtered out
+                continue
+            vimtypes_entries = entry_sets[source_file]
             if source_file is None:
-                vimtypes_entries = unscoped_entries
                 prefix = ''
             else:
                 prefix = '\t'
-                vimtypes_entries = entry_sets[source_file]
 
             if source_file is not None and not options['IgnoreFileScope']:
-                formatted_file = os.path.normpath(source_file).replace(os.path.sep, '/')
-                write(fh, '" Matches for file %s:\n' % source_file)
-                write(fh, 'if (has_key(b:TagHighlightPrivate, "NormalisedPath") && b:TagHighlightPrivate["NormalisedPath"] == "%s") || TagHighlight#Option#GetOption("IgnoreFileScope")\n' % formatted_file)
-            for line in vimtypes_entries:
-                try:
-                    write(fh, prefix + line)
-                except UnicodeDecodeError:
-                    Debug("Error decoding line '{0!r}'".format(line), "Error")
-                    write(fh, 'echoerr "Types generation error"\n')
-                write(fh, '\n')
+                write(fh, FileScopeHeader(source_file))
+            WriteEntries(fh, vimtypes_entries, prefix)
             if source_file is not None and not options['IgnoreFileScope']:
                 write(fh, 'endif\n')
-    except IOError:
+        changed = fh.close()
+    except (IOError, OSError):
+        fh.discard()
         Debug("ERROR: Couldn't write {file} contents\n".format(file=filename), "Error")
         sys.exit(1)
+    except:
+        fh.discard()
+        raise
+
+    if changed:
+        Debug("Rewrote {0}\n".format(filename), "Status")
+    else:
+        Debug("{0} unchanged, not rewritten\n".format(filename), "Status")
+
+    # This also removes the fragments from an earlier run if they're no
+    # longer being written
+    fragment_directory = filename + fragment_directory_suffix
+    try:
+        changed = WriteFileScopeFragments(fragment_directory, fragments)
+    except (IOError, OSError):
+        Debug("ERROR: Couldn't write file-scope fragments in {0}\n".format(fragment_directory), "Error")
+        sys.exit(1)
+    if len(fragments) > 0:
+        Debug("Wrote {0} file-scope fragments in {1} ({2} changed)\n".format(
+            len(fragments), fragment_directory, changed), "Status")
+
+def CreateTypesFiles(options, languages, tag_db, file_tag_db):
+    """Create the types files for a list of languages.
+
+    If TypesJobs is more than one, the languages are shared between a pool
+    of worker processes (unless running inside Vim, which mustn't be
+    forked).  Written in turn, the first language for which CreateTypesFile
+    exits stops the run.  In the pool, the files for every language are
+    written and then the first language (in list order) for which
+    CreateTypesFile exited sets the exit status."""
+    jobs = int(options['TypesJobs'])
+    forced_name = options['TypesFileNameForce'] is not None and options['TypesFileNameForce'] != 'None'
+    in_vim = 'vim' in sys.modules
+    if jobs <= 1 or len(languages) <= 1 or forced_name or in_vim:
+        # With a forced file name, every language writes the same file, so
+        # the last one must win.  When run through Vim's python interface,
+        # the pool would fork Vim itself.
+        for language in languages:
+            CreateTypesFile(options, language, tag_db[language], file_tag_db[language])
+        return
+
+    # The tag store views are converted to plain dictionaries of lists so
+    # that they can be sent to the workers if they aren't forked.
+    def OrderedTags(tags):
+        return dict((kind, list(keywords)) for kind, keywords in tags.items())
+    work = {}
+    for language in languages:
+        file_tags = file_tag_db[language]
+        work[language] = (OrderedTags(tag_db[language]),
+                dict((source_file, OrderedTags(file_tags[source_file])) for source_file in file_tags.keys()))
+    worker_options = dict((key, value) for key, value in options.items()
+            if key not in ('LanguageHandler', 'SourceFileList', 'SourceFileListFile'))
+
+    from .instrumentation import MergeInstrumentationReport
+
+    Debug("Writing types files with {0} processes".format(min(jobs, len(languages))), "Information")
+    pool = GetProcessContext().Pool(min(jobs, len(languages)), InitialiseTypesWorker,
+            (worker_options, options['ManuallySetOptions'], work))
+    try:
+        results = pool.map(CreateTypesFileInWorker, languages)
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+    for exit_code, report in results:
+        MergeInstrumentationReport(report)
+    for exit_code, report in results:
+        if exit_code:
+            sys.exit(exit_code)
+
+types_worker_work = {}
+
+def InitialiseTypesWorker(options, manually_set, work):
+    from .config import config, SetInitialOptions, LoadLanguages
+    if 'LanguageHandler' not in config:
+        # Not forked, so the configuration has to be loaded again
+        SetInitialOptions(options, manually_set)
+        LoadLanguages()
+    types_worker_work.update(work)
+
+def CreateTypesFileInWorker(language):
+    """Create one types file and return the exit code and the instrumentation
+    report for it (to be merged into the main process's report)."""
+    from .config import config
+    from .instrumentation import ResetInstrumentation, GetInstrumentationReport
+    unscoped_tags, file_tags = types_worker_work[language]
+    ResetInstrumentation()
+    try:
+        CreateTypesFile(config, language, unscoped_tags, file_tags)
+    except SystemExit as e:
+        return e.code, GetInstrumentationReport()
     finally:
-        fh.close()
+        # The worker process won't flush the log when it exits
+        FlushDebugLog()
+    return 0, GetInstrumentationReport()
@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+# Tag Highlighter:
+#   Author:  A. S. Budden <abudden _at_ gmail _dot_ com>
+# Copyright: Copyright (C) 2009-2013 A. S. Budden
+#            Permission is hereby granted to use and distribute this code,
+#            with or without modifications, provided that this copyright
+#            notice is copied with it. Like anything else that's free,
+#            the TagHighlight plugin is provided *as is* and comes with no
+#            warranty of any kind, either expressed or implied. By using
+#            this plugin, you agree that in no event will the copyright
+#            holder be liable for any damages resulting from the use
+#            of this software.
+
+# ---------------------------------------------------------------------
+from __future__ import print_function
+import os
+import json
+import heapq
+import hashlib
+import tempfile
+import subprocess
+
+from .ctags_interface import ExuberantGetCommandArgs, \
+        ReadStrippedLines, ReportTagFileWrite, ctags_key
+from .sourcefiles import GetSourceFiles, GeneratedFileMatcher
+from .utilities import openutf8, AtomicFile
+from .debug import Debug
+
+# Increment this if the format of the manifest changes
+manifest_version = 1
+
+def ManifestFileName(options):
+    return os.path.join(options['CtagsFileLocation'], options['TagFileName'] + '.manifest')
+
+def ManifestSignature(options):
+    """Anything that would change the tags generated for an unchanged file."""
+    return [options['CtagsExeFull'], bool(options['Recurse'])] + \
+            ExuberantGetCommandArgs(options, tag_file='TAGS', file_list='FILES')
+
+def LoadManifest(options):
+    filename = ManifestFileName(options)
+    if not os.path.exists(filename):
+        return None
+    try:
+        fh = open(filename, 'r')
+        try:
+            manifest = json.load(fh)
+        finally:
+            fh.close()
+    except (IOError, ValueError):
+        Debug("Could not read manifest " + filename, "Warning")
+        return None
+    if manifest.get('Version') != manifest_version:
+        return None
+    return manifest
+
+def SaveManifest(options, files):
+    filename = ManifestFileName(options)
+    manifest = {
+            'Version': manifest_version,
+            'Signature': ManifestSignature(options),
+            'Files': files,
+            }
+    try:
+        # Replaced atomically (like the tag file it describes) so that an
+        # interrupted run can't leave a truncated manifest
+        fh = AtomicFile(filename, lambda name: open(name, 'w'))
+        try:
+            json.dump(manifest, fh)
+        except:
+            fh.discard()
+            raise
+        fh.close()
+    except (IOError, OSError):
+        Debug("Could not write manifest " + filename, "Warning")
+
+def HashFile(filename):
+    sha = hashlib.sha1()
+    fh = open(filename, 'rb')
+    try:
+        while 1:
+            block = fh.read(65536)
+            if not block:
+                break
+            sha.update(block)
+    finally:
+        fh.close()
+    return sha.hexdigest()
+
+def ScanSourceFile(filename, old_entry):
+    """Get the manifest entry for a file, only hashing it if its size or
+    modification time has changed.  Returns None if it can't be read."""
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return None
+    if old_entry is not None and old_entry[0] == stat.st_size and old_entry[1] == stat.st_mtime:
+        return old_entry
+    try:
+        digest = HashFile(filename)
+    except IOError:
+        return None
+    return [stat.st_size, stat.st_mtime, digest]
+
+def ScanSourceFiles(options, previous):
+    """Compare the source files with a previous manifest.
+
+    Returns the new manifest file entries, a dictionary of changed (or
+    added) files (mapping the manifest entry to the name to give ctags) and
+    the set of removed files.  Files are only hashed if their size or
+    modification time has changed."""
+    files = {}
+    changed = {}
+    # The tag file, the manifest, the types files and so on may well be in
+    # the source directory
+    IsGeneratedFile = GeneratedFileMatcher(options)
+    for filename in GetSourceFiles(options):
+        key = os.path.relpath(filename)
+        if IsGeneratedFile(key):
+            continue
+        old_entry = previous.get(key)
+        entry = ScanSourceFile(filename, old_entry)
+        if entry is None:
+            continue
+        files[key] = entry
+        if old_entry is None or old_entry[2] != entry[2]:
+            changed[key] = filename
+    removed = set(previous.keys()) - set(files.keys())
+    return files, changed, removed
+
+def SnapshotSourceFiles(options):
+    """Get the manifest entries for a full run.
+
+    This should be called before ctags is run so that any file modified
+    while ctags is running is picked up next time."""
+    manifest = LoadManifest(options)
+    if manifest is None:
+        previous = {}
+    else:
+        previous = manifest['Files']
+    files, changed, removed = ScanSourceFiles(options, previous)
+    return files
+
+def TagFilenameNormaliser(options):
+    """Return a function that converts the filename field of a tag line into
+    the path of the source file relative to the source directory."""
+    if options['TagRelative']:
+        base = options['CtagsFileLocation']
+    else:
+        base = '.'
+    cache = {}
+    def Normalise(filename):
+        try:
+            return cache[filename]
+        except KeyError:
+            result = os.path.relpath(os.path.join(base, filename))
+            cache[filename] = result
+            return result
+    return Normalise
+
+def UpdateTags(options):
+    """Re-tag only the source files that have changed since the manifest was
+    written and splice the results into the existing tag file.
+
+    Must be called from the source directory.  Returns False if a full
+    regeneration is needed instead."""
+    tag_file = os.path.join(options['CtagsFileLocation'], options['TagFileName'])
+    manifest = LoadManifest(options)
+    if manifest is None or not os.path.exists(tag_file):
+        Debug("No manifest or tag file: cannot update tags incrementally", "Information")
+        return False
+    if manifest['Signature'] != ManifestSignature(options):
+        Debug("ctags options have changed: cannot update tags incrementally", "Information")
+        return False
+
+    files, changed, removed = ScanSourceFiles(options, manifest['Files'])
+    Debug("Incremental update: {0} changed, {1} removed".format(len(changed), len(removed)), "Information")
+    if len(changed) == 0 and len(removed) == 0:
+        SaveManifest(options, files)
+        return True
+
+    new_lines = []
+    if len(changed) > 0:
+        new_lines = RunCtagsOnFiles(options, sorted(changed.values()))
+
+    SpliceTags(options, new_lines, set(changed.keys()) | removed)
+
+    SaveManifest(options, files)
+    return True
+
+def SpliceTags(options, new_lines, stale):
+    """Replace the tags for the stale files in the tag file with new_lines."""
+    tag_file = os.path.join(options['CtagsFileLocation'], options['TagFileName'])
+    new_lines = sorted(new_lines, key=ctags_key)
+    Normalise = TagFilenameNormaliser(options)
+    def KeepLine(line):
+        fields = line.split('\t', 2)
+        return len(fields) < 3 or Normalise(fields[1]) not in stale
+
+    existing_lines = (line for line in ReadStrippedLines(tag_file) if KeepLine(line))
+
+    # The existing tag file is already sorted, so the new lines can be
+    # merged in.  This writes to a temporary file as the tag file is being
+    # read; it only replaces the tag file if the tags have changed.
+    fh = AtomicFile(tag_file, lambda name: openutf8(name, 'w'))
+    try:
+        merged = heapq.merge(
+                ((ctags_key(line), 0, line) for line in existing_lines),
+                ((ctags_key(line), 1, line) for line in new_lines))
+        for key, source, line in merged:
+            fh.write(line + '\n')
+    except:
+        fh.discard()
+        raise
+    ReportTagFileWrite(tag_file, fh.close())
+
+def RunCtagsOnFiles(options, filenames):
+    """Run ctags over a list of files and return the (unsorted) tag lines,
+    excluding the pseudo-tag header."""
+    fd, list_file = tempfile.mkstemp(prefix='taghl_files_', suffix='.txt')
+    os.close(fd)
+    fd, output = tempfile.mkstemp(prefix=options['TagFileName'] + '.',
+            suffix='.update', dir=options['CtagsFileLocation'])
+    os.close(fd)
+    try:
+        fh = openutf8(list_file, 'w')
+        for filename in filenames:
+            fh.write(filename + '\n')
+        fh.close()
+
+        ctags_cmd = [options['CtagsExeFull']] + \
+                ExuberantGetCommandArgs(options, tag_file=output, file_list=list_file)
+        Debug("ctags command is {0!r}", "Information", ctags_cmd)
+        # We don't use stdin, but have to define it in order
+        # to get round python bug 3905
+        # http://bugs.python.org/issue3905
+        process = subprocess.Popen(ctags_cmd,
+                stdin=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                stdout=subprocess.PIPE
+                )
+        (sout, serr) = process.communicate()
+
+        return [line for line in ReadStrippedLines(output) if not line.startswith('!_TAG_')]
+    finally:
+        os.remove(list_file)
+        os.remove(output)
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# Tag Highlighter:
+#   Author:  A. S. Budden <abudden _at_ gmail _dot_ com>
+# Copyright: Copyright (C) 2009-2013 A. S. Budden
+#            Permission is hereby granted to use and distribute this code,
+#            with or without modifications, provided that this copyright
+#            notice is copied with it. Like anything else that's free,
+#            the TagHighlight plugin is provided *as is* and comes with no
+#            warranty of any kind, either expressed or implied. By using
+#            this plugin, you agree that in no event will the copyright
+#            holder be liable for any damages resulting from the use
+#            of this software.
+
+# ---------------------------------------------------------------------
+from __future__ import print_function
+import os
+import sys
+import time
+import threading
+
+# Timings and counters for one run of the generator, written as a JSON
+# document if InstrumentationFile is set.
+#
+# Each phase records the number of times it was entered and the total wall
+# clock time, CPU time and child process CPU time spent in it.  The CPU
+# time is that of the thread running the phase where python can measure
+# it (3.7 or later) and that of the whole process otherwise.  The child
+# process CPU time is that of any child processes (ctags, cscope) that
+# finished during the phase.  Phases can overlap: cscope runs in a thread
+# alongside everything else and the other phases are nested inside
+# 'Total'.
+#
+# Phases and counters can also be recorded for a particular language.
+
+report_version = 1
+
+phases = {}
+counters = {}
+language_phases = {}
+language_counters = {}
+lock = threading.Lock()
+
+if hasattr(time, 'thread_time'):
+    cpu_time = time.thread_time
+else:
+    cpu_time = lambda: sum(os.times()[:2])
+
+def ResetInstrumentation():
+    lock.acquire()
+    try:
+        phases.clear()
+        counters.clear()
+        language_phases.clear()
+        language_counters.clear()
+    finally:
+        lock.release()
+
+def GetTimes():
+    return time.time(), cpu_time(), sum(os.times()[2:4])
+
+class Phase(object):
+    """Context manager that adds the time taken by its block to a phase."""
+    def __init__(self, name, language=None):
+        self.name = name
+        self.language = language
+
+    def __enter__(self):
+        self.start = GetTimes()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        times = [end - start for end, start in zip(GetTimes(), self.start)]
+        AddTime(self.name, times, language=self.language)
+        return False
+
+def AddTime(name, times, calls=1, language=None):
+    lock.acquire()
+    try:
+        if language is None:
+            table = phases
+        else:
+            table = language_phases.setdefault(language, {})
+        entry = table.setdefault(name, {'calls': 0, 'wall': 0.0, 'cpu': 0.0, 'child_cpu': 0.0})
+        entry['calls'] += calls
+        entry['wall'] += times[0]
+        entry['cpu'] += times[1]
+        entry['child_cpu'] += times[2]
+    finally:
+        lock.release()
+
+def Count(name, amount=1, language=None):
+    lock.acquire()
+    try:
+        if language is None:
+            table = counters
+        else:
+            table = language_counters.setdefault(language, {})
+        table[name] = table.get(name, 0) + amount
+    finally:
+        lock.release()
+
+def GetInstrumentationReport():
+    lock.acquire()
+    try:
+        languages = {}
+        for language in set(language_phases.keys()) | set(language_counters.keys()):
+            languages[language] = {
+                    'phases': dict(language_phases.get(language, {})),
+                    'counters': dict(language_counters.get(language, {})),
+                    }
+        return {
+                'version': report_version,
+                'python': sys.version.split()[0],
+                'phases': dict(phases),
+                'counters': dict(counters),
+                'languages': languages,
+                }
+    finally:
+        lock.release()
+
+def MergeInstrumentationReport(report):
+    """Add the phases and counters from another process's report."""
+    for name, entry in report['phases'].items():
+        AddTime(name, (entry['wall'], entry['cpu'], entry['child_cpu']), entry['calls'])
+    for name, amount in report['counters'].items():
+        Count(name, amount)
+    for language, language_report in report['languages'].items():
+        for name, entry in language_report['phases'].items():
+            AddTime(name, (entry['wall'], entry['cpu'], entry['child_cpu']), entry['calls'], language)
+        for name, amount in language_report['counters'].items():
+            Count(name, amount, language)
+
+def WriteInstrumentationReport(filename):
+    import json
+    text = json.dumps(GetInstrumentationReport(), indent=2, sort_keys=True)
+    if filename == '-':
+        print(text)
+    else:
+        fh = open(filename, 'w')
+        try:
+            fh.write(text)
+            fh.write('\n')
+        finally:
+            fh.close()
+
+def ResetInstrumentationLock():
+    global lock
+    lock = threading.Lock()
+
+if hasattr(os, 'register_at_fork'):
+    # The TypesJobs pool and the daemon's and batch's workers may be forked
+    # while another thread (such as the one running cscope) holds the lock
+    os.register_at_fork(after_in_child=ResetInstrumentationLock)
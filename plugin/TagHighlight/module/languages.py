@@ -14,9 +14,11 @@
 # ---------------------------------------------------------------------
 import os
 import glob
+import re
 
 from .config import config
-from .loaddata import LoadDataFile, LoadFile, GlobData
+from .loaddata import LoadDataFile, LoadFile, GlobData, SaveDataCache
+from .utilities import ExpandExtensionMatcher
 from .debug import Debug
 
 class Languages():
@@ -112,6 +114,26 @@ class Languages():
     def GetLanguageHandler(self, name):
         return self.registry[name]
 
+    def GetExtensionDispatch(self):
+        """Work out which languages handle which file extensions.
+
+        Returns a tuple of a dictionary mapping each extension to the list
+        of languages that handle it and a dictionary of compiled regular
+        expressions for any languages whose PythonExtensionMatcher can't be
+        expanded into a finite set of extensions."""
+        extension_table = {}
+        fallback_matchers = {}
+        for language in self.GetAllLanguages():
+            matcher = self.registry[language]['PythonExtensionMatcher']
+            extensions = ExpandExtensionMatcher(matcher)
+            if extensions is None or any(('.' in ext or '\t' in ext) for ext in extensions):
+                fallback_matchers[language] = re.compile(
+                        r'^.*?\t[^\t]*\.(?P<extension>' + matcher + ')\t')
+            else:
+                for extension in extensions:
+                    extension_table.setdefault(extension, []).append(language)
+        return extension_table, fallback_matchers
+
     def GenerateExtensionTable(self):
         results = {}
         for handler in list(self.registry.values()):
@@ -137,6 +159,7 @@ class Languages():
                 self.kinds[key] = {}
                 for kind in kind_import[key]:
                     self.kinds[key]['ctags_'+kind] = kind_import[key][kind]
+            SaveDataCache()
 
         if language is None:
             return self.kinds
@@ -0,0 +1,314 @@
+#!/usr/bin/env python
+# Tag Highlighter:
+#   Author:  A. S. Budden <abudden _at_ gmail _dot_ com>
+# Copyright: Copyright (C) 2009-2013 A. S. Budden
+#            Permission is hereby granted to use and distribute this code,
+#            with or without modifications, provided that this copyright
+#            notice is copied with it. Like anything else that's free,
+#            the TagHighlight plugin is provided *as is* and comes with no
+#            warranty of any kind, either expressed or implied. By using
+#            this plugin, you agree that in no event will the copyright
+#            holder be liable for any damages resulting from the use
+#            of this software.
+
+# ---------------------------------------------------------------------
+from __future__ import print_function
+import os
+import re
+import json
+import zlib
+
+from .generation import SynKeywordCommands, FileScopeHeader
+from .utilities import AtomicFile
+
+# An indexed library (.taghlidx) holds the contents of one or more types
+# files split into shards, one for each language, kind and file scope, so
+# that a reader can get just the kinds (or the keywords) that it needs
+# without reading (or decompressing) the rest of a large library.  The file
+# is laid out as:
+#
+#     TAGHLIDX <version>
+#     <length of the header in bytes>
+#     <header (JSON)><shard><shard>...
+#
+# The header has a list of shards, each giving the Language (the types
+# file suffix), Kind (the highlight group), Scope (the file for file-scoped
+# tags or None), the Offset (from the end of the header) and Size of its
+# data, the number of keywords (Count) and the syn match patterns for that
+# kind (there are very few of these).  Any other commands in the types
+# files (such as syn cluster) are kept in the header by language.  The
+# shard data is the zlib-compressed, newline-separated list of keywords in
+# the order that they are given to syn keyword.
+
+# Increment this if the format of the index changes
+index_version = 1
+index_magic = b'TAGHLIDX'
+
+syn_keyword_re = re.compile(r'^syn keyword (\S+)(.*)$')
+syn_match_re = re.compile(r'^syn match (\S+) (.*)$')
+file_scope_re = re.compile(r'^if \(has_key\(b:TagHighlightPrivate, "NormalisedPath"\) && b:TagHighlightPrivate\["NormalisedPath"\] == "([^"]*)"\)')
+match_keyword_re = re.compile(r'^(.)\\<(.*)\\>\1$')
+
+def ReadTypesFile(filename, language):
+    """Read a types file into a list of shards (with the keywords and match
+    patterns in place of the offsets) and a list of other commands."""
+    fh = open(filename, 'rb')
+    try:
+        lines = [line.decode('utf8', 'replace').rstrip('\r\n') for line in fh]
+    finally:
+        fh.close()
+
+    scopes = []
+    keyword_lines = {}
+    match_lines = {}
+    commands = []
+    scope = None
+    depth = 0
+    for line in lines:
+        stripped = line.strip()
+        if depth > 0:
+            # Inside a block of other commands
+            commands.append(line)
+            if stripped.startswith('if '):
+                depth += 1
+            elif stripped == 'endif':
+                depth -= 1
+            continue
+        if stripped == '' or stripped.startswith('"'):
+            continue
+        m = file_scope_re.match(stripped)
+        if m is not None and scope is None:
+            scope = m.group(1)
+            continue
+        if stripped == 'endif' and scope is not None:
+            scope = None
+            continue
+        if scope not in keyword_lines:
+            scopes.append(scope)
+            keyword_lines[scope] = []
+            match_lines[scope] = []
+        m = syn_keyword_re.match(stripped)
+        if m is not None:
+            keyword_lines[scope].append((m.group(1), m.group(2).split()))
+            continue
+        m = syn_match_re.match(stripped)
+        if m is not None:
+            match_lines[scope].append((m.group(1), m.group(2)))
+            continue
+        commands.append(line)
+        if stripped.startswith('if '):
+            depth = 1
+
+    shards = []
+    for scope in scopes:
+        # The syn keyword commands are written in reverse order (so that
+        # the highest priority kind is defined last), so reverse them to get
+        # the keywords back into priority order.
+        kinds = []
+        keywords = {}
+        matches = {}
+        for kind, words in reversed(keyword_lines[scope]):
+            if kind not in keywords:
+                kinds.append(kind)
+                keywords[kind] = []
+                matches[kind] = []
+            keywords[kind] += words
+        for kind, pattern in match_lines[scope]:
+            if kind not in keywords:
+                kinds.append(kind)
+                keywords[kind] = []
+                matches[kind] = []
+            matches[kind].append(pattern)
+        for kind in kinds:
+            shards.append({
+                'Language': language,
+                'Kind': kind,
+                'Scope': scope,
+                'Keywords': keywords[kind],
+                'Matches': matches[kind],
+                })
+    return shards, commands
+
+def WriteLibraryIndex(filename, shards, commands):
+    """Write an indexed library.
+
+    shards is a list as returned by ReadTypesFile (or LibraryIndex.Select)
+    and commands is a dictionary of other commands by language."""
+    header_shards = []
+    blocks = []
+    offset = 0
+    for shard in shards:
+        data = zlib.compress('\n'.join(shard['Keywords']).encode('utf8'), 9)
+        header_shards.append({
+            'Language': shard['Language'],
+            'Kind': shard['Kind'],
+            'Scope': shard['Scope'],
+            'Offset': offset,
+            'Size': len(data),
+            'Count': len(shard['Keywords']),
+            'Matches': shard['Matches'],
+            })
+        blocks.append(data)
+        offset += len(data)
+    header = json.dumps({
+        'Version': index_version,
+        'Shards': header_shards,
+        'Commands': commands,
+        }, sort_keys=True).encode('ascii')
+
+    fh = AtomicFile(filename, lambda name: open(name, 'wb'))
+    try:
+        fh.write(index_magic + ' {0}\n{1}\n'.format(index_version, len(header)).encode('ascii'))
+        fh.write(header)
+        for data in blocks:
+            fh.write(data)
+    except:
+        fh.discard()
+        raise
+    return fh.close()
+
+def WriteTypesFile(filename, shards, commands):
+    """Write a types file from a list of shards (each with its keywords and
+    match patterns) and a list of other commands, in the same form as the
+    types files written by the generator."""
+    scopes = []
+    scope_shards = {}
+    for shard in shards:
+        if shard['Scope'] not in scope_shards:
+            scopes.append(shard['Scope'])
+            scope_shards[shard['Scope']] = []
+        scope_shards[shard['Scope']].append(shard)
+
+    fh = AtomicFile(filename, lambda name: open(name, 'wb'))
+    try:
+        for scope in scopes:
+            entries = []
+            match_entries = []
+            for shard in scope_shards[scope]:
+                entries += SynKeywordCommands(shard['Kind'], shard['Keywords'])
+                match_entries += ['syn match ' + shard['Kind'] + ' ' + pattern for pattern in shard['Matches']]
+            entries.reverse()
+            entries.append('')
+            entries += sorted(match_entries)
+            if scope is None:
+                prefix = ''
+            else:
+                prefix = '\t'
+                fh.write(FileScopeHeader(scope).encode('utf8'))
+            for line in entries:
+                fh.write((prefix + line + '\n').encode('utf8'))
+            if scope is not None:
+                fh.write(b'endif\n')
+        for line in commands:
+            fh.write((line + '\n').encode('utf8'))
+    except:
+        fh.discard()
+        raise
+    return fh.close()
+
+def MatchKeyword(pattern):
+    """Get the keyword from a syn match pattern written by the generator
+    (or None if it isn't one of those)."""
+    m = match_keyword_re.match(pattern)
+    if m is None:
+        return None
+    return re.sub(r'\\(.)', r'\1', m.group(2))
+
+class LibraryIndex(object):
+    """Reader for an indexed library."""
+    def __init__(self, filename):
+        self.filename = filename
+        self.fh = open(filename, 'rb')
+        try:
+            magic = self.fh.readline().split()
+            if len(magic) != 2 or magic[0] != index_magic:
+                raise ValueError(filename + ' is not an indexed library')
+            if int(magic[1]) != index_version:
+                raise ValueError('Unsupported indexed library version in ' + filename)
+            length = int(self.fh.readline())
+            header = json.loads(self.fh.read(length).decode('ascii'))
+        except:
+            self.fh.close()
+            raise
+        self.data_start = self.fh.tell()
+        self.shards = header['Shards']
+        self.commands = header['Commands']
+
+    def close(self):
+        self.fh.close()
+
+    def Languages(self):
+        return sorted(set(shard['Language'] for shard in self.shards))
+
+    def Kinds(self, language=None):
+        return sorted(set(shard['Kind'] for shard in self.shards
+            if language is None or shard['Language'] == language))
+
+    def ReadShard(self, shard):
+        """Get the keywords in a shard."""
+        if shard['Count'] == 0:
+            return []
+        self.fh.seek(self.data_start + shard['Offset'])
+        data = zlib.decompress(self.fh.read(shard['Size']))
+        return data.decode('utf8').split('\n')
+
+    def Select(self, languages=None, kinds=None, keywords=None):
+        """Get the shards (with their keywords) for the given languages and
+        kinds (all of them if None).  If keywords is given, only those
+        keywords (and matches for them) are included and shards that are
+        left empty are dropped.  Shards that aren't selected aren't read."""
+        result = []
+        for shard in self.shards:
+            if languages is not None and shard['Language'] not in languages:
+                continue
+            if kinds is not None and shard['Kind'] not in kinds:
+                continue
+            shard_keywords = self.ReadShard(shard)
+            matches = shard['Matches']
+            if keywords is not None:
+                shard_keywords = [i for i in shard_keywords if i in keywords]
+                matches = [i for i in matches if MatchKeyword(i) in keywords]
+                if len(shard_keywords) == 0 and len(matches) == 0:
+                    continue
+            result.append({
+                'Language': shard['Language'],
+                'Kind': shard['Kind'],
+                'Scope': shard['Scope'],
+                'Keywords': shard_keywords,
+                'Matches': matches,
+                })
+        return result
+
+    def Commands(self, languages=None):
+        result = []
+        for language in sorted(self.commands.keys()):
+            if languages is None or language in languages:
+                result += self.commands[language]
+        return result
+
+identifier_re = re.compile(r'\w+', re.UNICODE)
+
+def ReferencedKeywords(paths):
+    """Get the set of words that appear in some source files (directories
+    are searched recursively), for use as the keywords argument of
+    LibraryIndex.Select."""
+    from .sourcefiles import version_control_directories
+    filenames = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirnames, names in os.walk(path):
+                dirnames[:] = [i for i in dirnames if i not in version_control_directories]
+                filenames += [os.path.join(root, name) for name in names]
+        else:
+            filenames.append(path)
+    keywords = set()
+    for filename in filenames:
+        try:
+            fh = open(filename, 'rb')
+            try:
+                keywords.update(identifier_re.findall(fh.read().decode('utf8', 'replace')))
+            finally:
+                fh.close()
+        except IOError:
+            pass
+    return keywords
@@ -14,17 +14,36 @@
 # ---------------------------------------------------------------------
 from __future__ import print_function
 import os
+import sys
 import glob
 import re
 
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
 try:
     from .debug import Debug
+    from .utilities import ReplaceFile
 except ValueError:
     def Debug(text, level):
         print(text)
+    def ReplaceFile(source, destination):
+        os.rename(source, destination)
 
 data_directory = None
 
+# Parsed data files are cached (pickled) to save re-parsing them every time.
+# The cache is a dictionary mapping the absolute path of each file to its
+# pickled contents along with the modification time and size of it and any
+# files it includes, so that it can be checked cheaply.  The cache is saved
+# as soon as a file has been parsed again rather than when python exits, as
+# the generator may be run inside Vim, which can run for a long time.
+data_cache = None
+data_cache_modified = False
+data_cache_version = 1
+
 leadingTabRE = re.compile(r'^\t*')
 includeRE = re.compile(r'^%INCLUDE (?P<filename>.*)$')
 envRE = re.compile(r'\$\{(?P<envname>[A-Za-z0-9_]+)\}')
@@ -100,7 +119,119 @@ def ParseEntries(entries, indent_level=0):
         result = {}
     return {'Index': index, 'Result': result}
 
+def GetDataCacheFile():
+    """Location of the data cache.
+
+    This can be set with the TAGHIGHLIGHT_CACHE_DIR environment variable;
+    setting it to an empty string disables the cache."""
+    directory = os.environ.get('TAGHIGHLIGHT_CACHE_DIR')
+    if directory is None:
+        if os.name == 'nt':
+            base = os.environ.get('LOCALAPPDATA')
+        else:
+            base = os.environ.get('XDG_CACHE_HOME')
+            if not base and 'HOME' in os.environ:
+                base = os.path.join(os.environ['HOME'], '.cache')
+        if not base:
+            return None
+        directory = os.path.join(base, 'taghighlight')
+    elif directory == '':
+        return None
+    # Pickles aren't necessarily readable by other python versions
+    return os.path.join(directory, 'data_cache_py{0}{1}.pickle'.format(*sys.version_info[:2]))
+
+def GetDataCache():
+    global data_cache
+    if data_cache is None:
+        data_cache = {}
+        cache_file = GetDataCacheFile()
+        if cache_file is not None and os.path.exists(cache_file):
+            try:
+                fh = open(cache_file, 'rb')
+                try:
+                    cached = pickle.load(fh)
+                finally:
+                    fh.close()
+                if cached.get('Version') == data_cache_version:
+                    data_cache = cached['Files']
+            except Exception:
+                # Corrupt or unreadable: it will be regenerated
+                Debug("Could not read data cache " + cache_file, "Warning")
+    return data_cache
+
+def SaveDataCache():
+    global data_cache_modified
+    if not data_cache_modified:
+        return
+    cache_file = GetDataCacheFile()
+    if cache_file is None:
+        return
+    data_cache_modified = False
+    temporary = None
+    import tempfile
+    try:
+        directory = os.path.dirname(cache_file)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        # Write to a temporary file first so that a concurrent reader never
+        # sees a partial cache.
+        fd, temporary = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        fh = os.fdopen(fd, 'wb')
+        try:
+            pickle.dump({'Version': data_cache_version, 'Files': data_cache}, fh, pickle.HIGHEST_PROTOCOL)
+        finally:
+            fh.close()
+        ReplaceFile(temporary, cache_file)
+    except (IOError, OSError):
+        # The cache is only an optimisation
+        Debug("Could not write data cache " + cache_file, "Warning")
+        if temporary is not None and os.path.exists(temporary):
+            os.remove(temporary)
+
+def FileSignature(filename):
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return None
+    return (stat.st_mtime, stat.st_size)
+
+def CacheEntryValid(entry):
+    for filename, signature in entry['Dependencies']:
+        if FileSignature(filename) != signature:
+            return False
+    for name, value in entry['Environment']:
+        if os.environ.get(name) != value:
+            return False
+    return True
+
 def LoadFile(filename):
+    global data_cache_modified
+    key = os.path.abspath(filename)
+    cache = GetDataCache()
+    entry = cache.get(key)
+    if entry is not None and CacheEntryValid(entry):
+        # Unpickle every time: the caller may modify the result
+        return pickle.loads(entry['Data'])
+
+    signature = FileSignature(key)
+    result, includes, environment = ParseFile(filename)
+    if signature is not None:
+        cache[key] = {
+                'Dependencies': [(key, signature)] + [(i, FileSignature(i)) for i in includes],
+                'Environment': [(i, os.environ.get(i)) for i in environment],
+                'Data': pickle.dumps(result, pickle.HIGHEST_PROTOCOL),
+                }
+        # Saved by the caller once all of the files have been loaded
+        data_cache_modified = True
+    return result
+
+def ParseFile(filename):
+    """Parse a data file.
+
+    Returns the parsed data, the list of files included and the list of
+    environment variables used in the include file names."""
+    includes = []
+    environment = []
     fh = open(filename, 'r')
     entries = fh.readlines()
     index = 0
@@ -112,6 +243,7 @@ def LoadFile(filename):
             e = envRE.search(inc_file)
             try:
                 while e is not None:
+                    environment.append(e.group('envname'))
                     inc_file = inc_file[:e.start()] + \
                             os.environ[e.group('envname')] + \
                             inc_file[e.end():]
@@ -119,6 +251,7 @@ def LoadFile(filename):
             except KeyError:
                 raise
                 pass
+            includes.append(os.path.abspath(inc_file))
             if os.path.exists(inc_file):
                 fhinc = open(inc_file, 'r')
                 extra_entries = fhinc.readlines()
@@ -128,7 +261,7 @@ def LoadFile(filename):
                 Debug("No such file: '%s'" % inc_file, "Warning")
         index += 1
     fh.close()
-    return ParseEntries(entries)['Result']
+    return ParseEntries(entries)['Result'], includes, environment
 
 def LoadDataFile(relative):
     filename = os.path.join(data_directory,relative)
@@ -12,18 +12,33 @@
 #            of this software.
 
 # ---------------------------------------------------------------------
-from .config import config
+from .config import config, Initialise
 import os
-from .loaddata import LoadDataFile
+from .loaddata import LoadDataFile, SaveDataCache
 
+# Loaded on first use by GetAllOptions()
 AllOptions = {}
+OptionDefaults = {}
+
+def GetAllOptions():
+    if len(AllOptions) == 0:
+        LoadOptionSpecification()
+    return AllOptions
+
+def GetOptionDefaults():
+    """Table of the default value of every option."""
+    if len(AllOptions) == 0:
+        LoadOptionSpecification()
+    return OptionDefaults
 
 def LoadOptionSpecification():
     ListKeys = ['CommandLineSwitches']
     RequiredKeys = ['CommandLineSwitches', 'Type', 'Default', 'Help']
 
-    global AllOptions
-    AllOptions = LoadDataFile('options.txt')
+    Initialise()
+    # Update in place so that any existing references see the options
+    AllOptions.clear()
+    AllOptions.update(LoadDataFile('options.txt'))
 
     for dest in AllOptions.keys():
         for key in ListKeys:
@@ -38,6 +53,8 @@ def LoadOptionSpecification():
                 else:
                     raise Exception("Missing option {key} in option {dest}".format(key=key,dest=dest))
         # Handle special types of options
+        if AllOptions[dest]['Default'] == 'None':
+            AllOptions[dest]['Default'] = None
         if AllOptions[dest]['Type'] == 'bool':
             if AllOptions[dest]['Default'] == 'True':
                 AllOptions[dest]['Default'] = True
@@ -49,4 +66,7 @@ def LoadOptionSpecification():
             elif not isinstance(AllOptions[dest]['Default'], list):
                 AllOptions[dest]['Default'] = AllOptions[dest]['Default'].split(',')
 
-LoadOptionSpecification()
+    OptionDefaults.clear()
+    for dest in AllOptions.keys():
+        OptionDefaults[dest] = AllOptions[dest]['Default']
+    SaveDataCache()
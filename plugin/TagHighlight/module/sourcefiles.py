@@ -0,0 +1,343 @@
+#!/usr/bin/env python
+# Tag Highlighter:
+#   Author:  A. S. Budden <abudden _at_ gmail _dot_ com>
+# Copyright: Copyright (C) 2009-2013 A. S. Budden
+#            Permission is hereby granted to use and distribute this code,
+#            with or without modifications, provided that this copyright
+#            notice is copied with it. Like anything else that's free,
+#            the TagHighlight plugin is provided *as is* and comes with no
+#            warranty of any kind, either expressed or implied. By using
+#            this plugin, you agree that in no event will the copyright
+#            holder be liable for any damages resulting from the use
+#            of this software.
+
+# ---------------------------------------------------------------------
+from __future__ import print_function
+import os
+import sys
+import re
+import json
+import time
+import fnmatch
+import tempfile
+
+from .utilities import openutf8, AtomicFile
+from .debug import Debug
+
+# The source tree is walked once per run and the resulting list of files
+# is shared by everything that needs it: ctags (with -L), jsctags, the
+# ctags shards, the incremental tags manifest and cscope (with -i).  Only
+# files with the extension of one of the languages in LanguageList are
+# listed, so logs, images, build outputs and so on are never scanned.
+#
+# Version control directories and any directories named in
+# ExcludeDirectories (node_modules by default) are never entered.  Files
+# named in IgnoreFiles (.taghlignore by default) list patterns of files and
+# directories to ignore in the directory containing them and below, in the
+# style of a .gitignore file:
+#
+#   # Comment
+#   *.min.js        Ignore any file (or directory) with a matching name
+#   build/          Trailing slash: only match directories
+#   /generated.c    Containing a slash: match the path relative to the
+#                   directory containing the ignore file
+#   !keep.min.js    Don't ignore something that an earlier pattern ignored
+#
+# As with git, the last matching pattern wins and nothing inside an
+# ignored directory can be un-ignored.
+#
+# If CacheDirectoryListings is set, the listing of each directory is saved
+# next to the tag file along with the directory's modification time, so
+# the next run only has to stat a directory rather than list it again if
+# nothing has been added to, removed from or renamed in it.
+
+# Version control metadata directories, which are never scanned
+version_control_directories = ['.git', '.hg', '.svn', '.bzr', 'CVS', '_darcs']
+
+# Increment this if the format of the listing cache changes
+listing_cache_version = 1
+
+# Listings of directories modified this recently (in seconds) before the
+# cache was saved aren't saved as they could change again without the
+# modification time changing
+listing_cache_margin = 2
+
+try:
+    from os import scandir
+except ImportError:
+    scandir = None
+
+def ListDirectory(path):
+    """List a directory as [name, is_directory] pairs (following links)."""
+    if scandir is None:
+        return [[name, os.path.isdir(os.path.join(path, name))] for name in os.listdir(path)]
+    entries = []
+    for entry in scandir(path):
+        try:
+            is_directory = entry.is_dir()
+        except OSError:
+            is_directory = False
+        entries.append([entry.name, is_directory])
+    return entries
+
+class IgnoreRule(object):
+    """One pattern from an ignore file."""
+    def __init__(self, base, pattern):
+        self.negated = pattern.startswith('!')
+        if self.negated:
+            pattern = pattern[1:]
+        self.directory_only = pattern.endswith('/')
+        pattern = pattern.rstrip('/')
+        # Anchored patterns are matched against the path relative to the
+        # directory containing the ignore file; others against the name.
+        self.anchored = '/' in pattern
+        if self.anchored:
+            pattern = pattern.lstrip('/')
+        self.base = base
+        self.matcher = re.compile(fnmatch.translate(pattern))
+
+    def Matches(self, path, name, is_directory):
+        if self.directory_only and not is_directory:
+            return False
+        if self.anchored:
+            if self.base == '':
+                relative = path
+            elif path.startswith(self.base + '/'):
+                relative = path[len(self.base)+1:]
+            else:
+                return False
+            return self.matcher.match(relative) is not None
+        return self.matcher.match(name) is not None
+
+def ReadIgnoreRules(path, base, ignore_files):
+    rules = []
+    for ignore_file in ignore_files:
+        filename = os.path.join(path, ignore_file)
+        if not os.path.isfile(filename):
+            continue
+        fh = openutf8(filename, 'r')
+        try:
+            for line in fh:
+                line = line.rstrip('\r\n').rstrip(' ')
+                if line == '' or line.startswith('#'):
+                    continue
+                rules.append(IgnoreRule(base, line))
+        finally:
+            fh.close()
+    return rules
+
+def IsIgnored(rules, path, name, is_directory):
+    ignored = False
+    for rule in rules:
+        if rule.Matches(path, name, is_directory):
+            ignored = not rule.negated
+    return ignored
+
+def ListingCacheFileName(options):
+    return os.path.join(options['CtagsFileLocation'], options['TagFileName'] + '.dircache')
+
+def LoadListingCache(options, root):
+    filename = ListingCacheFileName(options)
+    if not os.path.exists(filename):
+        return {}
+    try:
+        fh = open(filename, 'r')
+        try:
+            cache = json.load(fh)
+        finally:
+            fh.close()
+    except (IOError, ValueError):
+        Debug("Could not read directory listing cache " + filename, "Warning")
+        return {}
+    if cache.get('Version') != listing_cache_version or cache.get('Root') != root:
+        return {}
+    directories = cache['Directories']
+    if sys.hexversion < 0x03000000:
+        # json gives unicode strings, but os.listdir gives byte strings
+        directories = dict((path.encode('utf8'), [mtime, [[name.encode('utf8'), is_directory]
+            for name, is_directory in entries]])
+            for path, (mtime, entries) in directories.items())
+    return directories
+
+def SaveListingCache(options, root, directories, start_time):
+    filename = ListingCacheFileName(options)
+    cache = {
+            'Version': listing_cache_version,
+            'Root': root,
+            'Directories': dict((path, entry) for path, entry in directories.items()
+                if entry[0] < start_time - listing_cache_margin),
+            }
+    try:
+        fh = AtomicFile(filename, lambda name: open(name, 'w'))
+        try:
+            json.dump(cache, fh, sort_keys=True)
+        except:
+            fh.discard()
+            raise
+        fh.close()
+    except (IOError, OSError):
+        Debug("Could not write directory listing cache " + filename, "Warning")
+
+def SourceFileMatcher(options):
+    """Return a function that checks whether a file name has an extension
+    handled by one of the languages in LanguageList (or None if the
+    languages haven't been loaded)."""
+    if 'LanguageHandler' not in options or 'LanguageList' not in options:
+        return None
+    languages = set(options['LanguageList'])
+    extension_table, fallback_matchers = options['LanguageHandler'].GetExtensionDispatch()
+    extensions = set(extension for extension, extension_languages in extension_table.items()
+            if languages.intersection(extension_languages))
+    patterns = [re.compile(r'\.(?:' + options['LanguageHandler'].GetLanguageHandler(language)['PythonExtensionMatcher'] + r')$')
+            for language in fallback_matchers if language in languages]
+    def IsSourceFile(name):
+        extension = os.path.splitext(name)[1][1:]
+        if extension in extensions:
+            return True
+        for pattern in patterns:
+            if pattern.search(name) is not None:
+                return True
+        return False
+    return IsSourceFile
+
+def ListSourceFiles(options):
+    """List the files that ctags would be asked to scan.
+
+    Only files with the extension of one of the languages being generated
+    are listed.  Must be called from the source directory.  Paths are given
+    in the same form as ctags would report them when run over the whole
+    tree."""
+    excluded = set(version_control_directories + options['ExcludeDirectories'])
+    if not options['IncludeDocs']:
+        excluded.update(['docs', 'Documentation'])
+    ignore_files = options['IgnoreFiles']
+    IsSourceFile = SourceFileMatcher(options)
+    if IsSourceFile is None:
+        IsSourceFile = lambda name: True
+
+    if not options['Recurse']:
+        # Hidden files are skipped, as they were when the files were found
+        # with glob
+        rules = ReadIgnoreRules('.', '', ignore_files)
+        return [os.path.join(options['SourceDir'], name)
+                for name, is_directory in sorted(ListDirectory('.'))
+                if not is_directory and not name.startswith('.')
+                and IsSourceFile(name) and not IsIgnored(rules, name, name, False)]
+
+    use_cache = options['CacheDirectoryListings']
+    start_time = time.time()
+    root = os.path.abspath('.')
+    if use_cache:
+        cached = LoadListingCache(options, root)
+    else:
+        cached = {}
+    directories = {}
+
+    files = []
+    visited = set()
+    # Each entry is the path relative to the source directory ('' for the
+    # source directory itself) and the ignore rules that apply to it.
+    # ctags follows symbolic links by default, so do the same (but don't
+    # get caught in a loop)
+    pending = [('', [])]
+    while pending:
+        path, rules = pending.pop()
+        directory = path or '.'
+        real_path = os.path.realpath(directory)
+        if real_path in visited:
+            continue
+        visited.add(real_path)
+        try:
+            mtime = os.stat(directory).st_mtime
+            if path in cached and cached[path][0] == mtime:
+                entries = cached[path][1]
+            else:
+                entries = ListDirectory(directory)
+        except OSError:
+            continue
+        directories[path] = [mtime, entries]
+
+        rules = rules + ReadIgnoreRules(directory, path, ignore_files)
+        subdirectories = []
+        for name, is_directory in sorted(entries):
+            if name in excluded:
+                continue
+            if path == '':
+                entry_path = name
+            else:
+                entry_path = path + '/' + name
+            if rules and IsIgnored(rules, entry_path, name, is_directory):
+                continue
+            if is_directory:
+                subdirectories.append(entry_path)
+            elif IsSourceFile(name):
+                files.append(os.path.normpath(entry_path))
+        # Depth first, in sorted order (like os.walk with sorted directories)
+        for subdirectory in reversed(subdirectories):
+            pending.append((subdirectory, rules))
+
+    if use_cache:
+        SaveListingCache(options, root, directories, start_time)
+    return files
+
+def GeneratedFileMatcher(options):
+    """Return a function that checks whether a path (relative to the source
+    directory) is one of the files written by TagHighlight, or one of their
+    temporary files, so that writing them doesn't look like a change."""
+    prefixes = [os.path.relpath(os.path.join(options['CtagsFileLocation'], options['TagFileName'])),
+            os.path.relpath(os.path.join(options['CscopeFileLocation'], options['CscopeFileName']))]
+    # The debug log and instrumentation report are written in place
+    logs = set(os.path.relpath(options[key]) for key in ['DebugFile', 'InstrumentationFile']
+            if options.get(key) not in [None, 'None', '-'])
+    types_directory = os.path.relpath(options['TypesFileLocation'])
+    types_prefix = options['TypesFilePrefix'] + '_'
+    types_extension = '.' + options['TypesFileExtension']
+    def IsGeneratedFile(path):
+        if path in logs:
+            return True
+        for prefix in prefixes:
+            if path == prefix or path.startswith(prefix + '.'):
+                return True
+        # The types files and their file-scope fragment directories
+        relative = os.path.relpath(path, types_directory)
+        name = relative.split(os.path.sep)[0]
+        return name != os.pardir and name.startswith(types_prefix) and types_extension in name
+    return IsGeneratedFile
+
+def GetSourceFiles(options):
+    """List the source files (as ListSourceFiles), only walking the tree once.
+
+    The list is shared by everything that needs it in a run.  Must be called
+    from the source directory."""
+    if options.get('SourceFileList') is None:
+        options['SourceFileList'] = ListSourceFiles(options)
+    return options['SourceFileList']
+
+def GetSourceFileListFile(options):
+    """Write the source files to a file (once per run) and return its name.
+
+    This is given to ctags with -L rather than putting every file on the
+    command line.  It is removed by RemoveSourceFileListFile at the end of
+    the run.  Must be called from the source directory."""
+    if options.get('SourceFileListFile') is None:
+        # List the files first so that the list doesn't include itself
+        files = GetSourceFiles(options)
+        fd, list_file = tempfile.mkstemp(prefix=options['TagFileName'] + '.',
+                suffix='.files', dir=options['CtagsFileLocation'])
+        os.close(fd)
+        list_file = os.path.abspath(list_file)
+        options['SourceFileListFile'] = list_file
+        fh = openutf8(list_file, 'w')
+        try:
+            for filename in files:
+                fh.write(filename + '\n')
+        finally:
+            fh.close()
+    return options['SourceFileListFile']
+
+def RemoveSourceFileListFile(options):
+    list_file = options.get('SourceFileListFile')
+    if list_file is not None:
+        if os.path.exists(list_file):
+            os.remove(list_file)
+        options['SourceFileListFile'] = None
@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+# Tag Highlighter:
+#   Author:  A. S. Budden <abudden _at_ gmail _dot_ com>
+# Copyright: Copyright (C) 2009-2013 A. S. Budden
+#            Permission is hereby granted to use and distribute this code,
+#            with or without modifications, provided that this copyright
+#            notice is copied with it. Like anything else that's free,
+#            the TagHighlight plugin is provided *as is* and comes with no
+#            warranty of any kind, either expressed or implied. By using
+#            this plugin, you agree that in no event will the copyright
+#            holder be liable for any damages resulting from the use
+#            of this software.
+
+# ---------------------------------------------------------------------
+from __future__ import print_function
+from array import array
+
+# A TagStore holds the same information as the TagDB and FileTagDB pair
+# that it replaces:
+#
+#   Language: {Type: set([keyword, keyword, keyword])}
+#   Language: {File: {Type: set([keyword, keyword, keyword])}}
+#
+# but keeps each distinct keyword and file name once, in a StringTable, and
+# stores the keywords of each (language, file, type) as an array of indices
+# into the keyword table.  A tag therefore costs four bytes rather than a
+# string and a set entry of its own, and a file-scoped type costs an array
+# rather than a set (and a file costs a dictionary rather than a TagDB).
+#
+# The read-only views returned by UnscopedTags and FileScopedTags behave
+# like the dictionaries that CreateTypesFile used to be given.
+
+no_file = -1
+
+class StringTable(object):
+    """Table of distinct strings, each identified by its index."""
+    __slots__ = ('ids', 'strings')
+
+    def __init__(self):
+        self.ids = {}
+        self.strings = []
+
+    def Intern(self, string):
+        if self.ids is None:
+            self.ids = dict((string, index) for index, string in enumerate(self.strings))
+        try:
+            return self.ids[string]
+        except KeyError:
+            index = len(self.strings)
+            self.ids[string] = index
+            self.strings.append(string)
+            return index
+
+    def Freeze(self):
+        """Drop the lookup dictionary until something else is interned."""
+        self.ids = None
+
+    def __getitem__(self, index):
+        return self.strings[index]
+
+    def __len__(self):
+        return len(self.strings)
+
+class TagStore(object):
+    """Compact store of keywords by language, (optionally) file and type."""
+    __slots__ = ('keywords', 'filenames', 'columns')
+
+    def __init__(self):
+        self.keywords = StringTable()
+        self.filenames = StringTable()
+        # Language: {File index (or no_file): {Type: array of keyword indices}}
+        self.columns = {}
+
+    def Add(self, language, kind, keyword, filename=None):
+        """Add a keyword; it is file-scoped if filename is given."""
+        if filename is None:
+            file_index = no_file
+        else:
+            file_index = self.filenames.Intern(filename)
+        try:
+            column = self.columns[language][file_index][kind]
+        except KeyError:
+            column = array('i')
+            self.columns.setdefault(language, {}).setdefault(file_index, {})[kind] = column
+        column.append(self.keywords.Intern(keyword))
+
+    def Update(self, other, languages=None):
+        """Add the keywords from another store (only for the given languages,
+        if specified).  Compact should be called once everything is added."""
+        keywords = other.keywords.strings
+        Intern = self.keywords.Intern
+        for language, files in other.columns.items():
+            if languages is not None and language not in languages:
+                continue
+            for file_index, kinds in files.items():
+                if file_index == no_file:
+                    target_index = no_file
+                else:
+                    target_index = self.filenames.Intern(other.filenames[file_index])
+                target_kinds = self.columns.setdefault(language, {}).setdefault(target_index, {})
+                for kind, column in kinds.items():
+                    target_column = target_kinds.setdefault(kind, array('i'))
+                    target_column.extend([Intern(keywords[index]) for index in column])
+
+    def Compact(self):
+        """Free everything that is only needed while adding keywords.
+
+        Duplicate keywords are removed from each array and the arrays are
+        shrunk to fit; the keyword table's lookup dictionary (which takes
+        more memory than the keywords themselves) is dropped."""
+        for files in self.columns.values():
+            for kinds in files.values():
+                for kind in kinds:
+                    kinds[kind] = array('i', sorted(set(kinds[kind])))
+        self.keywords.Freeze()
+
+    def UnscopedTags(self):
+        """View equivalent to a TagDB: language -> type -> keywords."""
+        return UnscopedView(self)
+
+    def FileScopedTags(self):
+        """View equivalent to a FileTagDB: language -> file -> type -> keywords."""
+        return FileScopedView(self)
+
+class KindView(object):
+    """Read-only mapping of type to a set of keywords."""
+    __slots__ = ('keywords', 'kinds')
+
+    def __init__(self, keywords, kinds):
+        self.keywords = keywords
+        self.kinds = kinds
+
+    def __getitem__(self, kind):
+        strings = self.keywords.strings
+        return set([strings[index] for index in self.kinds.get(kind, ())])
+
+    def __contains__(self, kind):
+        return kind in self.kinds
+
+    def __iter__(self):
+        return iter(self.kinds)
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def keys(self):
+        return list(self.kinds.keys())
+
+    def items(self):
+        return [(kind, self[kind]) for kind in self.kinds]
+
+class UnscopedView(object):
+    """Read-only mapping of language to a KindView of the unscoped tags."""
+    __slots__ = ('store',)
+
+    def __init__(self, store):
+        self.store = store
+
+    def LanguageKinds(self, language):
+        return self.store.columns.get(language, {}).get(no_file, {})
+
+    def __getitem__(self, language):
+        # Like a TagDB, a language without tags gives an empty result
+        return KindView(self.store.keywords, self.LanguageKinds(language))
+
+    def __contains__(self, language):
+        return len(self.LanguageKinds(language)) > 0
+
+    def keys(self):
+        return [language for language in self.store.columns if language in self]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+class FileKindsView(object):
+    """Read-only mapping of file name to a KindView for one language."""
+    __slots__ = ('store', 'files')
+
+    def __init__(self, store, files):
+        self.store = store
+        self.files = files
+
+    def __getitem__(self, filename):
+        file_index = self.store.filenames.ids.get(filename, no_file)
+        if file_index == no_file:
+            return KindView(self.store.keywords, {})
+        return KindView(self.store.keywords, self.files.get(file_index, {}))
+
+    def __contains__(self, filename):
+        file_index = self.store.filenames.ids.get(filename, no_file)
+        return file_index != no_file and file_index in self.files
+
+    def keys(self):
+        filenames = self.store.filenames
+        return [filenames[file_index] for file_index in self.files if file_index != no_file]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+class FileScopedView(object):
+    """Read-only mapping of language to a FileKindsView of the file-scoped tags."""
+    __slots__ = ('store',)
+
+    def __init__(self, store):
+        self.store = store
+
+    def __getitem__(self, language):
+        return FileKindsView(self.store, self.store.columns.get(language, {}))
+
+    def __contains__(self, language):
+        files = self.store.columns.get(language, {})
+        return len(files) > 1 or (len(files) == 1 and no_file not in files)
+
+    def keys(self):
+        return [language for language in self.store.columns if language in self]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
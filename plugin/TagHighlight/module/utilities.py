@@ -14,8 +14,15 @@
 # ---------------------------------------------------------------------
 from __future__ import print_function
 import time
+import sys
+import os
 import re
 
+if sys.hexversion > 0x03000000:
+    openutf8 = lambda f, mode: open(f, mode, encoding="utf8", errors="ignore")
+else:
+    openutf8 = lambda f, mode: open(f, mode)
+
 # Used for timing a function; from http://www.daniweb.com/code/snippet368.html
 # decorator: put @print_timing before a function to time it.
 def print_timing(func):
@@ -34,10 +41,10 @@ class TagHighlightOptionDict(dict):
 
     def __getitem__(self, name):
         if name not in self:
-            from .options import AllOptions
-            for option in AllOptions.keys():
-                if option == name:
-                    return AllOptions[option]['Default']
+            from .options import GetOptionDefaults
+            defaults = GetOptionDefaults()
+            if name in defaults:
+                return defaults[name]
         return super(TagHighlightOptionDict, self).__getitem__(name)
 
     def __setattr__(self, name, value):
@@ -146,19 +153,145 @@ def GenerateValidKeywordRange(iskeyword):
     return kRE
 
 
+def ExpandExtensionMatcher(matcher, limit=256):
+    """Expand a simple extension regular expression into the set of strings
+    it matches.
+
+    Only literals, groups, alternation, character classes and the '?'
+    quantifier are understood (which covers all of the standard language
+    definitions).  Returns None if the expression uses anything else or
+    would match more than limit strings: the caller must then fall back to
+    using the regular expression itself."""
+    class Unexpandable(Exception):
+        pass
+
+    special = '()|[]?*+{}.^$\\'
+
+    def ParseAlternation(pos):
+        results, pos = ParseSequence(pos)
+        while pos < len(matcher) and matcher[pos] == '|':
+            more, pos = ParseSequence(pos+1)
+            results |= more
+        return results, pos
+
+    def ParseSequence(pos):
+        results = set([''])
+        while pos < len(matcher) and matcher[pos] not in '|)':
+            atom, pos = ParseAtom(pos)
+            if pos < len(matcher) and matcher[pos] == '?':
+                atom = atom | set([''])
+                pos += 1
+            results = set(a + b for a in results for b in atom)
+            if len(results) > limit:
+                raise Unexpandable()
+        return results, pos
+
+    def ParseAtom(pos):
+        ch = matcher[pos]
+        if ch == '(':
+            if matcher.startswith('(?:', pos):
+                pos += 2
+            elif matcher.startswith('(?', pos):
+                raise Unexpandable()
+            results, pos = ParseAlternation(pos+1)
+            if pos >= len(matcher) or matcher[pos] != ')':
+                raise Unexpandable()
+            return results, pos+1
+        elif ch == '[':
+            end = matcher.find(']', pos+1)
+            if end == -1:
+                raise Unexpandable()
+            contents = matcher[pos+1:end]
+            if len(contents) == 0 or contents[0] == '^' or '\\' in contents:
+                raise Unexpandable()
+            results = set()
+            index = 0
+            while index < len(contents):
+                if index+2 < len(contents) and contents[index+1] == '-':
+                    for i in range(ord(contents[index]), ord(contents[index+2])+1):
+                        results.add(chr(i))
+                    index += 3
+                else:
+                    results.add(contents[index])
+                    index += 1
+            return results, end+1
+        elif ch == '\\':
+            if pos+1 < len(matcher) and matcher[pos+1] in special:
+                return set([matcher[pos+1]]), pos+2
+            raise Unexpandable()
+        elif ch in special:
+            raise Unexpandable()
+        return set([ch]), pos+1
+
+    try:
+        results, pos = ParseAlternation(0)
+    except Unexpandable:
+        return None
+    if pos != len(matcher):
+        return None
+    return results
+
 def IsValidKeyword(keyword, iskeyword):
     if iskeyword.match(keyword) is not None:
         return True
     return False
 
-def rglob(path, pattern):
-    # Tweaked version of the stackoverflow answer:
-    # http://stackoverflow.com/questions/2186525/use-a-glob-to-find-files-recursively-in-python#2186565
-    import os, fnmatch
-    matches = []
-    for root, dirnames, filenames in os.walk(path):
-        matches += [os.path.join(root, i) for i in fnmatch.filter(filenames, pattern)]
-    return matches
+def ReplaceFile(source, destination):
+    """Rename source to destination, replacing destination if it exists."""
+    try:
+        os.replace(source, destination)
+    except AttributeError:
+        # Python 2: os.rename won't overwrite on Windows
+        if os.name == 'nt' and os.path.exists(destination):
+            os.remove(destination)
+        os.rename(source, destination)
+
+class AtomicFile(object):
+    """File-like object for replacing a file atomically.
+
+    Everything is written to a temporary file in the same directory, which
+    only replaces the real file when closed, and then only if the contents
+    differ.  This means that a reader never sees a partially written file
+    and the modification time only changes if the contents have.
+    """
+    def __init__(self, filename, opener):
+        self.filename = filename
+        self.temporary = '{0}.{1}.tmp'.format(filename, os.getpid())
+        self.fh = opener(self.temporary)
+
+    def write(self, value):
+        self.fh.write(value)
+
+    def close(self):
+        """Close the file; returns True if the file was changed."""
+        import filecmp
+        self.fh.close()
+        if os.path.exists(self.filename) and filecmp.cmp(self.temporary, self.filename, shallow=False):
+            os.remove(self.temporary)
+            return False
+        ReplaceFile(self.temporary, self.filename)
+        return True
+
+    def discard(self):
+        """Close the file without replacing the original."""
+        self.fh.close()
+        if os.path.exists(self.temporary):
+            os.remove(self.temporary)
+
+def GetProcessContext():
+    """Get the multiprocessing context for worker processes.
+
+    fork is used where it is available so that the workers start with the
+    configuration and data already loaded.  The debug log is flushed first
+    so that the workers don't inherit (and write out again) any buffered
+    messages."""
+    import multiprocessing
+    from .debug import FlushDebugLog
+    FlushDebugLog()
+    try:
+        return multiprocessing.get_context('fork')
+    except (AttributeError, ValueError):
+        return multiprocessing
 
 if __name__ == "__main__":
     with open(__file__, 'r') as fh:
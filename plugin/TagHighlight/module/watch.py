@@ -0,0 +1,450 @@
+#!/usr/bin/env python
+# Tag Highlighter:
+#   Author:  A. S. Budden <abudden _at_ gmail _dot_ com>
+# Copyright: Copyright (C) 2009-2013 A. S. Budden
+#            Permission is hereby granted to use and distribute this code,
+#            with or without modifications, provided that this copyright
+#            notice is copied with it. Like anything else that's free,
+#            the TagHighlight plugin is provided *as is* and comes with no
+#            warranty of any kind, either expressed or implied. By using
+#            this plugin, you agree that in no event will the copyright
+#            holder be liable for any damages resulting from the use
+#            of this software.
+
+# ---------------------------------------------------------------------
+from __future__ import print_function
+import os
+import sys
+import time
+import struct
+import select
+
+from .config import config, SetInitialOptions, LoadLanguages
+from .sourcefiles import ListDirectory, ListSourceFiles, GetSourceFiles, GeneratedFileMatcher, \
+        RemoveSourceFileListFile, version_control_directories
+from .tagstore import TagStore
+from .instrumentation import Phase, ResetInstrumentation, WriteInstrumentationReport
+from .debug import Debug, FlushDebugLog
+
+# In watch mode, the tag file and types files are generated as normal and
+# then kept up to date as the source files change, rather than being
+# regenerated from scratch each time Vim asks for it.
+#
+# The source directories are watched with inotify (through ctypes, so Linux
+# only) or, where that isn't available, by listing the source files and
+# checking their sizes and modification times every WatchPollInterval
+# milliseconds.  Changes are collected until there have been none for
+# WatchDebounce milliseconds, so that a burst of changes (such as a git
+# checkout) results in a single update.
+#
+# The tags from each source file are parsed and kept (in a TagStore per
+# file), so an update only has to run ctags over the files that have changed
+# (as with IncrementalTags, whose manifest is kept up to date) and rewrite
+# the types files for the languages of those files.
+
+# From sys/inotify.h
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+inotify_watch_mask = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | \
+        IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+
+# Events after which the list of source files has to be made again
+inotify_rescan_mask = IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | \
+        IN_DELETE_SELF | IN_MOVE_SELF | IN_Q_OVERFLOW
+
+inotify_event_header = struct.Struct('iIII')
+
+class Changes(object):
+    """Paths (relative to the source directory) that may have changed.
+
+    If rescan is set, files may have been added or removed, so the source
+    files must be listed again."""
+    def __init__(self, paths=None, rescan=False):
+        if paths is None:
+            paths = set()
+        self.paths = paths
+        self.rescan = rescan
+
+    def Add(self, other):
+        self.paths.update(other.paths)
+        self.rescan = self.rescan or other.rescan
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __bool__(self):
+        return self.rescan or len(self.paths) > 0
+    __nonzero__ = __bool__
+
+class InotifyWatcher(object):
+    """Watch the source directories with inotify."""
+    def __init__(self, options):
+        import ctypes
+        import ctypes.util
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = self.libc.inotify_init()
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, "inotify_init failed: " + os.strerror(errno))
+        self.get_errno = ctypes.get_errno
+        self.IsGeneratedFile = GeneratedFileMatcher(options)
+        self.recurse = options['Recurse']
+        self.excluded = set(version_control_directories + options['ExcludeDirectories'])
+        # Watch descriptor: directory (relative to the source directory)
+        self.directories = {}
+        self.AddDirectory('')
+        Debug("Watching {0} directories with inotify", "Information", len(self.directories))
+
+    def AddDirectory(self, path):
+        directory = path or '.'
+        if sys.hexversion > 0x03000000:
+            encoded = os.fsencode(directory)
+        else:
+            encoded = directory
+        wd = self.libc.inotify_add_watch(self.fd, encoded, inotify_watch_mask)
+        if wd < 0:
+            Debug("Could not watch {0}: {1}", "Warning", directory, os.strerror(self.get_errno()))
+            return
+        if wd in self.directories:
+            # Already watched (through a symbolic link)
+            return
+        self.directories[wd] = path
+        if not self.recurse:
+            return
+        try:
+            entries = ListDirectory(directory)
+        except OSError:
+            return
+        for name, is_directory in entries:
+            if is_directory and name not in self.excluded:
+                self.AddDirectory(os.path.join(path, name))
+
+    def Read(self, timeout):
+        """Wait for changes for up to timeout seconds (forever if None)."""
+        readable, writable, errors = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return Changes()
+        data = os.read(self.fd, 65536)
+        changes = Changes()
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = inotify_event_header.unpack_from(data, offset)
+            offset += inotify_event_header.size
+            name = data[offset:offset+length].rstrip(b'\0')
+            offset += length
+            if mask & IN_IGNORED:
+                self.directories.pop(wd, None)
+                continue
+            if wd not in self.directories or not name:
+                # A change to a watched directory itself or lost events
+                if mask & inotify_rescan_mask:
+                    changes.rescan = True
+                continue
+            if sys.hexversion > 0x03000000:
+                name = os.fsdecode(name)
+            path = os.path.join(self.directories[wd], name)
+            if self.IsGeneratedFile(path):
+                continue
+            if mask & inotify_rescan_mask:
+                changes.rescan = True
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and self.recurse and name not in self.excluded:
+                    self.AddDirectory(path)
+            else:
+                changes.paths.add(path)
+        return changes
+
+    def Close(self):
+        os.close(self.fd)
+
+class PollingWatcher(object):
+    """Watch the source files by checking them every interval seconds."""
+    def __init__(self, options, interval):
+        self.options = options
+        self.interval = interval
+        self.IsGeneratedFile = GeneratedFileMatcher(options)
+        self.snapshot = self.Snapshot()
+        Debug("Polling {0} files every {1} seconds", "Information", len(self.snapshot), interval)
+
+    def Snapshot(self):
+        snapshot = {}
+        for filename in ListSourceFiles(self.options):
+            key = os.path.relpath(filename)
+            if self.IsGeneratedFile(key):
+                continue
+            try:
+                stat = os.stat(filename)
+            except OSError:
+                continue
+            snapshot[key] = (stat.st_size, stat.st_mtime)
+        return snapshot
+
+    def Read(self, timeout):
+        """Wait for changes for up to timeout seconds (forever if None)."""
+        if timeout is not None:
+            deadline = time.time() + timeout
+        while 1:
+            wait = self.interval
+            if timeout is not None:
+                wait = min(wait, deadline - time.time())
+            if wait > 0:
+                time.sleep(wait)
+            snapshot = self.Snapshot()
+            changes = Changes(set(key for key in snapshot if snapshot[key] != self.snapshot.get(key)))
+            removed = set(self.snapshot.keys()) - set(snapshot.keys())
+            added = set(snapshot.keys()) - set(self.snapshot.keys())
+            if added or removed:
+                changes.paths.update(removed)
+                changes.rescan = True
+            self.snapshot = snapshot
+            if changes or (timeout is not None and time.time() >= deadline):
+                return changes
+
+    def Close(self):
+        pass
+
+def CreateWatcher(options):
+    if not options['WatchPolling']:
+        try:
+            return InotifyWatcher(options)
+        except (OSError, AttributeError, TypeError) as e:
+            # No inotify (not Linux) or no C library
+            Debug("Cannot use inotify ({0}), polling for changes instead", "Status", e)
+    return PollingWatcher(options, int(options['WatchPollInterval']) / 1000.0)
+
+def CollectChanges(watcher, debounce):
+    """Wait for a change and then for debounce seconds without any more.
+
+    Returns the changes and the time of the first one."""
+    changes = Changes()
+    while not changes:
+        changes = watcher.Read(None)
+    first = last = time.time()
+    while 1:
+        remaining = last + debounce - time.time()
+        if remaining <= 0:
+            break
+        more = watcher.Read(remaining)
+        if more:
+            changes.Add(more)
+            last = time.time()
+    return changes, first
+
+class WatchState(object):
+    """The tags parsed from each source file, kept between updates."""
+    def __init__(self, options):
+        self.options = options
+        # Manifest key: TagStore with that file's tags
+        self.stores = {}
+        # Manifest key: manifest entry (as IncrementalTags)
+        self.files = {}
+        # Manifest key: name to give ctags
+        self.source_files = {}
+
+    def ListFiles(self):
+        IsGeneratedFile = GeneratedFileMatcher(self.options)
+        self.source_files = {}
+        for filename in GetSourceFiles(self.options):
+            key = os.path.relpath(filename)
+            if not IsGeneratedFile(key):
+                self.source_files[key] = filename
+
+    def ParseLines(self, lines):
+        """Parse tag lines into a TagStore for each source file."""
+        from .ctags_interface import ParseTagLines
+        from .incremental import TagFilenameNormaliser
+        Normalise = TagFilenameNormaliser(self.options)
+        file_lines = {}
+        for line in lines:
+            fields = line.split('\t', 2)
+            if len(fields) < 3 or line.startswith('!_TAG_'):
+                continue
+            file_lines.setdefault(Normalise(fields[1]), []).append(line)
+        stores = {}
+        for key, lines in file_lines.items():
+            unscoped_tags, file_tags = ParseTagLines(self.options, lines)
+            stores[key] = unscoped_tags.store
+        return stores
+
+    def WriteTypesFiles(self, languages):
+        """Combine the tags from every file and write the types files."""
+        from .generation import CreateTypesFiles
+        tag_store = TagStore()
+        for key in sorted(self.stores.keys()):
+            tag_store.Update(self.stores[key], languages)
+        tag_store.Compact()
+        languages = [language for language in self.options['LanguageList'] if language in languages]
+        CreateTypesFiles(self.options, languages,
+                tag_store.UnscopedTags(), tag_store.FileScopedTags())
+
+    def Load(self):
+        """Generate the tag file (incrementally if possible) and parse it."""
+        from .ctags_interface import GenerateTags, ReadStrippedLines
+        from .incremental import LoadManifest
+
+        with Phase('GenerateTags'):
+            GenerateTags(self.options)
+        RemoveSourceFileListFile(self.options)
+        manifest = LoadManifest(self.options)
+        if manifest is not None:
+            self.files = manifest['Files']
+        # Use the list of files made by GenerateTags
+        self.ListFiles()
+
+        tag_file = os.path.join(self.options['CtagsFileLocation'], self.options['TagFileName'])
+        with Phase('ParseTags'):
+            self.stores = self.ParseLines(ReadStrippedLines(tag_file))
+
+        languages = set()
+        for store in self.stores.values():
+            languages.update(store.columns.keys())
+        with Phase('CreateTypesFiles'):
+            self.WriteTypesFiles(languages)
+        self.RunCscope(languages)
+
+    def Update(self, changes):
+        """Bring the tag and types files up to date with the changed files.
+
+        Returns the number of files changed and removed."""
+        from .incremental import ScanSourceFile, RunCtagsOnFiles, SpliceTags, SaveManifest
+
+        candidates = set(changes.paths)
+        if changes.rescan:
+            previous = set(self.source_files.keys())
+            self.options['SourceFileList'] = None
+            self.ListFiles()
+            candidates.update(previous ^ set(self.source_files.keys()))
+
+        changed = {}
+        removed = set()
+        for key in candidates:
+            if key not in self.source_files:
+                if key in self.files:
+                    removed.add(key)
+                continue
+            old_entry = self.files.get(key)
+            entry = ScanSourceFile(self.source_files[key], old_entry)
+            if entry is None:
+                if key in self.files:
+                    removed.add(key)
+                continue
+            self.files[key] = entry
+            if old_entry is None or old_entry[2] != entry[2]:
+                changed[key] = self.source_files[key]
+        if len(changed) == 0 and len(removed) == 0:
+            return 0, 0
+
+        Debug("Watch update: {0} changed, {1} removed", "Information", len(changed), len(removed))
+        new_lines = []
+        if len(changed) > 0:
+            with Phase('RunCtags'):
+                new_lines = RunCtagsOnFiles(self.options, sorted(changed.values()))
+        with Phase('WriteTagFile'):
+            SpliceTags(self.options, new_lines, set(changed.keys()) | removed)
+
+        for key in removed:
+            del self.files[key]
+        languages = set()
+        for key in set(changed.keys()) | removed:
+            old_store = self.stores.pop(key, None)
+            if old_store is not None:
+                languages.update(old_store.columns.keys())
+        with Phase('ParseTags'):
+            new_stores = self.ParseLines(new_lines)
+        for store in new_stores.values():
+            languages.update(store.columns.keys())
+        self.stores.update(new_stores)
+        SaveManifest(self.options, self.files)
+
+        if languages:
+            with Phase('CreateTypesFiles'):
+                self.WriteTypesFiles(languages)
+        self.RunCscope(languages)
+        return len(changed), len(removed)
+
+    def RunCscope(self, languages):
+        if not self.options['EnableCscope']:
+            return
+        from .cscope_interface import StartCscopeDBGeneration, CompleteCscopeDBGeneration
+        cscope_file = os.path.join(self.options['CscopeFileLocation'], self.options['CscopeFileName'])
+        self.options['CscopeFileFull'] = cscope_file
+        if os.path.exists(cscope_file) or not self.options['CscopeOnlyIfCCode'] or 'c' in languages:
+            StartCscopeDBGeneration(self.options)
+            with Phase('WaitForCscope'):
+                CompleteCscopeDBGeneration()
+
+def WriteCycleReport():
+    if config['InstrumentationFile'] is not None:
+        WriteInstrumentationReport(config['InstrumentationFile'])
+    FlushDebugLog()
+
+def RunWatch(options, manually_set=[]):
+    """Generate the tag and types files and keep them up to date until
+    interrupted."""
+    from .ctags_interface import UsingGeneratedExuberantArgs
+
+    SetInitialOptions(options, manually_set)
+    config['SourceFileList'] = None
+    config['SourceFileListFile'] = None
+    # The source directory is changed to (once) at the start, so it must
+    # not be relative to the original working directory afterwards.
+    config['SourceDir'] = os.path.abspath(config['SourceDir'])
+    os.chdir(config['SourceDir'])
+
+    LoadLanguages()
+    if config['DoNotGenerateTags'] or not UsingGeneratedExuberantArgs(config):
+        Debug("Watch mode needs the tags to be generated with exuberant ctags using the arguments generated by TagHighlight", "Error")
+        FlushDebugLog()
+        return
+    # The manifest is needed to tell which files have changed
+    config['IncrementalTags'] = True
+    # Not needed for updating the tags for a few files
+    config['StreamTags'] = False
+
+    # Watch before generating so that nothing changed during the first run
+    # is missed
+    watcher = CreateWatcher(config)
+    state = WatchState(config)
+    debounce = int(config['WatchDebounce']) / 1000.0
+    try:
+        ResetInstrumentation()
+        start = time.time()
+        with Phase('Total'):
+            state.Load()
+        print("Generated tag and types files in {0:.3f}s, watching for changes".format(time.time() - start))
+        sys.stdout.flush()
+        WriteCycleReport()
+
+        while 1:
+            changes, first_change = CollectChanges(watcher, debounce)
+            ResetInstrumentation()
+            start = time.time()
+            with Phase('Total'):
+                changed, removed = state.Update(changes)
+            end = time.time()
+            Debug("Watch cycle took {0:.3f}s ({1:.3f}s after the first change)", "Information",
+                    end - start, end - first_change)
+            if changed or removed:
+                # Latency is from the first change to everything being up
+                # to date, including the debounce period.
+                print("Updated {0} changed and {1} removed files in {2:.3f}s (latency {3:.3f}s)".format(
+                    changed, removed, end - start, end - first_change))
+                sys.stdout.flush()
+            WriteCycleReport()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.Close()
+        RemoveSourceFileListFile(config)
+        FlushDebugLog()
@@ -18,23 +18,51 @@ import os
 
 def RunWithOptions(options, manually_set=[]):
     start_directory = os.getcwd()
-    from .config import config, SetInitialOptions, LoadLanguages
-    from .debug import Debug
+    from .config import config, SetInitialOptions
+    from .debug import Debug, FlushDebugLog
 
     SetInitialOptions(options, manually_set)
+    # Listed (at most once) by GetSourceFiles and written (at most once) by
+    # GetSourceFileListFile
+    config['SourceFileList'] = None
+    config['SourceFileListFile'] = None
 
     Debug("Running types highlighter generator", "Information")
     Debug("Release:" + config['Release'], "Information")
-    Debug("Version:" + repr(config['Version']), "Information")
-    Debug("Options:" + repr(options), "Information")
-    Debug("Manually Set:" + repr(manually_set), "Information")
+    Debug("Version:{0!r}", "Information", config['Version'])
+    Debug("Options:{0!r}", "Information", options)
+    Debug("Manually Set:{0!r}", "Information", manually_set)
 
     tag_file_absolute = os.path.join(config['CtagsFileLocation'], config['TagFileName'])
     if config['DoNotGenerateTags'] and not os.path.exists(tag_file_absolute):
         Debug("Cannot use existing tagfile as it doesn't exist (checking for " + tag_file_absolute + ")", "Error")
+        FlushDebugLog()
         return
 
-    LoadLanguages()
+    from .instrumentation import Phase, ResetInstrumentation, WriteInstrumentationReport
+    from .sourcefiles import RemoveSourceFileListFile
+
+    ResetInstrumentation()
+    try:
+        with Phase('Total'):
+            result = GenerateWithOptions(config)
+    finally:
+        RemoveSourceFileListFile(config)
+        if config['InstrumentationFile'] is not None:
+            WriteInstrumentationReport(config['InstrumentationFile'])
+        FlushDebugLog()
+
+    os.chdir(start_directory)
+
+    return result
+
+def GenerateWithOptions(config):
+    from .config import LoadLanguages
+    from .debug import Debug
+    from .instrumentation import Phase
+
+    with Phase('LoadLanguages'):
+        LoadLanguages()
 
     if config['PrintConfig']:
         import pprint
@@ -45,8 +73,8 @@ def RunWithOptions(options, manually_set=[]):
         print(sys.version)
         return
 
-    from .ctags_interface import GenerateTags, ParseTags
-    from .generation import CreateTypesFile
+    from .ctags_interface import GenerateTags, ParseTags, GenerateAndParseTags
+    from .generation import CreateTypesFiles
 
     cscope_check_c = False
     if config['EnableCscope']:
@@ -60,20 +88,31 @@ def RunWithOptions(options, manually_set=[]):
             Debug("Deferring cscope until C code detected", "Information")
             cscope_check_c = True
 
-    if not config['DoNotGenerateTags']:
+    if config['DoNotGenerateTags']:
+        with Phase('ParseTags'):
+            tag_db, file_tag_db = ParseTags(config)
+    elif config['StreamTags']:
+        Debug("Generating tag file and parsing ctags output as it is generated", "Information")
+        with Phase('GenerateAndParseTags'):
+            tag_db, file_tag_db = GenerateAndParseTags(config)
+    else:
         Debug("Generating tag file", "Information")
-        GenerateTags(config)
-    tag_db, file_tag_db = ParseTags(config)
+        with Phase('GenerateTags'):
+            GenerateTags(config)
+        with Phase('ParseTags'):
+            tag_db, file_tag_db = ParseTags(config)
 
-    for language in config['LanguageList']:
-        if language in tag_db or language in file_tag_db:
-            CreateTypesFile(config, language, tag_db[language], file_tag_db[language])
+    languages = [language for language in config['LanguageList']
+            if language in tag_db or language in file_tag_db]
+    with Phase('CreateTypesFiles'):
+        CreateTypesFiles(config, languages, tag_db, file_tag_db)
 
     if config['EnableCscope']:
         from .cscope_interface import StartCscopeDBGeneration, CompleteCscopeDBGeneration
-        if cscope_check_c and 'c' in tag_db:
+        if cscope_check_c and ('c' in tag_db or 'c' in file_tag_db):
             Debug("Running cscope as C code detected", "Information")
             StartCscopeDBGeneration(config)
-        CompleteCscopeDBGeneration()
+        with Phase('WaitForCscope'):
+            CompleteCscopeDBGeneration()
 
-    os.chdir(start_directory)
+    return tag_db, file_tag_db